@@ -1,15 +1,31 @@
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import json
 import logging
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
 
-from app.models.schemas import DocumentRequest, APIResponse, ErrorResponse, TokenUsage
-from app.services.extraction_service import ExtractionService
+from app.core.config import get_settings
+from app.core.constants import IMAGE_PROFILES, PROMPT_VARIANTS
+from app.core.request_timing import timings_block
+from app.models.schemas import DocumentRequest, APIResponse, ErrorResponse, PageData, TokenUsage
+from app.services.extraction_service import BatchSummary, ExtractionService
+from app.utils.file_utils import spool_multipart_upload
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 router = APIRouter()
 
 
+def _with_timings(result: Any) -> Any:
+    """Add the request timing block when the client asked for it"""
+    timings = timings_block()
+    if timings is not None and isinstance(result, dict):
+        result["timings"] = timings
+    return result
+
+
 @router.post("/extract-bill-data")
 async def extract_bill_data(request: DocumentRequest):
     """
@@ -25,73 +41,22 @@ async def extract_bill_data(request: DocumentRequest):
         For batch: List of results with aggregated stats
     """
     try:
-        extraction_service = ExtractionService()
+        extraction_service = ExtractionService(
+            image_profile=request.image_profile, prompt_variant=request.prompt_variant
+        )
         
         if request.is_batch_request:
             urls = request.documents
             logger.info(f"Processing BATCH of {len(urls)} documents in parallel")
             
-            results = await extraction_service.extract_multiple(urls)
-            
-            successful_results = []
-            failed_results = []
-            total_tokens = 0
-            input_tokens = 0
-            output_tokens = 0
-            total_items = 0
-            
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    failed_results.append({
-                        "document_index": i,
-                        "url": urls[i],
-                        "error": str(result)
-                    })
-                elif result.get("is_success", False):
-                    successful_results.append({
-                        "document_index": i,
-                        "url": urls[i],
-                        "data": result.get("data", {})
-                    })
-                    token_usage = result.get("token_usage", {})
-                    if hasattr(token_usage, 'total_tokens'):
-                        total_tokens += token_usage.total_tokens
-                        input_tokens += token_usage.input_tokens
-                        output_tokens += token_usage.output_tokens
-                    else:
-                        total_tokens += token_usage.get("total_tokens", 0)
-                        input_tokens += token_usage.get("input_tokens", 0)
-                        output_tokens += token_usage.get("output_tokens", 0)
-                    total_items += result.get("data", {}).get("total_item_count", 0)
-                else:
-                    failed_results.append({
-                        "document_index": i,
-                        "url": urls[i],
-                        "error": result.get("error", "Unknown error")
-                    })
-            
-            return {
-                "is_success": len(failed_results) == 0,
-                "batch_mode": True,
-                "total_documents": len(urls),
-                "successful_count": len(successful_results),
-                "failed_count": len(failed_results),
-                "total_items_extracted": total_items,
-                "token_usage": {
-                    "total_tokens": total_tokens,
-                    "input_tokens": input_tokens,
-                    "output_tokens": output_tokens
-                },
-                "results": successful_results,
-                "errors": failed_results if failed_results else None
-            }
+            return _with_timings(await extraction_service.extract_batch(urls))
         
         else:
             document_url = request.document
             logger.info(f"Processing SINGLE document: {document_url}")
             
             extraction_result = await extraction_service.extract_from_url(document_url)
-            return extraction_result
+            return _with_timings(extraction_result)
         
     except HTTPException as http_error:
         logger.error(f"HTTP error: {http_error.detail}")
@@ -118,3 +83,181 @@ async def extract_bill_data(request: DocumentRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content=error_response.dict()
         )
+
+
+@router.post("/extract-bill-data/upload")
+async def extract_bill_data_upload(http_request: Request):
+    """
+    Extract line items from uploaded bill file(s).
+    
+    Send multipart/form-data with one or more file parts (any field name)
+    and optional "image_profile" and "prompt_variant" form fields. Files are streamed into the
+    pipeline as they arrive; type and size are checked during the upload.
+    
+    Returns:
+        For one file: Standard APIResponse
+        For several files: Batch results keyed by filename with aggregated stats
+    """
+    try:
+        files, fields = await spool_multipart_upload(http_request, settings.MAX_UPLOAD_FILES)
+        
+        try:
+            image_profile = fields.get("image_profile") or None
+            if image_profile is not None and image_profile not in IMAGE_PROFILES:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown image_profile. Use one of: {', '.join(IMAGE_PROFILES)}"
+                )
+            prompt_variant = fields.get("prompt_variant") or None
+            if prompt_variant is not None and prompt_variant not in PROMPT_VARIANTS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown prompt_variant. Use one of: {', '.join(PROMPT_VARIANTS)}"
+                )
+            extraction_service = ExtractionService(image_profile=image_profile, prompt_variant=prompt_variant)
+        except BaseException:
+            for _, document in files:
+                document.close()
+            raise
+        
+        if len(files) > 1:
+            logger.info(f"Processing UPLOAD BATCH of {len(files)} files in parallel")
+            return _with_timings(await extraction_service.extract_uploaded_batch(files))
+        
+        filename, document = files[0]
+        logger.info(f"Processing UPLOADED file: {filename}")
+        return _with_timings(await extraction_service.extract_from_document(document))
+        
+    except HTTPException as http_error:
+        logger.error(f"HTTP error: {http_error.detail}")
+        
+        error_response = ErrorResponse(
+            is_success=False,
+            message=http_error.detail
+        )
+        
+        return JSONResponse(
+            status_code=http_error.status_code,
+            content=error_response.dict()
+        )
+        
+    except Exception as unexpected_error:
+        logger.error(f"Unexpected error: {str(unexpected_error)}", exc_info=True)
+        
+        error_response = ErrorResponse(
+            is_success=False,
+            message="Failed to process upload. Internal server error occurred"
+        )
+        
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content=error_response.dict()
+        )
+
+
+def _format_record(record: Dict[str, Any], event_stream: bool) -> str:
+    """Serialize one stream record as an NDJSON line or an SSE event"""
+    payload = json.dumps(jsonable_encoder(record), separators=(",", ":"))
+    if event_stream:
+        return f"event: {record['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+def _result_record(summary: BatchSummary, index: int, result: Any) -> Dict[str, Any]:
+    """Add one document's outcome to the summary and build its "result" record"""
+    entry = summary.add(index, result)
+    record = {"type": "result", "is_success": "data" in entry, **entry}
+    if isinstance(result, dict) and "token_usage" in result:
+        record["token_usage"] = result["token_usage"]
+    return record
+
+
+async def _stream_batch(
+    extraction_service: ExtractionService,
+    urls: List[str],
+    event_stream: bool
+) -> AsyncIterator[str]:
+    """
+    Emit pages while they are generated, each document's result as it completes, then a summary record.
+    
+    If the batch itself fails, an "error" record follows and every document
+    without a result yet gets a failed "result" record, so the stream still
+    ends with the summary.
+    """
+    summary = BatchSummary(urls)
+    reported = set()
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_page(index: int, page: PageData):
+        events.put_nowait({"type": "page", "document_index": index, "page": page})
+    
+    async def run_batch():
+        results = extraction_service.iter_batch(urls, on_page=on_page)
+        try:
+            async for index, result in results:
+                events.put_nowait((index, result))
+        finally:
+            await results.aclose()
+    
+    batch = asyncio.ensure_future(run_batch())
+    batch.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            if isinstance(event, dict):
+                yield _format_record(event, event_stream)
+                continue
+            
+            index, result = event
+            reported.add(index)
+            yield _format_record(_result_record(summary, index, result), event_stream)
+        
+        try:
+            await batch
+        except Exception as error:
+            logger.error(f"Streamed batch failed: {str(error)}", exc_info=True)
+            yield _format_record({"type": "error", "error": str(error)}, event_stream)
+            for index in range(len(urls)):
+                if index not in reported:
+                    yield _format_record(_result_record(summary, index, error), event_stream)
+    finally:
+        batch.cancel()
+    
+    yield _format_record(
+        _with_timings({"type": "summary", **summary.as_response(include_results=False)}),
+        event_stream
+    )
+
+
+@router.post("/extract-bill-data/stream")
+async def extract_bill_data_stream(request: DocumentRequest, http_request: Request):
+    """
+    Extract line items from one or more documents, streaming results.
+    
+    Accepts the same body as /extract-bill-data. Each document's result is
+    sent the moment it completes (in completion order, tagged with
+    document_index), followed by a trailing "summary" record with the
+    aggregated counts and token usage.
+    
+    With GEMINI_STREAMING, "page" records carry each validated page while
+    the model is still generating. They are previews: the "result" record
+    is authoritative (detail-page filtering, duplicate removal and model
+    cascade escalations are applied there).
+    
+    Format: NDJSON (application/x-ndjson) by default, or Server-Sent Events
+    when the request has "Accept: text/event-stream".
+    """
+    urls = request.urls
+    event_stream = "text/event-stream" in http_request.headers.get("accept", "")
+    logger.info(f"Streaming {len(urls)} document(s) as {'SSE' if event_stream else 'NDJSON'}")
+    
+    extraction_service = ExtractionService(
+        image_profile=request.image_profile, prompt_variant=request.prompt_variant
+    )
+    return StreamingResponse(
+        _stream_batch(extraction_service, urls, event_stream),
+        media_type="text/event-stream" if event_stream else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,108 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from datetime import datetime, timezone
+import logging
+from typing import Dict, Any, Optional
+
+from app.models.schemas import DocumentRequest, ErrorResponse, JobStatus
+from app.services.job_service import (
+    JOB_COMPLETED, JOB_FAILED, QueueFullError, get_job_service
+)
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+def _job_status(job: Dict[str, Any]) -> JobStatus:
+    """Build the public status view of a stored job"""
+    return JobStatus(
+        job_id=job["job_id"],
+        status=job["status"],
+        created_at=_timestamp(job["created_at"]),
+        started_at=_timestamp(job["started_at"]),
+        finished_at=_timestamp(job["finished_at"]),
+        expires_at=_timestamp(job["expires_at"]),
+        error=job["error"],
+        status_url=f"/jobs/{job['job_id']}",
+        result_url=f"/jobs/{job['job_id']}/result"
+    )
+
+
+def _job_not_found(job_id: str) -> JSONResponse:
+    error_response = ErrorResponse(
+        is_success=False,
+        message=f"Job {job_id} not found or its result has expired"
+    )
+    return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content=error_response.dict())
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED, response_model=JobStatus)
+async def submit_job(request: DocumentRequest):
+    """
+    Queue an extraction and return its job id immediately.
+
+    Accepts the same body as /extract-bill-data. Poll GET /jobs/{job_id}
+    and fetch the output from GET /jobs/{job_id}/result once completed.
+    """
+    try:
+        job = await get_job_service().submit(request)
+    except QueueFullError as queue_error:
+        logger.warning(str(queue_error))
+        error_response = ErrorResponse(
+            is_success=False,
+            message="Job queue is full. Please retry later"
+        )
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=error_response.dict()
+        )
+
+    return _job_status(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Get the status of an extraction job"""
+    job = await get_job_service().get(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+    return _job_status(job)
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Get the output of a finished extraction job.
+
+    Returns:
+        200 with the /extract-bill-data response once completed,
+        202 with the job status while queued or running,
+        500 if the job itself failed, 404 for unknown or expired jobs
+    """
+    job = await get_job_service().get(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+
+    if job["status"] == JOB_COMPLETED:
+        return job["result"]
+
+    if job["status"] == JOB_FAILED:
+        error_response = ErrorResponse(
+            is_success=False,
+            message=f"Job failed: {job['error']}"
+        )
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content=error_response.dict()
+        )
+
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=_job_status(job).model_dump(mode="json")
+    )
@@ -0,0 +1,130 @@
+import logging
+from typing import Dict, Any, Optional
+
+import aiohttp
+from google import genai
+from google.genai import types
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class PoolStats:
+    """Connection pool counters collected through aiohttp tracing"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Build a TraceConfig that updates these counters"""
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(self._on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(self._on_dns_cache_miss)
+        return trace_config
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.connections_reused += 1
+
+    async def _on_dns_cache_hit(self, session, context, params):
+        self.dns_cache_hits += 1
+
+    async def _on_dns_cache_miss(self, session, context, params):
+        self.dns_cache_misses += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        connections = self.connections_created + self.connections_reused
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_rate": self.connections_reused / connections if connections else 0.0,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+        }
+
+
+_http_session: Optional[aiohttp.ClientSession] = None
+_gemini_client: Optional[genai.Client] = None
+_pool_stats = PoolStats()
+
+
+def _create_http_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=settings.HTTP_POOL_LIMIT,
+        limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+        use_dns_cache=True,
+        ttl_dns_cache=settings.HTTP_DNS_CACHE_SECONDS,
+        keepalive_timeout=settings.HTTP_KEEPALIVE_SECONDS
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=settings.TIMEOUT_SECONDS),
+        trace_configs=[_pool_stats.trace_config()]
+    )
+
+
+def _create_gemini_client() -> genai.Client:
+    http_options = None
+    if settings.GEMINI_BASE_URL:
+        http_options = types.HttpOptions(base_url=settings.GEMINI_BASE_URL)
+    return genai.Client(api_key=settings.GEMINI_API_KEY, http_options=http_options)
+
+
+def init_clients():
+    """Create the shared HTTP session and Gemini client (called from the app lifespan)"""
+    global _http_session, _gemini_client
+    _http_session = _create_http_session()
+    # Without a key the client errors on creation; leave that to the first call
+    if settings.GEMINI_API_KEY:
+        _gemini_client = _create_gemini_client()
+
+
+async def close_clients():
+    """Close the shared clients on shutdown"""
+    global _http_session, _gemini_client
+
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+    _gemini_client = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Get the shared HTTP session, creating it if the lifespan did not"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = _create_http_session()
+    return _http_session
+
+
+def get_gemini_client() -> genai.Client:
+    """Get the shared Gemini client, creating it if the lifespan did not"""
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = _create_gemini_client()
+    return _gemini_client
+
+
+def client_stats() -> Dict[str, Any]:
+    """Connection pool statistics for the shared HTTP session"""
+    stats = _pool_stats.as_dict()
+    if _http_session is not None and not _http_session.closed:
+        connector = _http_session.connector
+        stats["limit"] = connector.limit
+        stats["limit_per_host"] = connector.limit_per_host
+    return stats
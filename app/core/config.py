@@ -1,7 +1,10 @@
+from pydantic import field_validator, model_validator
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 import os
 
+from app.core.constants import PAGE_CLASSIFIER_MODES, PAGE_HASH_ALGORITHMS
+
 class Settings(BaseSettings):
     """Application settings"""
     
@@ -18,15 +21,123 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     GEMINI_MODEL: str = "gemini-2.0-flash-exp"
     GEMINI_TEMPERATURE: float = 0.0
-    
+    GEMINI_BASE_URL: str = ""  # override the API endpoint, e.g. a local stand-in for load tests
+    GEMINI_STREAMING: bool = False  # stream responses and hand on each page as soon as it is complete
+
+    # Prompt Settings
+    PROMPT_VARIANT: str = "full-v1"  # see PROMPT_VARIANTS; requests may pick another
+    PROMPT_CACHE_ENABLED: bool = False  # keep the static prompt prefix in model-side cached content
+    PROMPT_CACHE_TTL_SECONDS: int = 3600
+    PROMPT_CACHE_REFRESH_SECONDS: int = 300  # extend the TTL when less than this is left
+    PROMPT_CACHE_RETRY_SECONDS: int = 600  # after a failed cache creation, send the prefix inline this long
+
+    # Gemini Scheduler Settings (shared by all requests, 0 = no budget)
+    GEMINI_MAX_CONCURRENCY: int = 5
+    GEMINI_MIN_CONCURRENCY: int = 1
+    GEMINI_REQUESTS_PER_MINUTE: int = 0
+    GEMINI_TOKENS_PER_MINUTE: int = 0
+    GEMINI_LATENCY_TARGET_SECONDS: float = 120.0
+
+    # Model Cascade Settings (comma-separated models, cheapest first; empty = GEMINI_MODEL only).
+    # Pages failing the local checks are re-extracted with the next model
+    GEMINI_MODEL_TIERS: str = ""  # e.g. "gemini-2.0-flash-lite,gemini-2.0-flash"
+    CASCADE_ARITHMETIC_TOLERANCE: float = 0.02  # rate x quantity vs amount, relative
+    CASCADE_MAX_MISMATCH_RATIO: float = 0.2  # share of items per page that may fail the arithmetic check
+    CASCADE_TOTAL_TOLERANCE: float = 0.02  # detail item sum vs Final Bill total, relative
+
+    # Gemini Call Resilience Settings (per model, shared by all requests)
+    GEMINI_MAX_RETRIES: int = 3  # retries of rate-limited and transient failures
+    GEMINI_RETRY_BASE_SECONDS: float = 1.0  # backoff before jitter, doubled per retry
+    GEMINI_RETRY_MAX_SECONDS: float = 30.0  # cap on one backoff, Retry-After included
+    GEMINI_HEDGE_PERCENTILE: float = 0.0  # send a second request after this latency percentile, 0 = off
+    GEMINI_HEDGE_MIN_SAMPLES: int = 20  # successful calls seen before hedging starts
+    GEMINI_CIRCUIT_FAILURE_THRESHOLD: int = 5  # consecutive failures that open the circuit, 0 = off
+    GEMINI_CIRCUIT_RESET_SECONDS: float = 30.0  # open time before a probe call is let through
+    DOCUMENT_DEADLINE_SECONDS: float = 300.0  # overall budget per document, 0 = none
+
     # Document Processing Settings
     MAX_FILE_SIZE_MB: int = 500
     MAX_PAGES: int = 500
     PDF_DPI: int = 150
+    PDF_RENDER_WINDOW_PAGES: int = 8  # max decoded pages held per document
+    IMAGE_PROFILE: str = "original"  # original, fast, balanced or accurate
+    TEXT_LAYER_ENABLED: bool = True  # send born-digital PDF pages as text
+    TEXT_LAYER_MIN_CHARS: int = 200  # visible characters for a usable text layer
+    PAGE_CLASSIFIER_MODE: str = "off"  # off, conservative or aggressive
+    PAGE_DEDUP_ENABLED: bool = False  # collapse near-identical pages before extraction
+    PAGE_HASH_ALGORITHM: str = "phash"  # phash or dhash (faster, needs size >= 32, separates pages less well)
+    PAGE_HASH_SIZE: int = 32  # hash is size x size bits
+    PAGE_DEDUP_MAX_DISTANCE: float = 0.0  # share of the hash bits that may differ, 0 = algorithm default
+
+    # Chunked Extraction Settings (documents at or above the threshold are split)
+    CHUNKED_EXTRACTION_THRESHOLD_PAGES: int = 40  # 0 = always one call
+    CHUNK_SIZE_PAGES: int = 20
+    CHUNK_OVERLAP_PAGES: int = 0
+
+    # Post-processing: drop items whose name repeats an earlier item (fuzzy match)
+    DEDUP_POST_PROCESSING: bool = False
     TIMEOUT_SECONDS: int = 300
     BATCH_SIZE: int = 5
+    MAX_UPLOAD_FILES: int = 20  # files per multipart upload
+    DOWNLOAD_CHUNK_SIZE_KB: int = 64
+    SPOOL_MAX_MEMORY_MB: int = 8  # larger bodies are spooled to disk
+    SPOOL_DIR: str = ""  # empty = system temp directory
+
+    # Shared HTTP Client Settings
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 20
+    HTTP_DNS_CACHE_SECONDS: int = 300
+    HTTP_KEEPALIVE_SECONDS: float = 30.0
+
+    # Worker Pool Settings (rasterization and image encoding)
+    WORKER_POOL_KIND: str = "process"  # "process" or "thread"
+    WORKER_POOL_SIZE: int = 0  # 0 = number of CPUs
+    WORKER_TASK_TIMEOUT_SECONDS: float = 120.0
+
+    # Result Cache Settings
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MEMORY_MAX_MB: int = 64
+    RESULT_CACHE_DIR: str = "/tmp/medical-bill-cache"
+    RESULT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    COALESCING_ENABLED: bool = True  # concurrent requests for the same URL or content share one extraction
+
+    # Download Cache Settings (bodies of URLs with an ETag or Last-Modified, revalidated on every use)
+    DOWNLOAD_CACHE_ENABLED: bool = True
+    DOWNLOAD_CACHE_DIR: str = "/tmp/medical-bill-downloads"
+    DOWNLOAD_CACHE_MAX_MB: int = 1024  # least recently used bodies are evicted beyond this
+
+    # Async Job Settings (POST /jobs)
+    JOB_WORKERS: int = 2  # jobs processed concurrently
+    JOB_MAX_QUEUED: int = 1000  # 0 = unbounded
+    JOB_DIR: str = "/tmp/medical-bill-jobs"
+    JOB_RESULT_RETENTION_SECONDS: int = 24 * 3600
+    JOB_LEASE_SECONDS: float = 60.0  # running jobs not renewed for this long (owner gone) are re-queued
+
     # Logging
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # text or json (one JSON object per line)
+    
+    @field_validator("PAGE_CLASSIFIER_MODE")
+    @classmethod
+    def check_page_classifier_mode(cls, value: str) -> str:
+        """Reject unknown modes instead of silently running with a typo"""
+        if value not in PAGE_CLASSIFIER_MODES:
+            raise ValueError(f"Unknown PAGE_CLASSIFIER_MODE. Use one of: {', '.join(PAGE_CLASSIFIER_MODES)}")
+        return value
+    
+    @model_validator(mode="after")
+    def check_page_hash(self) -> "Settings":
+        """Reject page hash settings that cannot tell distinct pages apart"""
+        algorithm = PAGE_HASH_ALGORITHMS.get(self.PAGE_HASH_ALGORITHM)
+        if algorithm is None:
+            raise ValueError(f"Unknown PAGE_HASH_ALGORITHM. Use one of: {', '.join(PAGE_HASH_ALGORITHMS)}")
+        if self.PAGE_HASH_SIZE < algorithm["min_size"]:
+            raise ValueError(
+                f"PAGE_HASH_SIZE must be at least {algorithm['min_size']} for {self.PAGE_HASH_ALGORITHM}"
+            )
+        if not 0 <= self.PAGE_DEDUP_MAX_DISTANCE < 0.5:
+            raise ValueError("PAGE_DEDUP_MAX_DISTANCE is a share of the hash bits, from 0 (default) to below 0.5")
+        return self
     
     class Config:
         env_file = ".env"
@@ -13,6 +13,15 @@ class FileType(str, Enum):
     PDF = "pdf"
     IMAGE = "image"
 
+# Page image profiles applied before upload to Gemini.
+# "original" keeps the SDK-equivalent encoding (PNG for PDF pages, JPEG otherwise).
+IMAGE_PROFILES = {
+    "original": None,
+    "fast": {"grayscale": True, "max_dimension": 1152, "format": "JPEG", "quality": 60},
+    "balanced": {"grayscale": True, "max_dimension": 1536, "format": "WEBP", "quality": 75},
+    "accurate": {"grayscale": False, "max_dimension": 2304, "format": "JPEG", "quality": 90},
+}
+
 # Extraction prompt
 EXTRACTION_PROMPT = """
     You are a precise medical bill data extraction system. Extract line items from any medical bill format with zero double-counting.
@@ -118,6 +127,76 @@ EXTRACTION_PROMPT = """
     """
 
 
+# Static multi-page instructions that follow the extraction rules. The per-call
+# document context (page count, which pages are in the call) comes after them,
+# so extraction rules + these instructions form a prefix shared by every call.
+MULTI_PAGE_INSTRUCTIONS = """
+
+## PAGE INPUT
+
+Each image is preceded by its page number ("Page N:"). Use that number as page_no.
+Born-digital pages are given as their extracted text layer (layout preserved) instead of an image; read them exactly like page images.
+
+## CROSS-PAGE DEDUPLICATION
+
+- If the same item appears on multiple pages, extract it ONLY ONCE
+- Use the page with the most complete information
+- Skip duplicate/continued entries on other pages
+
+## OUTPUT FORMAT (MULTI-PAGE)
+
+Return ONE JSON object with ALL pages:
+{
+  "pages": [
+    {
+      "page_no": "1",
+      "page_type": "Pharmacy | Bill Detail | Final Bill",
+      "bill_items": [
+        {
+          "item_name": "string",
+          "item_amount": float,
+          "item_rate": float,
+          "item_quantity": float
+        }
+      ]
+    }
+  ]
+}
+"""
+
+# Same rules as EXTRACTION_PROMPT + MULTI_PAGE_INSTRUCTIONS in about a quarter of the tokens
+COMPACT_EXTRACTION_PROMPT = """Extract line items from medical bill pages as JSON. Never count an amount twice.
+
+Page types (judge by content, not titles):
+- Pharmacy: medicines with batch numbers, HSN codes or drug names
+- Bill Detail: a table of line items with a numeric QTY and an amount per row (even below patient headers)
+- Final Bill: only totals and sub-totals, no line items
+
+Extract only leaf rows: a specific item or service with a numeric QTY and its own amount.
+Skip:
+- parent/category rows (broad name like "WARD CHARGES", QTY 1 or empty, amount = sum of the rows below)
+- subtotal, total, tax, discount and round-off rows
+- column headers, patient details, bill metadata, page numbers
+
+Fields: item_name = full description; item_quantity = QTY as float; item_rate = RATE (amount / quantity
+if missing); item_amount = the row's own amount (AMOUNT or COMPANY AMOUNT).
+"""
+
+COMPACT_MULTI_PAGE_INSTRUCTIONS = """
+Each page is preceded by "Page N:"; use N as page_no. Text pages are the text layer of a born-digital page.
+An item repeated on several pages is extracted once, from its most complete page.
+
+Output: {"pages": [{"page_no": "1", "page_type": "Pharmacy | Bill Detail | Final Bill",
+"bill_items": [{"item_name": "string", "item_amount": float, "item_rate": float, "item_quantity": float}]}]}
+"""
+
+# Versioned prompt variants: extraction rules + static multi-page instructions.
+# A changed text gets a new version so results and measurements stay comparable.
+PROMPT_VARIANTS = {
+    "full-v1": {"instructions": EXTRACTION_PROMPT, "multi_page": MULTI_PAGE_INSTRUCTIONS},
+    "compact-v1": {"instructions": COMPACT_EXTRACTION_PROMPT, "multi_page": COMPACT_MULTI_PAGE_INSTRUCTIONS},
+}
+
 
     # Ignored row patterns
 IGNORED_PATTERNS = [
@@ -128,3 +207,26 @@ IGNORED_PATTERNS = [
         "discount", "round off", "roundoff",
         "description", "qty", "rate", "amount"
     ]
+
+# Column headers of line-item tables (the tail of IGNORED_PATTERNS)
+LINE_ITEM_HEADER_PATTERNS = ["description", "qty", "rate", "amount"]
+
+# Wording of pages that carry no line items (cover sheets, summaries, clinical notes)
+NON_ITEM_PAGE_PATTERNS = [
+    PageType.FINAL_BILL.value.lower(), "bill summary", "summary of charges",
+    "discharge summary", "discharge advice", "diagnosis", "clinical notes",
+    "patient details", "admission details", "terms and conditions", "declaration"
+]
+
+# Local page classifier modes
+PAGE_CLASSIFIER_MODES = ["off", "conservative", "aggressive"]
+
+# Page hash algorithms: smallest hash size that still tells pages of one bill
+# template apart, and the default duplicate distance as a share of the hash
+# bits. On synthetic bill pages, distinct pages were at least 16% (phash 16),
+# 27% (phash 32) and 7% (dhash 32) of the bits apart; re-encoded copies at
+# most 7% (phash) and 6% (dhash). Smaller dhash sizes overlap completely.
+PAGE_HASH_ALGORITHMS = {
+    "phash": {"min_size": 16, "max_distance": 0.12},
+    "dhash": {"min_size": 32, "max_distance": 0.05},
+}
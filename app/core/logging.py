@@ -1,25 +1,52 @@
+import json
 import logging
 import sys
 from app.core.config import get_settings
 
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        
+        # Structured records (e.g. the per-request timing line) carry their fields
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            entry.update(fields)
+        else:
+            entry["message"] = record.getMessage()
+        
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
 def setup_logging():
     """Configure application logging"""
     settings = get_settings()
     
     # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if settings.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
     
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
     
-    # Root logger
+    # Root logger (replace handlers so repeated calls do not duplicate lines)
     root_logger = logging.getLogger()
     root_logger.setLevel(settings.LOG_LEVEL)
-    root_logger.addHandler(console_handler)
+    root_logger.handlers = [console_handler]
     
     # Suppress noisy loggers
     logging.getLogger("httpx").setLevel(logging.WARNING)
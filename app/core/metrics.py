@@ -0,0 +1,255 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.request_timing import record_stage
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+PAGE_BUCKETS = (1, 2, 3, 5, 10, 20, 40, 80, 160, 320)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base class for a metric family with a fixed set of label names.
+
+    Samples are kept in a plain dict keyed by the tuple of label values.
+    Updates take no lock: they are single dict / list operations made from
+    the event loop thread, and a scrape racing an update at worst sees a
+    histogram one observation behind, which Prometheus tolerates.
+    """
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(metric name, formatted labels, value) tuples for the exposition"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [
+            (self.name, _format_labels(self.labelnames, labelvalues), value)
+            for labelvalues, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, or is read from a callback at scrape time"""
+
+    metric_type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def set(self, value: float, *labelvalues: str):
+        self._values[labelvalues] = value
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) - amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        if self.callback is not None:
+            return [(self.name, "", float(self.callback()))]
+        return [
+            (self.name, _format_labels(self.labelnames, labelvalues), value)
+            for labelvalues, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(Metric):
+    """
+    Distribution over fixed buckets.
+
+    Each observation increments a single (non-cumulative) bucket; the
+    cumulative counts Prometheus expects are only built at scrape time.
+    """
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        if not self.labelnames:
+            self._values[()] = [[0] * (len(self.buckets) + 1), 0.0]
+
+    def observe(self, value: float, *labelvalues: str):
+        state = self._values.get(labelvalues)
+        if state is None:
+            state = self._values.setdefault(labelvalues, [[0] * (len(self.buckets) + 1), 0.0])
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        labelnames = self.labelnames + ("le",)
+        for labelvalues, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_value(bound)
+                samples.append((f"{self.name}_bucket", _format_labels(labelnames, labelvalues + (le,)), cumulative))
+            labels = _format_labels(self.labelnames, labelvalues)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Metric families exposed on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = STAGE_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metric families in the Prometheus text format"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "bill_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"]
+)
+document_seconds = registry.histogram(
+    "bill_document_duration_seconds", "Processing time per document after download (cache lookup to response)", ["outcome"]
+)
+documents_in_flight = registry.gauge(
+    "bill_documents_in_flight", "Documents currently being processed"
+)
+document_pages = registry.histogram(
+    "bill_document_pages", "Pages per processed document", buckets=PAGE_BUCKETS
+)
+download_bytes = registry.counter(
+    "bill_download_bytes_total", "Bytes of documents downloaded"
+)
+errors = registry.counter(
+    "bill_errors_total", "Errors by pipeline stage and exception class", ["stage", "error_class"]
+)
+gemini_request_seconds = registry.histogram(
+    "bill_gemini_request_duration_seconds", "Gemini generate_content latency", ["model", "outcome"]
+)
+gemini_tokens = registry.counter(
+    "bill_gemini_tokens_total", "Gemini tokens billed", ["model", "direction"]
+)
+scheduler_wait_seconds = registry.histogram(
+    "bill_gemini_scheduler_wait_seconds", "Time Gemini calls waited for a scheduler slot",
+    buckets=WAIT_BUCKETS
+)
+job_queue_wait_seconds = registry.histogram(
+    "bill_job_queue_wait_seconds", "Time jobs waited in the queue before a worker took them",
+    buckets=WAIT_BUCKETS
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration in the histogram and in the current request's timings"""
+    stage_seconds.observe(seconds, stage)
+    record_stage(stage, seconds)
+
+
+class time_stage:
+    """
+    Context manager recording the duration of a pipeline stage.
+
+    The duration goes to bill_stage_duration_seconds and to the timings of
+    the current request. An exception leaving the block is also counted in
+    bill_errors_total under the same stage.
+
+    Example:
+        with time_stage("render"):
+            pages = await render(...)
+    """
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.started = 0.0
+
+    def __enter__(self) -> "time_stage":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        observe_stage(self.stage, time.perf_counter() - self.started)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            errors.inc(self.stage, exc_type.__name__)
+        return False
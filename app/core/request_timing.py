@@ -0,0 +1,158 @@
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from starlette.datastructures import Headers, QueryParams
+
+logger = logging.getLogger("app.request")
+
+REQUEST_ID_HEADER = "x-request-id"
+TIMINGS_HEADER = "x-include-timings"
+TIMINGS_QUERY_PARAM = "timings"
+MAX_REQUEST_ID_LENGTH = 128
+
+# Health checks and scrapes would drown the per-request log
+QUIET_PATHS = {"/health", "/metrics"}
+
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+
+class RequestTimings:
+    """
+    Stage durations and counters collected while serving one request.
+
+    Every task spawned for the request (batch documents, page chunks)
+    inherits the same instance through the context variable, so stage
+    times are summed across documents and can exceed the wall time.
+    """
+
+    def __init__(self, request_id: str, include_in_response: bool = False):
+        self.request_id = request_id
+        self.include_in_response = include_in_response
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add_stage(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_count(self, name: str, amount: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Timing block returned in responses and written to the request log"""
+        return {
+            "request_id": self.request_id,
+            "total_ms": self.elapsed_ms(),
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+            "documents": self.counts.get("documents", 0),
+            "cache_hits": self.counts.get("cache_hits", 0),
+            "pages": self.counts.get("pages", 0),
+            "bytes": self.counts.get("bytes", 0),
+            "input_tokens": self.counts.get("input_tokens", 0),
+            "output_tokens": self.counts.get("output_tokens", 0),
+            "gemini_calls": self.counts.get("gemini_calls", 0),
+        }
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings of the request being served, or None outside a request"""
+    return _current_timings.get()
+
+
+def record_stage(stage: str, seconds: float):
+    """Add time spent in a stage to the current request, if any"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_stage(stage, seconds)
+
+
+def record_count(name: str, amount: int = 1):
+    """Add to a counter (documents, pages, bytes, tokens) of the current request, if any"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_count(name, amount)
+
+
+def timings_block() -> Optional[Dict[str, Any]]:
+    """The timings block to add to a response, when the client asked for it"""
+    timings = _current_timings.get()
+    if timings is None or not timings.include_in_response:
+        return None
+    return timings.as_dict()
+
+
+@contextmanager
+def request_timing(request_id: str, include_in_response: bool = False) -> Iterator[RequestTimings]:
+    """Collect timings for the code inside the block (and the tasks it starts)"""
+    timings = RequestTimings(request_id, include_in_response)
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def log_request_timings(timings: RequestTimings, **fields: Any):
+    """Write one structured log line for a finished request or job"""
+    record = {"event": "request", **fields, **timings.as_dict()}
+    logger.info(json.dumps(record, separators=(",", ":")), extra={"fields": record})
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware that opens a timing context per HTTP request.
+
+    The request id is taken from X-Request-ID (or generated) and echoed in
+    the response headers. The timings block is added to responses when the
+    request has "X-Include-Timings: true" or "?timings=true". A JSON log
+    line is written once the response body, streamed or not, has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        query = QueryParams(scope.get("query_string", b""))
+        request_id = headers.get(REQUEST_ID_HEADER, "")[:MAX_REQUEST_ID_LENGTH] or uuid.uuid4().hex
+        include = (
+            headers.get(TIMINGS_HEADER, "").lower() in TRUE_VALUES
+            or query.get(TIMINGS_QUERY_PARAM, "").lower() in TRUE_VALUES
+        )
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode("latin-1"), request_id.encode("latin-1", errors="replace"))
+                ]
+            await send(message)
+
+        with request_timing(request_id, include) as timings:
+            try:
+                await self.app(scope, receive, send_with_request_id)
+            finally:
+                if scope["path"] not in QUIET_PATHS:
+                    log_request_timings(
+                        timings,
+                        method=scope["method"],
+                        path=scope["path"],
+                        status=status_code
+                    )
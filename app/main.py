@@ -1,21 +1,50 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
+from app.core.clients import init_clients, close_clients, client_stats
 from app.core.config import get_settings
-from app.api.routes import extraction
+from app.core.logging import setup_logging
+from app.core.metrics import CONTENT_TYPE, registry
+from app.core.request_timing import RequestTimingMiddleware
+from app.api.routes import extraction, jobs
+from app.services.cache_service import get_result_cache
+from app.services.cascade_service import cascade_stats
+from app.services.coalescing import document_flights
+from app.services.download_cache import get_download_cache
+from app.services.prompt_cache import close_prompt_cache, get_prompt_cache, prompt_stats
+from app.services.job_service import start_job_service, stop_job_service, get_job_service
+from app.services.resilience import resilience_stats
+from app.services.scheduler_service import init_gemini_scheduler, get_gemini_scheduler
+from app.services.worker_pool import init_worker_pool, get_worker_pool, shutdown_worker_pool
+from app.utils.image_utils import profile_stats
+from app.utils.page_classifier import classifier_stats
+from app.utils.page_hash import page_dedup_stats
+from app.utils.pdf_text import text_layer_stats
 
 settings = get_settings()
 
 # Configure logging
-logging.basicConfig(
-    level=settings.LOG_LEVEL,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create process-wide resources shared by all requests"""
+    init_clients()
+    init_gemini_scheduler()
+    init_worker_pool()
+    await start_job_service()
+    yield
+    await stop_job_service()
+    shutdown_worker_pool()
+    await close_prompt_cache()
+    await close_clients()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
@@ -23,7 +52,8 @@ app = FastAPI(
     debug=settings.DEBUG,
     description="Extract line items from medical bills using AI",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -33,10 +63,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# Request id, per-request timings and the structured request log
+app.add_middleware(RequestTimingMiddleware)
+
 # Include routers
 app.include_router(extraction.router, tags=["Extraction"])
+app.include_router(jobs.router, tags=["Jobs"])
 
 @app.get("/")
 async def root():
@@ -56,6 +91,35 @@ async def health_check():
         "service": settings.APP_NAME
     }
 
+@app.get("/stats")
+async def stats():
+    """Runtime statistics for shared resources"""
+    return {
+        "http_pool": client_stats(),
+        "gemini_scheduler": get_gemini_scheduler().stats(),
+        "worker_pool": get_worker_pool().stats(),
+        "result_cache": get_result_cache().stats(),
+        "download_cache": get_download_cache().stats(),
+        "jobs": await get_job_service().stats(),
+        "image_profiles": profile_stats.as_dict(),
+        "text_layer": text_layer_stats.as_dict(),
+        "page_classifier": classifier_stats.as_dict(),
+        "page_dedup": page_dedup_stats.as_dict(),
+        "gemini_resilience": resilience_stats(),
+        "model_cascade": cascade_stats.as_dict(),
+        "coalescing": document_flights.stats(),
+        "prompts": {
+            "variant": settings.PROMPT_VARIANT,
+            "variants": prompt_stats.as_dict(),
+            "prefix_cache": get_prompt_cache().stats()
+        }
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     logger.info(f"Starting {settings.APP_NAME} on {settings.HOST}:{settings.PORT}")
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Optional, Union
 from PIL import Image
+import os
 
 @dataclass
 class ProcessingResult:
@@ -18,3 +19,60 @@ class DocumentContext:
     file_type: str
     total_pages: int
     images: List[Image.Image]
+
+
+@dataclass
+class PageImage:
+    """
+    Encoded page image ready to be sent to the model.
+
+    Born-digital pages can carry their text layer instead (text is set and
+    data is empty); width and height are then the size the page would have
+    been rendered at.
+    """
+    page_no: int
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    text: Optional[str] = None
+
+
+@dataclass
+class SpooledDocument:
+    """
+    Document body held in memory, or spooled to a temporary file when large.
+
+    Workers read spooled documents by path, so the body is never copied
+    into additional bytes buffers.
+    """
+    content_type: str
+    size: int
+    sha256: str
+    content: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """In-memory bytes or the path of the spooled file"""
+        return self.content if self.content is not None else self.path
+
+    def head(self, length: int) -> bytes:
+        """First bytes of the document, for file type detection"""
+        if self.content is not None:
+            return self.content[:length]
+        with open(self.path, 'rb') as spooled_file:
+            return spooled_file.read(length)
+
+    def read_bytes(self) -> bytes:
+        """Whole document body as bytes"""
+        if self.content is not None:
+            return self.content
+        with open(self.path, 'rb') as spooled_file:
+            return spooled_file.read()
+
+    def close(self):
+        """Remove the spooled file, if any"""
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+            self.path = None
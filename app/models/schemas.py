@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, HttpUrl, model_validator
+from datetime import datetime
 from typing import List, Optional, Union
-from app.core.constants import PageType
+from app.core.constants import PageType, IMAGE_PROFILES, PROMPT_VARIANTS
 
 class BillItem(BaseModel):
     """Individual line item from a bill"""
@@ -43,6 +44,19 @@ class ErrorResponse(BaseModel):
     message: str = Field(..., description="Error message")
 
 
+class JobStatus(BaseModel):
+    """Status of an asynchronous extraction job"""
+    job_id: str = Field(..., description="Job identifier")
+    status: str = Field(..., description="queued, running, completed or failed")
+    created_at: datetime = Field(..., description="When the job was submitted")
+    started_at: Optional[datetime] = Field(default=None, description="When a worker picked the job up")
+    finished_at: Optional[datetime] = Field(default=None, description="When the job finished")
+    expires_at: Optional[datetime] = Field(default=None, description="When the result will be deleted")
+    error: Optional[str] = Field(default=None, description="Error message for failed jobs")
+    status_url: str = Field(..., description="URL to poll for the job status")
+    result_url: str = Field(..., description="URL of the job result")
+
+
 class DocumentRequest(BaseModel):
     """
     Request body for document extraction.
@@ -55,6 +69,8 @@ class DocumentRequest(BaseModel):
     """
     document: Optional[str] = Field(default=None, description="Single document URL")
     documents: Optional[List[str]] = Field(default=None, description="List of document URLs for batch processing")
+    image_profile: Optional[str] = Field(default=None, description="Page image profile: original, fast, balanced or accurate")
+    prompt_variant: Optional[str] = Field(default=None, description="Extraction prompt variant, e.g. full-v1 or compact-v1")
     
     @model_validator(mode='after')
     def validate_document_fields(self):
@@ -68,6 +84,12 @@ class DocumentRequest(BaseModel):
         if has_single and has_multiple:
             raise ValueError("Cannot provide both 'document' and 'documents'. Use one or the other.")
         
+        if self.image_profile is not None and self.image_profile not in IMAGE_PROFILES:
+            raise ValueError(f"Unknown image_profile. Use one of: {', '.join(IMAGE_PROFILES)}")
+        
+        if self.prompt_variant is not None and self.prompt_variant not in PROMPT_VARIANTS:
+            raise ValueError(f"Unknown prompt_variant. Use one of: {', '.join(PROMPT_VARIANTS)}")
+        
         return self
     
     @property
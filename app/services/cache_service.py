@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from functools import lru_cache
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from app.core.config import get_settings
+from app.utils.page_hash import max_hash_distance
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def build_cache_key(content_hash: str, prompt_fingerprint: str, image_profile: str) -> str:
+    """
+    Build a content-addressed cache key for an extraction result.
+
+    The key covers everything that changes the model output: the document
+    bytes, the model (or the model tiers and their checks) and its
+    temperature, the rasterization DPI and page limit, the image profile,
+    the text layer threshold, the page classifier and page dedup settings,
+    the chunking settings, item dedup post-processing and the prompt.
+
+    Args:
+        content_hash: SHA-256 hex digest of the document bytes
+        prompt_fingerprint: Fingerprint of the extraction prompt
+        image_profile: Name of the image profile used for the pages
+
+    Returns:
+        Hex digest usable as a cache key
+    """
+    key_parts = [
+        content_hash,
+        (
+            f"{settings.GEMINI_MODEL_TIERS}:{settings.CASCADE_ARITHMETIC_TOLERANCE}:"
+            f"{settings.CASCADE_MAX_MISMATCH_RATIO}:{settings.CASCADE_TOTAL_TOLERANCE}"
+            if settings.GEMINI_MODEL_TIERS.strip() else settings.GEMINI_MODEL
+        ),
+        repr(float(settings.GEMINI_TEMPERATURE)),
+        str(settings.PDF_DPI),
+        str(settings.MAX_PAGES),
+        image_profile,
+        str(settings.TEXT_LAYER_MIN_CHARS if settings.TEXT_LAYER_ENABLED else 0),
+        settings.PAGE_CLASSIFIER_MODE,
+        (
+            f"{settings.PAGE_HASH_ALGORITHM}:{settings.PAGE_HASH_SIZE}:"
+            f"{max_hash_distance(settings.PAGE_HASH_ALGORITHM, settings.PAGE_HASH_SIZE, settings.PAGE_DEDUP_MAX_DISTANCE)}"
+            if settings.PAGE_DEDUP_ENABLED else "no-page-dedup"
+        ),
+        (
+            f"{settings.CHUNKED_EXTRACTION_THRESHOLD_PAGES}:{settings.CHUNK_SIZE_PAGES}:"
+            f"{settings.CHUNK_OVERLAP_PAGES}"
+            if settings.CHUNKED_EXTRACTION_THRESHOLD_PAGES else "no-chunking"
+        ),
+        "item-dedup" if settings.DEDUP_POST_PROCESSING else "no-item-dedup",
+        prompt_fingerprint,
+    ]
+    return hashlib.sha256("|".join(key_parts).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache for extraction results.
+
+    - Memory tier: in-process LRU evicted by total serialized size
+    - Disk tier: SQLite file with a TTL, shared across restarts
+
+    Values are stored as serialized JSON so every hit returns a fresh copy.
+    """
+
+    def __init__(self, memory_max_bytes: int, db_path: Optional[str], ttl_seconds: int):
+        self.memory_max_bytes = memory_max_bytes
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._memory_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        if self.db_path:
+            try:
+                self._init_db()
+            except Exception as error:
+                logger.warning(f"Result cache disk tier disabled: {str(error)}")
+                self.db_path = None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection that commits on success, rolls back on error and is always closed"""
+        with closing(sqlite3.connect(self.db_path)) as connection, connection:
+            yield connection
+
+    def _init_db(self):
+        """Create the SQLite table if it does not exist yet"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "cache_key TEXT PRIMARY KEY, "
+                "value BLOB NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result, memory tier first.
+
+        Args:
+            key: Cache key from build_cache_key
+
+        Returns:
+            Cached data dict, or None on a miss
+        """
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(value)
+            self._remove_from_memory(key)
+
+        if self.db_path:
+            try:
+                row = await asyncio.to_thread(self._read_disk, key, now)
+            except Exception as error:
+                logger.warning(f"Result cache read failed: {str(error)}")
+                row = None
+
+            if row is not None:
+                value, expires_at = row
+                self._store_in_memory(key, value, expires_at)
+                self.disk_hits += 1
+                return json.loads(value)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, data: Dict[str, Any]):
+        """
+        Store a result in both tiers.
+
+        Args:
+            key: Cache key from build_cache_key
+            data: JSON-serializable result data
+        """
+        value = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        expires_at = time.time() + self.ttl_seconds
+
+        self._store_in_memory(key, value, expires_at)
+        self.stores += 1
+
+        if self.db_path:
+            try:
+                await asyncio.to_thread(self._write_disk, key, value, expires_at)
+            except Exception as error:
+                logger.warning(f"Result cache write failed: {str(error)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory tier usage"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+    def _store_in_memory(self, key: str, value: bytes, expires_at: float):
+        """Insert into the LRU tier and evict least recently used entries"""
+        if len(value) > self.memory_max_bytes:
+            return
+
+        self._remove_from_memory(key)
+        self._memory[key] = (value, expires_at)
+        self._memory_bytes += len(value)
+
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _remove_from_memory(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[0])
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[bytes, float]]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT value, expires_at FROM results WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+
+        if row is None or row[1] <= now:
+            return None
+        return bytes(row[0]), row[1]
+
+    def _write_disk(self, key: str, value: bytes, expires_at: float):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results (cache_key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            connection.execute(
+                "DELETE FROM results WHERE expires_at <= ?",
+                (time.time(),)
+            )
+
+
+@lru_cache()
+def get_result_cache() -> ResultCache:
+    """Get the process-wide result cache"""
+    db_path = None
+    if settings.RESULT_CACHE_DIR:
+        db_path = os.path.join(settings.RESULT_CACHE_DIR, "results.sqlite3")
+
+    return ResultCache(
+        memory_max_bytes=settings.RESULT_CACHE_MEMORY_MAX_MB * 1024 * 1024,
+        db_path=db_path,
+        ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS
+    )
@@ -0,0 +1,261 @@
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+from app.core.request_timing import record_count
+from app.models.domain import PageImage
+from app.services.gemini_service import GeminiService
+from app.utils.validators import final_bill_total_mismatch, find_failed_pages, replace_pages
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+escalations_total = registry.counter(
+    "bill_cascade_escalations_total", "Documents and pages re-extracted with the next model tier",
+    ["model", "reason"]
+)
+tier_seconds = registry.histogram(
+    "bill_cascade_tier_duration_seconds", "Extraction time per model tier, retries and chunks included", ["model"]
+)
+
+
+def model_tiers() -> List[str]:
+    """Configured models, cheapest first; just GEMINI_MODEL without a cascade"""
+    tiers = [model.strip() for model in settings.GEMINI_MODEL_TIERS.split(",") if model.strip()]
+    return tiers or [settings.GEMINI_MODEL]
+
+
+class CascadeStats:
+    """Escalation rate and per-tier tokens and latency of the model cascade"""
+
+    def __init__(self):
+        self.documents = 0
+        self.escalated_documents = 0
+        self.escalated_pages = 0
+        self.reasons: Dict[str, int] = defaultdict(int)
+        self.tiers: Dict[str, Dict[str, Any]] = {}
+
+    def record_tier(self, model: str, pages: int, seconds: float, token_usage: Dict[str, int], success: bool):
+        """Record one extraction with a tier (one or more Gemini calls)"""
+        tier = self.tiers.setdefault(model, {
+            "calls": 0, "pages": 0, "failures": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0
+        })
+        tier["calls"] += 1
+        tier["pages"] += pages
+        tier["failures"] += 0 if success else 1
+        tier["input_tokens"] += token_usage.get("input_tokens") or 0
+        tier["output_tokens"] += token_usage.get("output_tokens") or 0
+        tier["seconds"] += seconds
+
+    def record_document(self, escalations: List[Dict[str, Any]]):
+        """Record the escalations of one document"""
+        self.documents += 1
+        if escalations:
+            self.escalated_documents += 1
+        for escalation in escalations:
+            self.escalated_pages += len(escalation["pages"])
+            self.reasons[escalation["reason"]] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "tiers": model_tiers(),
+            "documents": self.documents,
+            "escalated_documents": self.escalated_documents,
+            "escalation_rate": self.escalated_documents / self.documents if self.documents else 0.0,
+            "escalated_pages": self.escalated_pages,
+            "escalation_reasons": dict(self.reasons),
+            "per_tier": {
+                model: {
+                    **{key: value for key, value in tier.items() if key != "seconds"},
+                    "mean_seconds": round(tier["seconds"] / tier["calls"], 3) if tier["calls"] else 0.0,
+                }
+                for model, tier in self.tiers.items()
+            },
+        }
+
+
+cascade_stats = CascadeStats()
+
+
+class ModelCascade:
+    """
+    Tiered extraction: a fast model first, stronger models only where its output fails local checks.
+
+    After each tier but the last, the raw output is checked without another
+    model call:
+    - the detail item sum against the Final Bill total (whole document)
+    - rate x quantity against amount, and detail pages without items (per page)
+    A document failing the total check is re-extracted whole with the next
+    tier; failing pages are re-extracted on their own and replace the
+    earlier output for those pages. If an escalation call fails, the
+    previous tier's output is kept and reported as a warning.
+    """
+
+    def __init__(self, gemini_service: GeminiService, tiers: Optional[List[str]] = None):
+        self.gemini_service = gemini_service
+        self.tiers = tiers or model_tiers()
+
+    async def analyze(
+        self,
+        images: List[PageImage],
+        total_pages: int,
+        deadline: Optional[float] = None,
+        on_page: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract a document through the model tiers.
+
+        Args:
+            images: Encoded page images
+            total_pages: Total number of pages in the document
+            deadline: time.monotonic() value by which every call must finish
+            on_page: Called with each page as it is generated (see GeminiService)
+
+        Returns:
+            Dict in the GeminiService result format; with more than one tier
+            it also has a "cascade" report and "warnings"
+        """
+        if len(self.tiers) == 1:
+            result, _ = await self._run_tier(self.tiers[0], images, total_pages, deadline, on_page)
+            return result
+
+        token_usage = {"total_tokens": 0, "input_tokens": 0, "output_tokens": 0}
+        tier_usage = {}
+        escalations = []
+        failed_chunks = []
+        pages: List[Dict[str, Any]] = []  # accepted output
+        fallback: List[Dict[str, Any]] = []  # previous tier's output for the pages being re-extracted
+        pending = images
+        last_error = None
+        warnings = []
+
+        for index, model in enumerate(self.tiers):
+            is_last = index == len(self.tiers) - 1
+            result, seconds = await self._run_tier(model, pending, total_pages, deadline, on_page)
+
+            for key in token_usage:
+                token_usage[key] += result["token_usage"].get(key) or 0
+            usage = tier_usage.setdefault(model, {"pages": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0})
+            usage["pages"] += len(pending)
+            usage["input_tokens"] += result["token_usage"].get("input_tokens") or 0
+            usage["output_tokens"] += result["token_usage"].get("output_tokens") or 0
+            usage["seconds"] = round(usage["seconds"] + seconds, 3)
+
+            if not result.get("success", False):
+                last_error = f"{model}: {result.get('error', 'Unknown error')}"
+                if not is_last:
+                    escalations.append(self._escalate(index, "call_failed", pending))
+                continue
+
+            last_error = None
+            tier_pages = result.get("pages", [])
+            failed_chunks.extend(result.get("failed_chunks", []))
+            # Warnings (cut-off output) only matter for output that is kept
+            tier_warnings = result.get("warnings", [])
+            if is_last:
+                pages = replace_pages(pages, tier_pages)
+                warnings.extend(tier_warnings)
+                break
+
+            # Step 1: Whole-document check, only meaningful when every page was in this call
+            if len(pending) == len(images) and final_bill_total_mismatch(
+                tier_pages, settings.CASCADE_TOTAL_TOLERANCE
+            ):
+                fallback = tier_pages
+                escalations.append(self._escalate(index, "final_bill_total", pending))
+                continue
+
+            # Step 2: Per-page checks
+            failed = find_failed_pages(
+                tier_pages, settings.CASCADE_ARITHMETIC_TOLERANCE, settings.CASCADE_MAX_MISMATCH_RATIO
+            )
+            if not failed:
+                pages = replace_pages(pages, tier_pages)
+                warnings.extend(tier_warnings)
+                break
+
+            images_by_page_no = {str(image.page_no): image for image in pending}
+            if any(page_no not in images_by_page_no for page_no in failed):
+                # The model numbered pages that were not sent; re-extract everything it saw
+                fallback = tier_pages
+                escalations.append(self._escalate(index, "unknown_page", pending))
+                continue
+
+            pages = replace_pages(pages, [
+                page for page in tier_pages if str(page.get("page_no", "")) not in failed
+            ])
+            warnings.extend(tier_warnings)
+            fallback = [page for page in tier_pages if str(page.get("page_no", "")) in failed]
+            pending = [images_by_page_no[page_no] for page_no in sorted(failed, key=lambda no: int(no))]
+            for reason in sorted(set(failed.values())):
+                escalations.append(self._escalate(index, reason, [
+                    images_by_page_no[page_no] for page_no, page_reason in failed.items() if page_reason == reason
+                ]))
+
+        cascade_stats.record_document(escalations)
+        record_count("cascade_escalations", len(escalations))
+        report = {"tiers": self.tiers, "escalations": escalations, "tier_usage": tier_usage}
+
+        if last_error is not None:
+            if not pages and not fallback:
+                return {
+                    "success": False,
+                    "pages": [],
+                    "token_usage": token_usage,
+                    "error": last_error,
+                    "cascade": report
+                }
+            pages = replace_pages(pages, fallback)
+            warnings.append(f"Escalation failed ({last_error}); kept the previous model's output for those pages")
+
+        return {
+            "success": True,
+            "pages": pages,
+            "token_usage": token_usage,
+            "failed_chunks": failed_chunks,
+            "warnings": warnings,
+            "cascade": report
+        }
+
+    async def _run_tier(
+        self,
+        model: str,
+        images: List[PageImage],
+        total_pages: int,
+        deadline: Optional[float],
+        on_page: Optional[Callable[[Dict[str, Any]], None]]
+    ) -> Tuple[Dict[str, Any], float]:
+        """Extract pages with one model, in parallel chunks when the pages sent reach the threshold"""
+        threshold = settings.CHUNKED_EXTRACTION_THRESHOLD_PAGES
+        started = time.perf_counter()
+        if threshold and len(images) >= threshold:
+            result = await self.gemini_service.analyze_chunked(
+                images=images, total_pages=total_pages, deadline=deadline, model=model, on_page=on_page
+            )
+        else:
+            result = await self.gemini_service.analyze_full_document(
+                images=images, total_pages=total_pages, deadline=deadline, model=model, on_page=on_page
+            )
+        seconds = time.perf_counter() - started
+
+        if len(self.tiers) > 1:
+            tier_seconds.observe(seconds, model)
+            cascade_stats.record_tier(model, len(images), seconds, result["token_usage"], result.get("success", False))
+        return result, seconds
+
+    def _escalate(self, index: int, reason: str, images: List[PageImage]) -> Dict[str, Any]:
+        """Record that images go from tier index to the next tier"""
+        model = self.tiers[index]
+        escalations_total.inc(model, reason)
+        logger.info(
+            f"Escalating {len(images)} page(s) from {model} to {self.tiers[index + 1]} ({reason})"
+        )
+        return {
+            "from_model": model,
+            "to_model": self.tiers[index + 1],
+            "reason": reason,
+            "pages": [image.page_no for image in images]
+        }
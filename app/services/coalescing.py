@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+coalesced_total = registry.counter(
+    "bill_coalesced_requests_total", "Extractions that joined an identical one already in flight", ["kind"]
+)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a document URL for coalescing.
+
+    Scheme and host are lowercased, default ports and the fragment are
+    dropped and an empty path becomes "/". The query string is kept as is:
+    signed URLs depend on it.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def collapse_duplicates(keys: List[str]) -> Tuple[List[int], List[List[int]]]:
+    """
+    Group equal keys, keeping first occurrences in order.
+
+    Returns:
+        Tuple of (index of the first occurrence of each distinct key,
+        indices of all occurrences of each distinct key)
+    """
+    positions: Dict[str, List[int]] = {}
+    for index, key in enumerate(keys):
+        positions.setdefault(key, []).append(index)
+    groups = list(positions.values())
+    return [group[0] for group in groups], groups
+
+
+@dataclass
+class _Flight:
+    """One shared extraction and the callers waiting for it"""
+    task: Optional["asyncio.Future[Any]"] = None
+    waiters: int = 0
+    pages: List[Any] = field(default_factory=list)
+    listeners: List[Callable[[Any], None]] = field(default_factory=list)
+
+    def emit(self, page: Any):
+        """Pass a streamed page to every waiting caller, and keep it for late joiners"""
+        self.pages.append(page)
+        for listener in list(self.listeners):
+            listener(page)
+
+
+class SingleFlight:
+    """
+    Run at most one extraction per key; concurrent callers share it.
+
+    The first caller for a key starts the work in its own task; callers
+    arriving while it runs wait for the same result instead of repeating
+    the download, rendering and model calls. Pages streamed before a
+    caller joined are replayed to it. The work is cancelled only when
+    every waiting caller has gone (cancelled or timed out), so one client
+    giving up does not fail the others.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started: Dict[str, int] = defaultdict(int)
+        self.joined: Dict[str, int] = defaultdict(int)
+
+    def is_running(self, key: str) -> bool:
+        """Whether a caller for key would join an extraction already in flight"""
+        return key in self._flights
+
+    async def run(
+        self,
+        kind: str,
+        key: str,
+        work: Callable[[Callable[[Any], None]], Awaitable[Any]],
+        on_page: Optional[Callable[[Any], None]] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Run work for key, or wait for the run already in flight.
+
+        Args:
+            kind: What the key identifies ("url" or "content"), for stats
+            key: Coalescing key
+            work: Coroutine function doing the extraction; called with a page
+                callback that fans streamed pages out to every caller
+            on_page: This caller's page callback
+
+        Returns:
+            Tuple of (result, whether it was shared from another caller's run)
+        """
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(work(flight.emit))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.started[kind] += 1
+        else:
+            self.joined[kind] += 1
+            coalesced_total.inc(kind)
+            logger.info(f"Joined in-flight extraction ({kind})")
+            if on_page is not None:
+                for page in flight.pages:
+                    on_page(page)
+
+        if on_page is not None:
+            flight.listeners.append(on_page)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), joined
+        finally:
+            flight.waiters -= 1
+            if on_page is not None:
+                flight.listeners.remove(on_page)
+            if flight.waiters == 0 and not flight.task.done():
+                # Later callers start afresh instead of joining a cancelled run
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "started": dict(self.started),
+            "joined": dict(self.joined),
+        }
+
+
+document_flights = SingleFlight()
@@ -1,11 +1,18 @@
-from pdf2image import convert_from_bytes
-from PIL import Image
-import aiohttp
-from typing import List, Tuple
-import io
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 import logging
 
+from app.core.clients import get_http_session
 from app.core.config import get_settings
+from app.core.metrics import download_bytes
+from app.core.request_timing import record_count
+from app.core.constants import IMAGE_PROFILES
+from app.models.domain import PageImage, SpooledDocument
+from app.services.download_cache import DownloadCache, DownloadCacheEntry, get_download_cache
+from app.services.worker_pool import get_worker_pool
+from app.utils.file_utils import spool_response
+from app.utils.image_utils import count_pdf_pages, render_image, render_pdf_window
+from app.utils.page_hash import find_duplicate_pages, max_hash_distance, page_fingerprints
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -14,15 +21,24 @@ settings = get_settings()
 class DocumentService:
     """Service for handling document downloads and processing."""
     
-    async def download_document(self, url: str) -> Tuple[bytes, str]:
+    def __init__(self):
+        self.worker_pool = get_worker_pool()
+    
+    async def download_document(self, url: str) -> SpooledDocument:
         """
         Download a document from a URL.
         
+        The body is streamed in chunks, rejected as soon as it exceeds
+        MAX_FILE_SIZE_MB and spooled to disk when large. With the download
+        cache, a URL fetched before is revalidated with a conditional GET and
+        served from disk on 304 Not Modified. Callers must close() the
+        returned document.
+        
         Args:
             url: The web address of the document to download
             
         Returns:
-            Tuple of (content_bytes, content_type)
+            SpooledDocument with the body, content type, size and SHA-256
             
         Raises:
             Exception: If the download fails
@@ -30,77 +46,219 @@ class DocumentService:
         try:
             logger.info(f"Downloading document from: {url}")
             
-            async with aiohttp.ClientSession() as http_session:
-                async with http_session.get(url, timeout=settings.TIMEOUT_SECONDS) as response:
-                    if response.status != 200:
-                        raise Exception(f"Failed to download: HTTP {response.status}")
-                    
-                    file_content = await response.read()
-                    file_type = response.headers.get('Content-Type', '').lower()
-                    
-                    logger.info(f"Downloaded {len(file_content)} bytes, type: {file_type}")
-                    return file_content, file_type
+            cache = get_download_cache() if settings.DOWNLOAD_CACHE_ENABLED else None
+            entry = cache.lookup(url) if cache is not None else None
+            document = await self._fetch(url, cache, entry)
+            if document is None:
+                # The cached body disappeared after the 304; fetch it in full
+                document = await self._fetch(url, cache, None)
+            return document
                     
         except Exception as error:
             logger.error(f"Download failed: {str(error)}")
             raise
     
-    def process_document(self, content: bytes, content_type: str) -> List[Image.Image]:
+    async def _fetch(
+        self,
+        url: str,
+        cache: Optional[DownloadCache],
+        entry: Optional[DownloadCacheEntry]
+    ) -> Optional[SpooledDocument]:
         """
-        Convert document content into a list of images.
+        GET a URL, conditionally when a cached entry is given.
         
-        Args:
-            content: The raw file data as bytes
-            content_type: The MIME type of the file
-            
         Returns:
-            List of PIL Image objects
+            The document, or None when the server answered 304 but the cached
+            body could not be opened
         """
-        try:
-            output_images = []
+        http_session = get_http_session()
+        headers = cache.conditional_headers(entry) if entry is not None else None
+        async with http_session.get(url, headers=headers) as response:
+            if response.status == 304 and entry is not None:
+                document = await cache.open(entry)
+                if document is not None:
+                    record_count("download_bytes_saved", document.size)
+                    logger.info(f"Not modified, using {document.size} cached bytes, type: {document.content_type}")
+                return document
             
-            if 'pdf' in content_type:
-                logger.info("Processing as PDF")
-                output_images = convert_from_bytes(
-                    content,
-                    dpi=settings.PDF_DPI,
-                    fmt='png'
-                )
-            elif 'image' in content_type:
-                logger.info("Processing as Image")
-                image_file = io.BytesIO(content)
-                image = Image.open(image_file)
-                
-                if image.mode not in ('RGB', 'L'):
-                    image = image.convert('RGB')
-                
-                output_images = [image]
-            else:
-                output_images = self._try_to_open_unknown_file(content, content_type)
+            if response.status != 200:
+                raise Exception(f"Failed to download: HTTP {response.status}")
             
-            page_count = len(output_images)
-            logger.info(f"Processed document into {page_count} pages")
+            document = await spool_response(response)
+            download_bytes.inc(amount=document.size)
+            if cache is not None:
+                await cache.store(url, response.headers, document)
             
-            if page_count > settings.MAX_PAGES:
-                logger.warning(f"Document has {page_count} pages, limiting to {settings.MAX_PAGES}")
-                output_images = output_images[:settings.MAX_PAGES]
+            logger.info(f"Downloaded {document.size} bytes, type: {document.content_type}")
+            return document
+    
+    async def process_document(
+        self,
+        document: SpooledDocument,
+        image_profile: Optional[str] = None
+    ) -> List[PageImage]:
+        """
+        Convert document content into encoded page images.
+        
+        Collects the output of iter_pages into a list, because the whole
+        document goes to Gemini in one call (or in chunks that may overlap).
+        Memory is bounded by the encoded pages, at most MAX_PAGES of them,
+        plus one render window of decoded bitmaps (PDF_RENDER_WINDOW_PAGES);
+        decoded bitmaps never outlive their window. Callers that can handle pages
+        one at a time should use iter_pages instead.
+        
+        Args:
+            document: Downloaded or uploaded document
+            image_profile: Name of the image profile (defaults to IMAGE_PROFILE)
             
-            return output_images
+        Returns:
+            List of encoded pages
+        """
+        try:
+            output_pages = [page async for page in self.iter_pages(document, image_profile)]
+            record_count("bytes", document.size)
+            record_count("pages", len(output_pages))
+            logger.info(f"Processed document into {len(output_pages)} pages")
+            return output_pages
             
         except Exception as error:
             logger.error(f"Document processing failed: {str(error)}")
             raise
     
-    def _try_to_open_unknown_file(self, content: bytes, content_type: str) -> List[Image.Image]:
+    async def collapse_duplicate_pages(
+        self,
+        pages: List[PageImage]
+    ) -> Tuple[List[PageImage], Dict[int, Tuple[int, int]]]:
+        """
+        Drop pages that are near-identical copies of an earlier page.
+        
+        Pages are fingerprinted in the worker pool (PAGE_HASH_ALGORITHM on a
+        downscaled grayscale page) and compared by Hamming distance up to
+        PAGE_DEDUP_MAX_DISTANCE of the hash bits (per-algorithm default when
+        0). Kept pages keep their original page numbers.
+        
+        Args:
+            pages: Encoded pages in page order
+            
+        Returns:
+            Tuple of (kept pages, {duplicate page number: (kept page number, distance)})
+        """
+        fingerprints = await self.worker_pool.run(
+            page_fingerprints, pages, settings.PAGE_HASH_ALGORITHM, settings.PAGE_HASH_SIZE
+        )
+        max_distance = max_hash_distance(
+            settings.PAGE_HASH_ALGORITHM, settings.PAGE_HASH_SIZE, settings.PAGE_DEDUP_MAX_DISTANCE
+        )
+        duplicates = find_duplicate_pages([page.page_no for page in pages], fingerprints, max_distance)
+        
+        if duplicates:
+            logger.info(f"Collapsed {len(duplicates)} duplicate page(s): {duplicates}")
+        
+        return [page for page in pages if page.page_no not in duplicates], duplicates
+    
+    async def iter_pages(
+        self,
+        document: SpooledDocument,
+        image_profile: Optional[str] = None
+    ) -> AsyncIterator[PageImage]:
+        """
+        Stream encoded pages as they are rendered.
+        
+        Rasterization, colour conversion, profile preprocessing and encoding
+        run in the worker pool so the event loop is never blocked.
+        
+        Args:
+            document: Downloaded or uploaded document
+            image_profile: Name of the image profile (defaults to IMAGE_PROFILE)
+            
+        Yields:
+            Encoded pages in page order
+        """
+        content = document.source
+        content_type = document.content_type
+        profile = IMAGE_PROFILES[image_profile or settings.IMAGE_PROFILE]
+        
+        if 'pdf' in content_type:
+            logger.info("Processing as PDF")
+            page_count = await self.worker_pool.run(count_pdf_pages, content)
+            async for page in self._iter_pdf_pages(content, page_count, profile):
+                yield page
+        elif 'image' in content_type:
+            logger.info("Processing as Image")
+            for page in await self.worker_pool.run(render_image, content, profile):
+                yield page
+        else:
+            async for page in self._try_to_open_unknown_file(content, content_type, profile):
+                yield page
+    
+    async def _iter_pdf_pages(
+        self,
+        content: Union[bytes, str],
+        page_count: int,
+        profile: Optional[Dict[str, Any]]
+    ) -> AsyncIterator[PageImage]:
+        """
+        Render a PDF in windows of PDF_RENDER_WINDOW_PAGES pages.
+        
+        MAX_PAGES is applied from the PDF metadata before anything is
+        rendered. The next window renders while the current one is consumed,
+        so at most one window of decoded pages exists per document. Pages
+        with a usable text layer are sent as text instead (TEXT_LAYER_ENABLED).
+        
+        Args:
+            content: PDF bytes or path of the spooled file
+            page_count: Number of pages reported by the PDF metadata
+            profile: Image profile applied to every page
+            
+        Yields:
+            Encoded pages in page order
+        """
+        if page_count > settings.MAX_PAGES:
+            logger.warning(f"Document has {page_count} pages, limiting to {settings.MAX_PAGES}")
+            page_count = settings.MAX_PAGES
+        
+        window_size = max(1, settings.PDF_RENDER_WINDOW_PAGES)
+        windows = [
+            (first_page, min(first_page + window_size - 1, page_count))
+            for first_page in range(1, page_count + 1, window_size)
+        ]
+        
+        text_layer_min_chars = settings.TEXT_LAYER_MIN_CHARS if settings.TEXT_LAYER_ENABLED else 0
+        
+        def render_window(window: Tuple[int, int]) -> asyncio.Task:
+            first_page, last_page = window
+            return asyncio.ensure_future(self.worker_pool.run(
+                render_pdf_window, content, settings.PDF_DPI, first_page, last_page, profile,
+                text_layer_min_chars
+            ))
+        
+        pending = render_window(windows[0]) if windows else None
+        try:
+            for index in range(len(windows)):
+                window_pages = await pending
+                pending = render_window(windows[index + 1]) if index + 1 < len(windows) else None
+                for page in window_pages:
+                    yield page
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+    
+    async def _try_to_open_unknown_file(
+        self,
+        content: Union[bytes, str],
+        content_type: str,
+        profile: Optional[Dict[str, Any]]
+    ) -> AsyncIterator[PageImage]:
         """
         Try to open a file when we don't know its type.
         
         Args:
-            content: The raw file data as bytes
+            content: File bytes or path of the spooled file
             content_type: The reported content type
+            profile: Image profile applied to every page
             
-        Returns:
-            List of PIL Image objects
+        Yields:
+            Encoded pages
             
         Raises:
             Exception: If the file cannot be opened
@@ -108,24 +266,21 @@ class DocumentService:
         logger.info("Unknown type, trying as Image")
         
         try:
-            image_file = io.BytesIO(content)
-            image = Image.open(image_file)
-            
-            if image.mode not in ('RGB', 'L'):
-                image = image.convert('RGB')
-            
-            return [image]
+            image_pages = await self.worker_pool.run(render_image, content, profile)
         except Exception:
-            pass
+            image_pages = None
+        
+        if image_pages is not None:
+            for page in image_pages:
+                yield page
+            return
         
         logger.info("Image open failed, trying as PDF")
         
         try:
-            pdf_images = convert_from_bytes(
-                content,
-                dpi=settings.PDF_DPI,
-                fmt='png'
-            )
-            return pdf_images
+            page_count = await self.worker_pool.run(count_pdf_pages, content)
         except Exception:
             raise Exception(f"Unsupported file type: {content_type}")
+        
+        async for page in self._iter_pdf_pages(content, page_count, profile):
+            yield page
@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+from app.models.domain import SpooledDocument
+from app.services.coalescing import normalize_url
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+download_cache_requests = registry.counter(
+    "bill_download_cache_requests_total",
+    "Download cache outcomes: revalidated (304), changed (new body), miss (not cached)", ["result"]
+)
+download_cache_bytes_saved = registry.counter(
+    "bill_download_cache_bytes_saved_total", "Document bytes served from the download cache instead of downloaded"
+)
+
+
+@dataclass
+class DownloadCacheEntry:
+    """Validators and metadata of one cached document body"""
+    key: str
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: str
+    size: int
+    sha256: str
+
+
+class DownloadCache:
+    """
+    On-disk cache of downloaded document bodies, revalidated on every use.
+
+    Bodies are kept for URLs whose response carried an ETag or
+    Last-Modified header (and no Cache-Control: no-store). The next
+    download of the URL is a conditional GET; a 304 answer serves the
+    cached body without transferring it again. Entries are evicted least
+    recently used once the bodies exceed the byte budget.
+
+    Cached bodies are hard-linked into the spool directory (copied across
+    file systems), so rasterization reads them by path and eviction never
+    removes a file a document still uses. Bodies small enough to stay in
+    memory after a download are read into memory instead.
+    """
+
+    def __init__(self, directory: Optional[str], max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[str, DownloadCacheEntry]" = OrderedDict()
+        self._bytes = 0
+
+        self.misses = 0
+        self.revalidated = 0
+        self.changed = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+        if self.directory:
+            try:
+                self._load_index()
+            except Exception as error:
+                logger.warning(f"Download cache disabled: {str(error)}")
+                self.directory = None
+
+    def _load_index(self):
+        """Rebuild the index from the cache directory, oldest use first"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        loaded = []
+        referenced = set()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as meta_file:
+                    entry = DownloadCacheEntry(**json.load(meta_file))
+                body_path = self._body_path(entry)
+                if os.path.getsize(body_path) != entry.size:
+                    raise ValueError("size mismatch")
+                loaded.append((os.path.getmtime(body_path), entry))
+                referenced.add(os.path.basename(body_path))
+            except Exception:
+                os.unlink(os.path.join(self.directory, name))
+
+        # Bodies without metadata: interrupted writes and replaced versions
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") and name not in referenced:
+                os.unlink(os.path.join(self.directory, name))
+
+        for _, entry in sorted(loaded, key=lambda item: item[0]):
+            self._entries[entry.key] = entry
+            self._bytes += entry.size
+        if loaded:
+            logger.info(f"Download cache: {len(loaded)} bodies, {self._bytes} bytes")
+
+    def lookup(self, url: str) -> Optional[DownloadCacheEntry]:
+        """
+        Find the cached body of a URL.
+
+        Args:
+            url: Document URL (normalized for the lookup)
+
+        Returns:
+            The entry to revalidate, or None when the URL is not cached
+        """
+        if not self.directory:
+            return None
+        entry = self._entries.get(self._key(url))
+        if entry is None:
+            self.misses += 1
+            download_cache_requests.inc("miss")
+        return entry
+
+    def conditional_headers(self, entry: DownloadCacheEntry) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers revalidating an entry"""
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    async def open(self, entry: DownloadCacheEntry) -> Optional[SpooledDocument]:
+        """
+        Serve a cached body after the server answered 304 Not Modified.
+
+        Returns:
+            Document the caller must close(), or None when the body is gone
+            (evicted meanwhile); the URL must then be downloaded in full
+        """
+        try:
+            document = await asyncio.to_thread(self._open_body, entry)
+        except OSError as error:
+            logger.info(f"Cached body of {entry.url} unavailable ({error}); downloading it again")
+            self._forget(entry.key)
+            return None
+
+        if entry.key in self._entries:
+            self._entries.move_to_end(entry.key)
+        self.revalidated += 1
+        self.bytes_saved += entry.size
+        download_cache_requests.inc("revalidated")
+        download_cache_bytes_saved.inc(amount=entry.size)
+        return document
+
+    async def store(self, url: str, headers: Mapping[str, str], document: SpooledDocument):
+        """
+        Cache a freshly downloaded body, replacing any earlier version of the URL.
+
+        Args:
+            url: Document URL
+            headers: Response headers (validators and Cache-Control)
+            document: The downloaded document; it stays usable and owned by the caller
+        """
+        if not self.directory:
+            return
+
+        key = self._key(url)
+        previous = self._entries.get(key)
+        if previous is not None:
+            self.changed += 1
+            download_cache_requests.inc("changed")
+
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        cacheable = (
+            (etag or last_modified)
+            and "no-store" not in headers.get("Cache-Control", "").lower()
+            and document.size <= self.max_bytes
+        )
+        if not cacheable:
+            if previous is not None:
+                await self._evict_entry(previous)
+            return
+
+        entry = DownloadCacheEntry(
+            key=key,
+            url=url,
+            etag=etag,
+            last_modified=last_modified,
+            content_type=document.content_type,
+            size=document.size,
+            sha256=document.sha256,
+        )
+        try:
+            await asyncio.to_thread(self._write_entry, entry, document)
+        except Exception as error:
+            logger.warning(f"Download cache write failed: {str(error)}")
+            return
+
+        self._forget(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self.stores += 1
+        if previous is not None and previous.sha256 != entry.sha256:
+            await asyncio.to_thread(self._delete_body, previous)
+
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = next(iter(self._entries.items()))
+            await self._evict_entry(evicted)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, bytes saved and disk usage"""
+        revalidations = self.revalidated + self.changed
+        return {
+            "enabled": bool(self.directory),
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "changed": self.changed,
+            "revalidation_hit_rate": self.revalidated / revalidations if revalidations else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+    def _body_path(self, entry: DownloadCacheEntry) -> str:
+        # Versioned by content, so a replaced body never changes under a reader
+        return os.path.join(self.directory, f"{entry.key}-{entry.sha256[:16]}.body")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    async def _evict_entry(self, entry: DownloadCacheEntry):
+        self._forget(entry.key)
+        try:
+            await asyncio.to_thread(self._delete_entry, entry)
+        except OSError as error:
+            logger.warning(f"Download cache eviction failed: {str(error)}")
+
+    def _write_entry(self, entry: DownloadCacheEntry, document: SpooledDocument):
+        body_path = self._body_path(entry)
+        temporary_path = f"{body_path}.{uuid.uuid4().hex}.tmp"
+        if document.content is not None:
+            with open(temporary_path, "wb") as body_file:
+                body_file.write(document.content)
+        else:
+            _link_or_copy(document.path, temporary_path)
+        os.replace(temporary_path, body_path)
+
+        meta_path = self._meta_path(entry.key)
+        with open(f"{meta_path}.tmp", "w") as meta_file:
+            json.dump(asdict(entry), meta_file)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def _open_body(self, entry: DownloadCacheEntry) -> SpooledDocument:
+        body_path = self._body_path(entry)
+        os.utime(body_path)  # recency survives restarts
+
+        if entry.size <= settings.SPOOL_MAX_MEMORY_MB * 1024 * 1024:
+            with open(body_path, "rb") as body_file:
+                content = body_file.read()
+            return SpooledDocument(
+                content_type=entry.content_type, size=entry.size, sha256=entry.sha256, content=content
+            )
+
+        spool_path = os.path.join(
+            settings.SPOOL_DIR or tempfile.gettempdir(), f"document-{uuid.uuid4().hex}"
+        )
+        _link_or_copy(body_path, spool_path)
+        return SpooledDocument(
+            content_type=entry.content_type, size=entry.size, sha256=entry.sha256, path=spool_path
+        )
+
+    def _delete_body(self, entry: DownloadCacheEntry):
+        body_path = self._body_path(entry)
+        if os.path.exists(body_path):
+            os.unlink(body_path)
+
+    def _delete_entry(self, entry: DownloadCacheEntry):
+        meta_path = self._meta_path(entry.key)
+        if os.path.exists(meta_path):
+            os.unlink(meta_path)
+        self._delete_body(entry)
+
+
+def _link_or_copy(source: str, destination: str):
+    """Hard-link a file, or copy it when the paths are on different file systems"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+@lru_cache()
+def get_download_cache() -> DownloadCache:
+    """Get the process-wide download cache"""
+    return DownloadCache(
+        directory=settings.DOWNLOAD_CACHE_DIR if settings.DOWNLOAD_CACHE_ENABLED else None,
+        max_bytes=settings.DOWNLOAD_CACHE_MAX_MB * 1024 * 1024
+    )
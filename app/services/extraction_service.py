@@ -1,56 +1,266 @@
 import asyncio
-from typing import Dict, Any, List
+import functools
+import logging
+import time
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Tuple
 
-from app.services.gemini_service import GeminiService
+from app.core.config import get_settings
+from app.core.request_timing import record_count
+from app.core.metrics import (
+    document_pages, document_seconds, documents_in_flight, observe_stage, time_stage
+)
+from app.services.cascade_service import ModelCascade
+from app.services.coalescing import collapse_duplicates, document_flights, normalize_url
+from app.services.gemini_service import GeminiService, estimate_image_tokens, estimate_page_tokens
 from app.services.document_service import DocumentService
+from app.services.cache_service import build_cache_key, get_result_cache
+from app.models.domain import PageImage, SpooledDocument
 from app.models.schemas import PageData, TokenUsage, BillItem
+from app.utils.image_utils import profile_stats
+from app.utils.page_classifier import classifier_stats, classify_pages
+from app.utils.page_hash import page_dedup_stats
+from app.utils.pdf_text import text_layer_stats
+from app.utils.validators import remove_duplicates_across_pages
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def parse_extracted_pages(raw_pages: List[Dict[str, Any]]) -> List[PageData]:
+    """
+    Validate model output into PageData, keeping only items with a positive amount.
+    
+    Pages that fail validation or end up without items are dropped.
+    
+    Args:
+        raw_pages: "pages" list from the sanitized Gemini response
+        
+    Returns:
+        Validated pages that have at least one item
+    """
+    all_extracted_pages = []
+    for page_data in raw_pages:
+        try:
+            page = PageData(**page_data)
+            
+            # Filter valid items (amount > 0)
+            valid_items = [
+                item for item in page.bill_items
+                if item.item_amount is not None and item.item_amount > 0
+            ]
+            page.bill_items = valid_items
+            
+            if page.bill_items:
+                all_extracted_pages.append(page)
+        except Exception:
+            continue
+    return all_extracted_pages
+
+
+def document_deadline() -> Optional[float]:
+    """time.monotonic() value by which a document started now must finish, None without a deadline"""
+    if settings.DOCUMENT_DEADLINE_SECONDS <= 0:
+        return None
+    return time.monotonic() + settings.DOCUMENT_DEADLINE_SECONDS
+
+
+def seconds_left(deadline: Optional[float]) -> Optional[float]:
+    """Timeout for asyncio.wait_for until the deadline (None = no limit)"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
 
 
 class ExtractionService:
     """Extraction service - Full document processing with multi-doc parallelism"""
     
-    def __init__(self):
-        self.gemini_service = GeminiService()
+    def __init__(self, image_profile: Optional[str] = None, prompt_variant: Optional[str] = None):
+        self.image_profile = image_profile or settings.IMAGE_PROFILE
+        self.gemini_service = GeminiService(prompt_variant=prompt_variant)
+        self.cascade = ModelCascade(self.gemini_service)
         self.document_service = DocumentService()
-        self._gemini_semaphore = None
-    
-    @property
-    def gemini_semaphore(self):
-        """Lazy-initialized semaphore for concurrent document processing"""
-        if self._gemini_semaphore is None:
-            # Limit concurrent DOCUMENTS (not pages)
-            self._gemini_semaphore = asyncio.Semaphore(5)
-        return self._gemini_semaphore
+        self.result_cache = get_result_cache()
     
-    async def extract_from_url(self, url: str) -> Dict[str, Any]:
+    async def extract_from_url(
+        self,
+        url: str,
+        on_page: Optional[Callable[[PageData], None]] = None
+    ) -> Dict[str, Any]:
         """
         Extract bill data from document URL.
         
         Architecture:
         - Downloads document and converts to images
         - Sends ALL pages to Gemini in ONE call (full context)
-        - Gemini handles deduplication across pages
-        - Semaphore limits concurrent documents for rate limiting
+        - Long documents are split into concurrent page chunks instead
+        - Gemini handles deduplication across pages (merged across chunks)
+        - Process-wide scheduler limits concurrent Gemini calls across requests
+        - Results are cached by document content, model and prompt
+        - Concurrent requests for the same URL, or for the same content once
+          downloaded, share one extraction (COALESCING_ENABLED)
+        - The whole document, download included, runs under DOCUMENT_DEADLINE_SECONDS
         
         Args:
             url: URL of the document to process
+            on_page: Called with each validated page while the model is still
+                generating (GEMINI_STREAMING); the final result is authoritative
             
         Returns:
             Dict with extraction results and token usage
         """
+        deadline = document_deadline()
+        if not settings.COALESCING_ENABLED:
+            return await self._download_and_extract(url, deadline, on_page)
+        
+        try:
+            result, shared = await asyncio.wait_for(
+                document_flights.run(
+                    "url",
+                    self._flight_key(f"url:{normalize_url(url)}"),
+                    functools.partial(self._download_and_extract, url, deadline),
+                    on_page
+                ),
+                timeout=seconds_left(deadline)
+            )
+        except asyncio.TimeoutError:
+            return self._deadline_response()
+        return self._caller_result(result, shared)
+    
+    async def _download_and_extract(
+        self,
+        url: str,
+        deadline: Optional[float],
+        on_page: Optional[Callable[[PageData], None]]
+    ) -> Dict[str, Any]:
         try:
             # Step 1: Download document
-            file_content, file_type = await self.document_service.download_document(url)
+            with time_stage("download"):
+                document = await asyncio.wait_for(
+                    self.document_service.download_document(url), timeout=seconds_left(deadline)
+                )
+        except asyncio.TimeoutError:
+            return self._deadline_response()
+        except Exception as error:
+            return self._error_response(error)
+        
+        return await self.extract_from_document(document, deadline, on_page)
+    
+    async def extract_from_document(
+        self,
+        document: SpooledDocument,
+        deadline: Optional[float] = None,
+        on_page: Optional[Callable[[PageData], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract bill data from a downloaded or uploaded document.
+        
+        The document is closed once its pages have been rendered.
+        
+        Args:
+            document: Document body with content type and SHA-256
+            deadline: time.monotonic() value by which the result is due; defaults
+                to DOCUMENT_DEADLINE_SECONDS from now
+            on_page: Called with each validated page while the model is still generating
             
-            # Step 2: Convert to images
-            page_images = self.document_service.process_document(file_content, file_type)
-            total_pages = len(page_images)
+        Returns:
+            Dict with extraction results and token usage
+        """
+        documents_in_flight.inc()
+        record_count("documents")
+        started = time.perf_counter()
+        outcome = "error"
+        if deadline is None:
+            deadline = document_deadline()
+        # Identical content (a retried upload, the same file under another URL) is coalesced
+        key = self._flight_key(document.sha256) if settings.COALESCING_ENABLED else None
+        try:
+            try:
+                if key is not None:
+                    if document_flights.is_running(key):
+                        document.close()  # the extraction in flight has its own copy
+                    response, shared = await asyncio.wait_for(
+                        document_flights.run(
+                            "content", key, functools.partial(self._extract_document, document, deadline), on_page
+                        ),
+                        timeout=seconds_left(deadline)
+                    )
+                    response = self._caller_result(response, shared)
+                else:
+                    response = await asyncio.wait_for(
+                        self._extract_document(document, deadline, on_page), timeout=seconds_left(deadline)
+                    )
+            except asyncio.TimeoutError:
+                # A shared extraction other callers still wait for closes the document itself
+                if key is None or not document_flights.is_running(key):
+                    document.close()
+                response = self._deadline_response()
+            if response.get("is_success", False):
+                outcome = "success"
+            return response
+        finally:
+            documents_in_flight.dec()
+            document_seconds.observe(time.perf_counter() - started, outcome)
+    
+    async def _extract_document(
+        self,
+        document: SpooledDocument,
+        deadline: Optional[float],
+        on_page: Optional[Callable[[PageData], None]]
+    ) -> Dict[str, Any]:
+        try:
+            try:
+                # Step 1b: Return cached result for identical content
+                cache_key = None
+                if settings.RESULT_CACHE_ENABLED:
+                    cache_key = build_cache_key(
+                        document.sha256,
+                        self.gemini_service.prompt_fingerprint(),
+                        self.image_profile
+                    )
+                    with time_stage("cache_lookup"):
+                        cached_data = await self.result_cache.get(cache_key)
+                    if cached_data is not None:
+                        record_count("cache_hits")
+                        return {
+                            "is_success": True,
+                            "token_usage": TokenUsage(total_tokens=0, input_tokens=0, output_tokens=0),
+                            "data": cached_data
+                        }
+                
+                # Step 2: Convert to images
+                with time_stage("render"):
+                    page_images = await self.document_service.process_document(
+                        document, self.image_profile
+                    )
+                total_pages = len(page_images)
+                document_pages.observe(total_pages)
+                image_pages = [page for page in page_images if page.text is None]
+                profile_stats.record_pages(self.image_profile, image_pages)
+                page_sources = self._page_sources(page_images)
+            finally:
+                document.close()
             
-            # Step 3: Send ALL pages in ONE Gemini call (with rate limiting)
-            async with self.gemini_semaphore:
-                result = await self.gemini_service.analyze_full_document(
+            # Step 2a: Collapse photocopied / resubmitted pages
+            page_dedup = None
+            if settings.PAGE_DEDUP_ENABLED and len(page_images) > 1:
+                with time_stage("page_dedup"):
+                    page_images, page_dedup = await self._collapse_duplicate_pages(page_images)
+            
+            # Step 2b: Drop pages that confidently carry no line items before paying for them
+            page_classifier = None
+            if settings.PAGE_CLASSIFIER_MODE != "off" and page_images:
+                with time_stage("page_classifier"):
+                    page_images, page_classifier = await self._classify_pages(page_images)
+            
+            # Step 3: Send ALL pages in ONE Gemini call, or in parallel chunks for
+            # long documents (rate limited by the shared scheduler). With model
+            # tiers, pages failing the local checks are re-extracted by the next tier
+            with time_stage("gemini"):
+                result = await self.cascade.analyze(
                     images=page_images,
-                    total_pages=total_pages
+                    total_pages=total_pages,
+                    deadline=deadline,
+                    on_page=self._page_emitter(on_page) if on_page is not None else None
                 )
             
             # Step 4: Process response
@@ -62,23 +272,17 @@ class ExtractionService:
                     "error": result.get("error", "Unknown error")
                 }
             
+            # Billed tokens can only be attributed to the profile when every page was sent
+            # as an image, once
+            escalated = bool(result.get("cascade", {}).get("escalations"))
+            if len(image_pages) == total_pages and len(page_images) == total_pages and not escalated:
+                profile_stats.record_tokens(
+                    self.image_profile, total_pages, result["token_usage"]["input_tokens"]
+                )
+            
             # Step 5: Filter and format pages
-            all_extracted_pages = []
-            for page_data in result.get("pages", []):
-                try:
-                    page = PageData(**page_data)
-                    
-                    # Filter valid items (amount > 0)
-                    valid_items = [
-                        item for item in page.bill_items
-                        if item.item_amount is not None and item.item_amount > 0
-                    ]
-                    page.bill_items = valid_items
-                    
-                    if page.bill_items:
-                        all_extracted_pages.append(page)
-                except Exception:
-                    continue
+            postprocess_started = time.perf_counter()
+            all_extracted_pages = parse_extracted_pages(result.get("pages", []))
             
             # Step 6: Filter for detail pages only
             detail_pages = [
@@ -87,6 +291,10 @@ class ExtractionService:
             ]
             final_pages = detail_pages if detail_pages else all_extracted_pages
             
+            # Step 6b: Optional fuzzy duplicate removal across pages
+            if settings.DEDUP_POST_PROCESSING:
+                final_pages = remove_duplicates_across_pages(final_pages)
+            
             # Step 7: Build response
             all_items = []
             pagewise_data = []
@@ -101,29 +309,203 @@ class ExtractionService:
                     "bill_items": [item.dict() for item in page.bill_items]
                 })
             
-            return {
+            extracted_data = {
+                "pagewise_line_items": pagewise_data,
+                "total_item_count": len(all_items)
+            }
+            
+            observe_stage("postprocess", time.perf_counter() - postprocess_started)
+            
+            # Partial results (failed chunks, failed escalations) are not cached
+            if cache_key is not None and not result.get("failed_chunks") and not result.get("warnings"):
+                await self.result_cache.set(cache_key, extracted_data)
+            
+            response = {
                 "is_success": True,
                 "token_usage": TokenUsage(**result["token_usage"]),
-                "data": {
-                    "pagewise_line_items": pagewise_data,
-                    "total_item_count": len(all_items)
-                }
+                "data": extracted_data
             }
             
+            if page_sources is not None:
+                response["page_sources"] = page_sources
+            if page_dedup is not None:
+                response["page_dedup"] = page_dedup
+            if page_classifier is not None:
+                response["page_classifier"] = page_classifier
+            if result.get("cascade") is not None:
+                response["model_cascade"] = result["cascade"]
+            
+            # Partial chunk failures: report the missing pages instead of failing everything
+            warnings = [
+                f"Pages {failure['pages']} could not be extracted: {failure['error']}"
+                for failure in result.get("failed_chunks", [])
+            ] + result.get("warnings", [])
+            if warnings:
+                response["warnings"] = warnings
+            
+            return response
+            
         except Exception as error:
-            return {
-                "is_success": False,
-                "token_usage": TokenUsage(total_tokens=0, input_tokens=0, output_tokens=0),
-                "data": {"pagewise_line_items": [], "total_item_count": 0},
-                "error": str(error)
-            }
+            return self._error_response(error)
+    
+    def _flight_key(self, identity: str) -> str:
+        """Coalescing key: the document identity plus everything that changes the result"""
+        return build_cache_key(identity, self.gemini_service.prompt_fingerprint(), self.image_profile)
+    
+    def _caller_result(self, result: Dict[str, Any], shared: bool) -> Dict[str, Any]:
+        """
+        Give each caller of a coalesced extraction its own response dict.
+        
+        Callers that joined another caller's extraction report no token
+        usage, like cache hits, so the tokens are counted once.
+        """
+        result = dict(result)
+        if shared:
+            record_count("coalesced")
+            result["token_usage"] = TokenUsage(total_tokens=0, input_tokens=0, output_tokens=0)
+            result["coalesced"] = True
+        return result
+    
+    def _batch_groups(self, urls: List[str]) -> List[List[int]]:
+        """Indices of the URLs to extract once each; duplicates are collapsed with COALESCING_ENABLED"""
+        if not settings.COALESCING_ENABLED:
+            return [[index] for index in range(len(urls))]
+        _, groups = collapse_duplicates([normalize_url(url) for url in urls])
+        duplicates = len(urls) - len(groups)
+        if duplicates:
+            logger.info(f"Batch lists {duplicates} duplicate URL(s); extracting each document once")
+        return groups
+    
+    def _page_emitter(self, on_page: Callable[[PageData], None]) -> Callable[[Dict[str, Any]], None]:
+        """
+        Validate streamed pages and pass each page number on once.
+        
+        Retries, hedged requests, overlapping chunks and cascade escalations
+        can generate the same page again; only the first copy is emitted.
+        """
+        emitted = set()
+        
+        def emit(raw_page: Dict[str, Any]):
+            pages = parse_extracted_pages([raw_page])
+            if pages and pages[0].page_no not in emitted:
+                emitted.add(pages[0].page_no)
+                on_page(pages[0])
+        
+        return emit
+    
+    def _page_sources(self, pages: List[PageImage]) -> Optional[Dict[str, Any]]:
+        """
+        Report which pages were sent as text and the estimated token difference.
+        
+        Returns None when every page was sent as an image.
+        """
+        if all(page.text is None for page in pages):
+            return None
+        
+        page_reports = []
+        text_tokens = 0
+        image_tokens_avoided = 0
+        for page in pages:
+            image_tokens = estimate_image_tokens(page.width, page.height)
+            sent_tokens = estimate_page_tokens(page)
+            page_reports.append({
+                "page_no": page.page_no,
+                "source": "text" if page.text is not None else "image",
+                "estimated_tokens": sent_tokens,
+                "estimated_image_tokens": image_tokens
+            })
+            if page.text is not None:
+                text_tokens += sent_tokens
+                image_tokens_avoided += image_tokens
+        
+        text_pages = sum(1 for page in pages if page.text is not None)
+        text_layer_stats.record(text_pages, len(pages) - text_pages, text_tokens, image_tokens_avoided)
+        
+        return {
+            "text_pages": text_pages,
+            "image_pages": len(pages) - text_pages,
+            "estimated_tokens_saved": image_tokens_avoided - text_tokens,
+            "pages": page_reports
+        }
+    
+    async def _collapse_duplicate_pages(
+        self,
+        pages: List[PageImage]
+    ) -> Tuple[List[PageImage], Optional[Dict[str, Any]]]:
+        """
+        Collapse near-identical pages and report which original pages they duplicate.
+        
+        Returns:
+            Tuple of (kept pages, report or None when no duplicates were found)
+        """
+        kept_pages, duplicates = await self.document_service.collapse_duplicate_pages(pages)
+        tokens_saved = sum(estimate_page_tokens(page) for page in pages if page.page_no in duplicates)
+        page_dedup_stats.record(len(pages), len(duplicates), tokens_saved)
+        if not duplicates:
+            return kept_pages, None
+        
+        return kept_pages, {
+            "duplicates": [
+                {"page_no": page_no, "duplicate_of": kept_page_no, "distance": distance}
+                for page_no, (kept_page_no, distance) in sorted(duplicates.items())
+            ],
+            "estimated_tokens_saved": tokens_saved
+        }
+    
+    async def _classify_pages(self, pages: List[PageImage]) -> Tuple[List[PageImage], Dict[str, Any]]:
+        """
+        Run the local page classifier and keep only pages that may have line items.
+        
+        Returns:
+            Tuple of (kept pages, report of skipped pages and estimated tokens saved)
+        """
+        verdicts = await self.document_service.worker_pool.run(
+            classify_pages, pages, settings.PAGE_CLASSIFIER_MODE
+        )
+        
+        kept_pages = [page for page, verdict in zip(pages, verdicts) if not verdict["skip"]]
+        skipped = [verdict for verdict in verdicts if verdict["skip"]]
+        tokens_saved = sum(
+            estimate_page_tokens(page) for page, verdict in zip(pages, verdicts) if verdict["skip"]
+        )
+        classifier_stats.record(len(pages), skipped, tokens_saved)
+        
+        if skipped:
+            logger.info(
+                f"Page classifier skipped {len(skipped)} of {len(pages)} pages "
+                f"(~{tokens_saved} input tokens)"
+            )
+        
+        return kept_pages, {
+            "mode": settings.PAGE_CLASSIFIER_MODE,
+            "pages_skipped": [
+                {"page_no": verdict["page_no"], "reason": verdict["reason"]}
+                for verdict in skipped
+            ],
+            "estimated_tokens_saved": tokens_saved
+        }
+    
+    def _error_response(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "is_success": False,
+            "token_usage": TokenUsage(total_tokens=0, input_tokens=0, output_tokens=0),
+            "data": {"pagewise_line_items": [], "total_item_count": 0},
+            "error": str(error)
+        }
+    
+    def _deadline_response(self) -> Dict[str, Any]:
+        return self._error_response(TimeoutError(
+            f"Document processing exceeded the {settings.DOCUMENT_DEADLINE_SECONDS:g}s deadline"
+        ))
     
     async def extract_multiple(self, urls: List[str]) -> List[Dict[str, Any]]:
         """
         Process multiple documents in parallel.
         
         Each document is processed with full context (all pages in one call).
-        Semaphore limits concurrent API calls to prevent rate limiting.
+        The shared Gemini scheduler limits concurrent API calls to prevent rate limiting.
+        A URL listed more than once is extracted once; its result is repeated
+        at every position (with token usage counted once).
         
         Args:
             urls: List of document URLs
@@ -131,5 +513,179 @@ class ExtractionService:
         Returns:
             List of extraction results
         """
-        tasks = [self.extract_from_url(url) for url in urls]
-        return await asyncio.gather(*tasks, return_exceptions=True)
+        groups = self._batch_groups(urls)
+        tasks = [self.extract_from_url(urls[group[0]]) for group in groups]
+        group_results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Expand duplicate URLs back to their positions
+        results: List[Any] = [None] * len(urls)
+        for group, result in zip(groups, group_results):
+            results[group[0]] = result
+            for index in group[1:]:
+                results[index] = result if isinstance(result, BaseException) else self._caller_result(result, True)
+        return results
+    
+    async def iter_batch(
+        self,
+        urls: List[str],
+        on_page: Optional[Callable[[int, PageData], None]] = None
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Process multiple documents in parallel, yielding each as it completes.
+        
+        Documents that are still running are cancelled if the consumer stops
+        early (e.g. the client disconnects). A URL listed more than once is
+        extracted once and yielded for each of its indices.
+        
+        Args:
+            urls: List of document URLs
+            on_page: Called with (document index, page) for each page while
+                the model is still generating (GEMINI_STREAMING)
+            
+        Yields:
+            (document index, extraction result or exception) in completion order
+        """
+        def group_callback(group: List[int]) -> Callable[[PageData], None]:
+            def emit(page: PageData):
+                for index in group:
+                    on_page(index, page)
+            return emit
+        
+        async def extract_group(group: List[int]) -> Tuple[List[int], Any]:
+            try:
+                page_callback = group_callback(group) if on_page is not None else None
+                return group, await self.extract_from_url(urls[group[0]], page_callback)
+            except Exception as error:
+                return group, error
+        
+        tasks = [asyncio.ensure_future(extract_group(group)) for group in self._batch_groups(urls)]
+        try:
+            for next_completed in asyncio.as_completed(tasks):
+                group, result = await next_completed
+                yield group[0], result
+                for index in group[1:]:
+                    yield index, result if isinstance(result, BaseException) else self._caller_result(result, True)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def extract_batch(self, urls: List[str]) -> Dict[str, Any]:
+        """
+        Process multiple documents in parallel and aggregate the results.
+        
+        Args:
+            urls: List of document URLs
+            
+        Returns:
+            Batch response with per-document results, errors and summed token usage
+        """
+        results = await self.extract_multiple(urls)
+        
+        summary = BatchSummary(urls)
+        for i, result in enumerate(results):
+            summary.add(i, result)
+        return summary.as_response()
+    
+    async def extract_uploaded_batch(self, files: List[Tuple[str, SpooledDocument]]) -> Dict[str, Any]:
+        """
+        Process uploaded documents in parallel and aggregate the results.
+        
+        Args:
+            files: (filename, document) pairs; every document is closed
+            
+        Returns:
+            Batch response keyed by filename instead of URL
+        """
+        results = await asyncio.gather(
+            *[self.extract_from_document(document) for _, document in files],
+            return_exceptions=True
+        )
+        
+        summary = BatchSummary([filename for filename, _ in files], source_key="filename")
+        for i, result in enumerate(results):
+            summary.add(i, result)
+        return summary.as_response()
+
+
+class BatchSummary:
+    """Aggregated counts, token usage and per-document entries of a batch"""
+    
+    def __init__(self, urls: List[str], source_key: str = "url"):
+        self.urls = urls
+        self.source_key = source_key
+        self.successful_results = []
+        self.failed_results = []
+        self.total_tokens = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.total_items = 0
+    
+    def add(self, index: int, result: Any) -> Dict[str, Any]:
+        """
+        Record one document's outcome.
+        
+        Args:
+            index: Position of the document in the batch
+            result: Extraction result dict, or the exception it raised
+            
+        Returns:
+            The batch entry for this document (with "data" or "error")
+        """
+        if isinstance(result, Exception):
+            entry = {
+                "document_index": index,
+                self.source_key: self.urls[index],
+                "error": str(result)
+            }
+            self.failed_results.append(entry)
+        elif result.get("is_success", False):
+            entry = {
+                "document_index": index,
+                self.source_key: self.urls[index],
+                "data": result.get("data", {})
+            }
+            self.successful_results.append(entry)
+            token_usage = result.get("token_usage", {})
+            if hasattr(token_usage, 'total_tokens'):
+                self.total_tokens += token_usage.total_tokens
+                self.input_tokens += token_usage.input_tokens
+                self.output_tokens += token_usage.output_tokens
+            else:
+                self.total_tokens += token_usage.get("total_tokens", 0)
+                self.input_tokens += token_usage.get("input_tokens", 0)
+                self.output_tokens += token_usage.get("output_tokens", 0)
+            self.total_items += result.get("data", {}).get("total_item_count", 0)
+        else:
+            entry = {
+                "document_index": index,
+                self.source_key: self.urls[index],
+                "error": result.get("error", "Unknown error")
+            }
+            self.failed_results.append(entry)
+        return entry
+    
+    def as_response(self, include_results: bool = True) -> Dict[str, Any]:
+        """
+        Build the batch response.
+        
+        Args:
+            include_results: Include per-document results and errors (the
+                streaming endpoint has already sent them)
+        """
+        response = {
+            "is_success": len(self.failed_results) == 0,
+            "batch_mode": True,
+            "total_documents": len(self.urls),
+            "successful_count": len(self.successful_results),
+            "failed_count": len(self.failed_results),
+            "total_items_extracted": self.total_items,
+            "token_usage": {
+                "total_tokens": self.total_tokens,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens
+            }
+        }
+        if include_results:
+            response["results"] = self.successful_results
+            response["errors"] = self.failed_results if self.failed_results else None
+        return response
@@ -1,59 +1,156 @@
-from google import genai
 from google.genai import types
-from PIL import Image
+import asyncio
+import hashlib
 import json
-from typing import Dict, Any, List, Optional
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
 
+from app.core.clients import get_gemini_client
 from app.core.config import get_settings
-from app.core.constants import EXTRACTION_PROMPT
+from app.core.constants import PROMPT_VARIANTS
+from app.core.metrics import errors, gemini_request_seconds, gemini_tokens
+from app.core.request_timing import record_count, record_stage
+from app.models.domain import PageImage
+from app.services.prompt_cache import get_prompt_cache, is_cached_content_error, prompt_stats
+from app.services.resilience import get_resilient_caller
+from app.services.scheduler_service import get_gemini_scheduler
+from app.utils.json_stream import IncrementalPagesParser, recover_pages
+from app.utils.validators import merge_chunk_pages
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Gemini bills images in 768x768 tiles of 258 tokens each
+IMAGE_TILE_SIZE = 768
+TOKENS_PER_IMAGE_TILE = 258
+CHARS_PER_TEXT_TOKEN = 4
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Input tokens for one image of the given size"""
+    tiles = math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE)
+    return max(tiles, 1) * TOKENS_PER_IMAGE_TILE
+
+
+def estimate_page_tokens(page: PageImage) -> int:
+    """Input tokens for one page, sent either as text or as an image"""
+    if page.text is not None:
+        return len(page.text) // CHARS_PER_TEXT_TOKEN
+    return estimate_image_tokens(page.width, page.height)
+
+
+def _format_page_numbers(page_numbers: List[int]) -> str:
+    """Exact page list with consecutive runs collapsed, e.g. 1-3, 7, 9-10"""
+    ranges = []
+    for page_no in sorted(page_numbers):
+        if ranges and page_no == ranges[-1][1] + 1:
+            ranges[-1][1] = page_no
+        else:
+            ranges.append([page_no, page_no])
+    return ", ".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+@dataclass
+class StreamedResponse:
+    """What a streamed generate_content call produced"""
+    text: str = ""
+    usage_metadata: Optional[types.GenerateContentResponseUsageMetadata] = None
+    finish_reason: Optional[types.FinishReason] = None
+    interrupted: Optional[str] = None  # error that cut the stream off
+
 
 class GeminiService:
     """Gemini service for medical bill extraction - Full document processing"""
     
-    def __init__(self):
-        """Initialize Gemini service"""
-        pass
+    def __init__(self, prompt_variant: Optional[str] = None):
+        """
+        Initialize Gemini service
+        
+        Args:
+            prompt_variant: Name in PROMPT_VARIANTS; defaults to PROMPT_VARIANT
+        """
+        self.prompt_variant = prompt_variant or settings.PROMPT_VARIANT
+        if self.prompt_variant not in PROMPT_VARIANTS:
+            raise ValueError(
+                f"Unknown prompt variant {self.prompt_variant!r}. Use one of: {', '.join(PROMPT_VARIANTS)}"
+            )
+        self.scheduler = get_gemini_scheduler()
+        self.prompt_cache = get_prompt_cache()
     
-    def build_full_doc_prompt(self, total_pages: int) -> str:
-        """Build prompt for full document extraction"""
+    def static_prompt_prefix(self) -> str:
+        """Extraction rules and multi-page instructions, identical for every call with this variant"""
+        variant = PROMPT_VARIANTS[self.prompt_variant]
+        return variant["instructions"] + variant["multi_page"]
+    
+    def build_document_context(
+        self,
+        total_pages: int,
+        page_numbers: Optional[List[int]] = None,
+        run_page_numbers: Optional[List[int]] = None
+    ) -> str:
+        """
+        Build the per-call part of the prompt that follows the static prefix
+        
+        Pages can be missing from a call because they are in another chunk
+        of the same run, or because they were skipped before extraction
+        (page dedup, page classifier, pages a cascade tier already accepted).
+        The model is told which pages it sees and why the others are absent.
+        
+        Args:
+            total_pages: Total number of pages in the document
+            page_numbers: Pages included in this call (defaults to all)
+            run_page_numbers: All pages of the chunked run this call is one
+                chunk of; None when the call is not part of a chunked run
+        """
+        sent = list(page_numbers) if page_numbers is not None else list(range(1, total_pages + 1))
+        extracted = set(run_page_numbers) if run_page_numbers is not None else set(sent)
+        other_chunks = sorted(extracted.difference(sent))
+        skipped = [page_no for page_no in range(1, total_pages + 1) if page_no not in extracted]
         
-        base_prompt = EXTRACTION_PROMPT
-        context = f"""
+        if not other_chunks and not skipped:
+            visibility = "You are seeing ALL pages at once."
+        else:
+            visibility = f"You are seeing only page(s) {_format_page_numbers(sent)}."
+            if other_chunks:
+                visibility += f" Page(s) {_format_page_numbers(other_chunks)} are processed separately."
+            if skipped:
+                visibility += (
+                    f" Page(s) {_format_page_numbers(skipped)} were skipped and are not part of this request."
+                )
+            visibility += " Only report the pages you are seeing."
+        return f"""
 
 ## DOCUMENT CONTEXT
 
-This document has {total_pages} page(s). You are seeing ALL pages at once.
-
-## CROSS-PAGE DEDUPLICATION
-
-- If the same item appears on multiple pages, extract it ONLY ONCE
-- Use the page with the most complete information
-- Skip duplicate/continued entries on other pages
-
-## OUTPUT FORMAT (MULTI-PAGE)
-
-Return ONE JSON object with ALL pages:
-{{
-  "pages": [
-    {{
-      "page_no": "1",
-      "page_type": "Pharmacy | Bill Detail | Final Bill",
-      "bill_items": [
-        {{
-          "item_name": "string",
-          "item_amount": float,
-          "item_rate": float,
-          "item_quantity": float
-        }}
-      ]
-    }}
-  ]
-}}
+This document has {total_pages} page(s). {visibility}
 """
-        return base_prompt + context
+    
+    def build_full_doc_prompt(self, total_pages: int, page_numbers: Optional[List[int]] = None) -> str:
+        """
+        Build prompt for full document extraction
+        
+        Args:
+            total_pages: Total number of pages in the document
+            page_numbers: Pages included in this call, when only a chunk is sent
+        """
+        return self.static_prompt_prefix() + self.build_document_context(total_pages, page_numbers)
+    
+    def prompt_fingerprint(self) -> str:
+        """Fingerprint of the prompt templates, used in result cache keys"""
+        template = (
+            self.build_full_doc_prompt(total_pages=0)
+            + self.build_full_doc_prompt(total_pages=2, page_numbers=[1])
+        )
+        return hashlib.sha256(template.encode("utf-8")).hexdigest()
+    
+    def estimate_input_tokens(self, prompt: str, images: List[PageImage]) -> int:
+        """Rough input token estimate used for the token-per-minute budget"""
+        page_tokens = sum(estimate_page_tokens(image) for image in images)
+        return len(prompt) // CHARS_PER_TEXT_TOKEN + page_tokens
     
     def sanitize_response(self, data: Dict) -> Dict:
         """Clean Gemini response - replace None with 0.0"""
@@ -71,41 +168,143 @@ Return ONE JSON object with ALL pages:
     
     async def analyze_full_document(
         self, 
-        images: List[Image.Image],
-        total_pages: int
+        images: List[PageImage],
+        total_pages: int,
+        deadline: Optional[float] = None,
+        model: Optional[str] = None,
+        on_page: Optional[Callable[[Dict[str, Any]], None]] = None,
+        run_page_numbers: Optional[List[int]] = None
     ) -> Dict[str, Any]:
         """
         Send ALL pages in ONE call - Gemini handles context & deduplication
         
+        With GEMINI_STREAMING the response is streamed and every page is
+        passed to on_page (sanitized) as soon as its JSON object is complete.
+        Output that is cut off (interrupted stream, token limit) keeps the
+        pages that were complete, with a warning.
+        
         Args:
-            images: List of PIL Image objects (all pages)
+            images: Encoded page images (all pages)
             total_pages: Total number of pages
+            deadline: time.monotonic() value by which the call must finish
+            model: Model to call instead of GEMINI_MODEL
+            on_page: Called with each page while the response is generated
+            run_page_numbers: All pages of the chunked run, when images is one chunk
             
         Returns:
             Dict with success status, pages data, and token usage
         """
+        model = model or settings.GEMINI_MODEL
         try:
             config = types.GenerateContentConfig(
                 temperature=settings.GEMINI_TEMPERATURE,
                 response_mime_type="application/json",
             )
             
-            prompt = self.build_full_doc_prompt(total_pages)
+            prefix = self.static_prompt_prefix()
+            document_context = self.build_document_context(
+                total_pages, [image.page_no for image in images], run_page_numbers
+            )
             
-            # Build contents: [prompt, image1, image2, ...]
-            contents = [prompt] + list(images)
+            # Build contents: [prompt, "Page 1:", image1, "Page 2:", image2, ...] from pre-encoded
+            # pages; text-layer pages are sent as their text instead of an image
+            page_contents = []
+            for image in images:
+                page_contents.append(f"Page {image.page_no}:")
+                if image.text is not None:
+                    page_contents.append(image.text)
+                else:
+                    page_contents.append(types.Part.from_bytes(data=image.data, mime_type=image.mime_type))
             
-            # Create client and make request
-            client = genai.Client(api_key=settings.GEMINI_API_KEY)
+            # Shared client created once per process
+            client = get_gemini_client()
+            estimated_tokens = self.estimate_input_tokens(prefix + document_context, images)
             
-            response = await client.aio.models.generate_content(
-                model=settings.GEMINI_MODEL,
-                contents=contents,
-                config=config
-            )
+            async def generate(cache_name: Optional[str], request_started: float):
+                # With a cached prefix only the document context and pages are sent
+                if cache_name is None:
+                    contents = [prefix + document_context] + page_contents
+                    request_config = config
+                else:
+                    contents = [document_context] + page_contents
+                    request_config = config.model_copy(update={"cached_content": cache_name})
+                if settings.GEMINI_STREAMING:
+                    return await self._generate_streamed(
+                        client, model, contents, request_config, on_page, request_started
+                    )
+                return await client.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=request_config
+                )
+            
+            async def make_call():
+                cache_name = None
+                if settings.PROMPT_CACHE_ENABLED:
+                    cache_name = await self.prompt_cache.handle(model, self.prompt_variant, prefix)
+                
+                # Shared scheduler bounds in-flight calls and per-minute budgets; every
+                # attempt (retry or hedge) takes its own slot but reuses the encoded contents
+                async with self.scheduler.slot(estimated_tokens) as ticket:
+                    record_stage("scheduler_wait", ticket.started_at - ticket.queued_at)
+                    record_count("gemini_calls")
+                    request_started = time.perf_counter()
+                    try:
+                        try:
+                            response = await generate(cache_name, request_started)
+                        except Exception as error:
+                            # Cached content expired or deleted upstream: send the prefix inline
+                            if cache_name is None or not is_cached_content_error(error):
+                                raise
+                            logger.info(f"Cached prompt {cache_name} rejected ({error}); sending the prefix inline")
+                            self.prompt_cache.invalidate(model, self.prompt_variant, cache_name)
+                            cache_name = None
+                            response = await generate(None, request_started)
+                    except Exception:
+                        gemini_request_seconds.observe(
+                            time.perf_counter() - request_started, model, "error"
+                        )
+                        raise
+                    finally:
+                        record_stage("gemini_request", time.perf_counter() - request_started)
+                    gemini_request_seconds.observe(
+                        time.perf_counter() - request_started, model, "success"
+                    )
+                    if response.usage_metadata is not None:
+                        input_tokens = response.usage_metadata.prompt_token_count or 0
+                        cached_tokens = response.usage_metadata.cached_content_token_count or 0
+                        output_tokens = response.usage_metadata.candidates_token_count or 0
+                        ticket.tokens_used = response.usage_metadata.total_token_count
+                        gemini_tokens.inc(model, "input", amount=input_tokens)
+                        gemini_tokens.inc(model, "cached", amount=cached_tokens)
+                        gemini_tokens.inc(model, "output", amount=output_tokens)
+                        record_count("input_tokens", input_tokens)
+                        record_count("cached_input_tokens", cached_tokens)
+                        record_count("output_tokens", output_tokens)
+                        prompt_stats.record(
+                            self.prompt_variant, cache_name is not None, input_tokens, cached_tokens,
+                            output_tokens, time.perf_counter() - request_started
+                        )
+                    return response
+            
+            # Retries, hedging and the circuit breaker are shared per model
+            response = await get_resilient_caller(model).call(make_call, deadline)
             
-            # Parse response
-            result_json = json.loads(response.text)
+            # Parse response; keep the complete pages of output that was cut off
+            warnings = []
+            try:
+                result_json = json.loads(response.text or "")
+            except json.JSONDecodeError:
+                recovered = recover_pages(response.text or "")
+                if not recovered:
+                    raise
+                reason = getattr(response, "interrupted", None) or f"finish reason {self._finish_reason(response)}"
+                logger.warning(f"{model} output was cut off ({reason}); recovered {len(recovered)} complete page(s)")
+                warnings.append(
+                    f"Model output was cut off ({reason}); pages after page "
+                    f"{recovered[-1].get('page_no', '?')} may be missing"
+                )
+                result_json = {"pages": recovered}
             
             # Handle if response is a list instead of object with "pages"
             if isinstance(result_json, list):
@@ -117,18 +316,22 @@ Return ONE JSON object with ALL pages:
             # Extract token usage
             usage = response.usage_metadata
             token_usage = {
-                "total_tokens": usage.total_token_count,
-                "input_tokens": usage.prompt_token_count,
-                "output_tokens": usage.candidates_token_count
+                "total_tokens": (usage.total_token_count or 0) if usage else 0,
+                "input_tokens": (usage.prompt_token_count or 0) if usage else 0,
+                "output_tokens": (usage.candidates_token_count or 0) if usage else 0
             }
             
-            return {
+            result = {
                 "success": True,
                 "pages": result_json.get("pages", []),
                 "token_usage": token_usage
             }
+            if warnings:
+                result["warnings"] = warnings
+            return result
             
         except json.JSONDecodeError as e:
+            errors.inc("gemini", type(e).__name__)
             return {
                 "success": False,
                 "pages": [],
@@ -136,9 +339,171 @@ Return ONE JSON object with ALL pages:
                 "error": f"JSON parse error: {str(e)}"
             }
         except Exception as e:
+            errors.inc("gemini", type(e).__name__)
             return {
                 "success": False,
                 "pages": [],
                 "token_usage": {"total_tokens": 0, "input_tokens": 0, "output_tokens": 0},
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+    
+    async def _generate_streamed(
+        self,
+        client,
+        model: str,
+        contents: List[Any],
+        config: types.GenerateContentConfig,
+        on_page: Optional[Callable[[Dict[str, Any]], None]],
+        request_started: float
+    ) -> "StreamedResponse":
+        """
+        Stream one generate_content call, passing complete pages on as they arrive.
+        
+        The SDK's async stream reads the HTTP response synchronously on the
+        event loop, so the sync stream is read in a thread and handed over
+        through a queue. A stream interrupted before its first complete page
+        raises (and can be retried, nothing was handed on yet); one
+        interrupted later returns what was received.
+        """
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        
+        def hand_over(item):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:
+                pass  # event loop closed
+        
+        def read_stream():
+            try:
+                for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+                    if stop.is_set():
+                        return
+                    hand_over((chunk, None))
+            except Exception as error:
+                hand_over((None, error))
+            else:
+                hand_over((None, None))
+        
+        reader = asyncio.ensure_future(asyncio.to_thread(read_stream))
+        parser = IncrementalPagesParser()
+        response = StreamedResponse()
+        text_parts = []
+        try:
+            while True:
+                chunk, error = await chunks.get()
+                if chunk is None:
+                    if error is not None:
+                        if not parser.pages:
+                            raise error
+                        response.interrupted = f"{type(error).__name__}: {str(error)[:200]}"
+                    break
+                
+                if chunk.usage_metadata is not None:
+                    response.usage_metadata = chunk.usage_metadata
+                if chunk.candidates and chunk.candidates[0].finish_reason is not None:
+                    response.finish_reason = chunk.candidates[0].finish_reason
+                text = chunk.text
+                if not text:
+                    continue
+                text_parts.append(text)
+                for page in parser.feed(text):
+                    if len(parser.pages) == 1:
+                        record_stage("gemini_first_page", time.perf_counter() - request_started)
+                    if on_page is not None:
+                        on_page(self.sanitize_response({"pages": [page]})["pages"][0])
+        finally:
+            # A cancelled call (hedge loser, deadline) stops reading at the next chunk
+            stop.set()
+            reader.cancel()
+        
+        response.text = "".join(text_parts)
+        return response
+    
+    def _finish_reason(self, response) -> str:
+        if isinstance(response, StreamedResponse):
+            finish_reason = response.finish_reason
+        else:
+            candidates = response.candidates or []
+            finish_reason = candidates[0].finish_reason if candidates else None
+        return getattr(finish_reason, "value", None) or str(finish_reason)
+    
+    async def analyze_chunked(
+        self,
+        images: List[PageImage],
+        total_pages: int,
+        deadline: Optional[float] = None,
+        model: Optional[str] = None,
+        on_page: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Split a long document into page chunks and analyze them concurrently.
+        
+        Chunks of CHUNK_SIZE_PAGES (overlapping by CHUNK_OVERLAP_PAGES) run in
+        parallel through the shared scheduler, so latency is close to a single
+        chunk. Per-chunk pages are merged with a cross-chunk duplicate pass.
+        A failed chunk does not fail the pages returned by the others.
+        
+        Args:
+            images: Encoded page images (all pages)
+            total_pages: Total number of pages
+            deadline: time.monotonic() value by which every chunk must finish
+            model: Model to call instead of GEMINI_MODEL
+            on_page: Called with each page while the chunk responses are generated
+            
+        Returns:
+            Dict with success status, merged pages data, and summed token usage
+        """
+        chunk_size = max(1, settings.CHUNK_SIZE_PAGES)
+        step = max(1, chunk_size - settings.CHUNK_OVERLAP_PAGES)
+        chunks = []
+        for start in range(0, len(images), step):
+            chunks.append(images[start:start + chunk_size])
+            if start + chunk_size >= len(images):
+                break
+        
+        logger.info(f"Analyzing {len(images)} pages in {len(chunks)} chunks of up to {chunk_size}")
+        
+        run_page_numbers = [image.page_no for image in images]
+        results = await asyncio.gather(*[
+            self.analyze_full_document(
+                images=chunk, total_pages=total_pages, deadline=deadline, model=model, on_page=on_page,
+                run_page_numbers=run_page_numbers
+            )
+            for chunk in chunks
+        ])
+        
+        token_usage = {"total_tokens": 0, "input_tokens": 0, "output_tokens": 0}
+        for result in results:
+            for key in token_usage:
+                token_usage[key] += result["token_usage"].get(key, 0)
+        
+        successful_pages = [result["pages"] for result in results if result.get("success", False)]
+        failed_chunks = [
+            {
+                "pages": f"{chunk[0].page_no}-{chunk[-1].page_no}",
+                "error": result.get("error", "Unknown error")
+            }
+            for chunk, result in zip(chunks, results)
+            if not result.get("success", False)
+        ]
+        
+        if not successful_pages:
+            return {
+                "success": False,
+                "pages": [],
+                "token_usage": token_usage,
+                "error": "; ".join(f"pages {failure['pages']}: {failure['error']}" for failure in failed_chunks)
+            }
+        
+        if failed_chunks:
+            logger.warning(f"{len(failed_chunks)} of {len(chunks)} chunks failed: {failed_chunks}")
+        
+        return {
+            "success": True,
+            "pages": merge_chunk_pages(successful_pages),
+            "token_usage": token_usage,
+            "failed_chunks": failed_chunks,
+            "warnings": [warning for result in results for warning in result.get("warnings", [])]
+        }
@@ -0,0 +1,438 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import get_settings
+from app.core.metrics import job_queue_wait_seconds, registry
+from app.core.request_timing import log_request_timings, request_timing
+from app.models.schemas import DocumentRequest
+from app.services.extraction_service import ExtractionService
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Idle workers re-check the queue this often (jobs queued by other processes)
+JOB_POLL_SECONDS = 5.0
+JOB_CLEANUP_INTERVAL_SECONDS = 300.0
+
+
+class QueueFullError(Exception):
+    """Raised when JOB_MAX_QUEUED jobs are already waiting"""
+
+
+class JobStore:
+    """
+    SQLite persistence for extraction jobs.
+
+    Queued jobs and finished results live in one table, so both survive a
+    process restart. Methods are blocking and are called through
+    asyncio.to_thread. Claims use BEGIN IMMEDIATE so two processes sharing
+    the file never run the same job.
+
+    A running job carries its owner (one JobService) and a lease the owner
+    keeps renewing. Only jobs whose lease ran out, because their process
+    died or hung, are put back in the queue; jobs other live processes are
+    running are left alone.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, "
+                "status TEXT NOT NULL, "
+                "request TEXT NOT NULL, "
+                "result TEXT, "
+                "error TEXT, "
+                "created_at REAL NOT NULL, "
+                "started_at REAL, "
+                "finished_at REAL, "
+                "expires_at REAL, "
+                "owner TEXT, "
+                "lease_expires_at REAL)"
+            )
+            # Tables created before leases existed
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for column in ("owner TEXT", "lease_expires_at REAL"):
+                if column.split()[0] not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection that is always closed (an open transaction rolls back)"""
+        # Autocommit mode; multi-statement writes open their own transaction
+        with closing(sqlite3.connect(self.db_path, timeout=30, isolation_level=None)) as connection:
+            yield connection
+
+    def create(self, job_id: str, request: str, now: float, max_queued: int) -> bool:
+        """Insert a queued job, or return False when the queue is full"""
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if max_queued:
+                (queued,) = connection.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ?", (JOB_QUEUED,)
+                ).fetchone()
+                if queued >= max_queued:
+                    connection.execute("ROLLBACK")
+                    return False
+            connection.execute(
+                "INSERT INTO jobs (job_id, status, request, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, request, now)
+            )
+            connection.execute("COMMIT")
+            return True
+
+    def claim_next(self, now: float, owner: str, lease_expires_at: float) -> Optional[Tuple[str, str, float]]:
+        """Mark the oldest queued job as running under owner and return (job_id, request, created_at)"""
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT job_id, request, created_at FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED,)
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, owner = ?, lease_expires_at = ? WHERE job_id = ?",
+                    (JOB_RUNNING, now, owner, lease_expires_at, row[0])
+                )
+            connection.execute("COMMIT")
+            return row
+
+    def renew_lease(self, job_id: str, owner: str, lease_expires_at: float) -> bool:
+        """Extend the lease of a running job; False when owner no longer holds it"""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE job_id = ? AND status = ? AND owner = ?",
+                (lease_expires_at, job_id, JOB_RUNNING, owner)
+            )
+            return cursor.rowcount > 0
+
+    def finish(self, job_id: str, owner: str, status: str, result: Optional[str], error: Optional[str],
+               now: float, expires_at: float) -> bool:
+        """Store the outcome of a job and when it may be purged; False when owner lost the job"""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ?, "
+                "lease_expires_at = NULL WHERE job_id = ? AND status = ? AND owner = ?",
+                (status, result, error, now, expires_at, job_id, JOB_RUNNING, owner)
+            )
+            return cursor.rowcount > 0
+
+    def get(self, job_id: str, now: float) -> Optional[Dict[str, Any]]:
+        """Fetch a job row as a dict, treating expired jobs as missing"""
+        with self._connect() as connection:
+            connection.row_factory = sqlite3.Row
+            row = connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+        if row is None or (row["expires_at"] is not None and row["expires_at"] <= now):
+            return None
+        return dict(row)
+
+    def requeue_expired(self, now: float) -> int:
+        """Put running jobs whose lease ran out (owner crashed or hung) back in the queue"""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, lease_expires_at = NULL "
+                "WHERE status = ? AND (lease_expires_at IS NULL OR lease_expires_at <= ?)",
+                (JOB_QUEUED, JOB_RUNNING, now)
+            )
+            return cursor.rowcount
+
+    def release(self, owner: str) -> int:
+        """Put the running jobs of a stopping owner back in the queue"""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, lease_expires_at = NULL "
+                "WHERE status = ? AND owner = ?",
+                (JOB_QUEUED, JOB_RUNNING, owner)
+            )
+            return cursor.rowcount
+
+    def purge_expired(self, now: float) -> int:
+        """Delete finished jobs past their retention"""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            )
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of stored jobs per status"""
+        with self._connect() as connection:
+            rows = connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class JobService:
+    """
+    Background extraction jobs.
+
+    POST /jobs stores the request and returns immediately; a fixed number
+    of worker tasks take jobs from the persistent queue in order and run
+    them through ExtractionService (sharing the Gemini scheduler and the
+    document worker pool with synchronous requests). Results are kept for
+    JOB_RESULT_RETENTION_SECONDS after the job finishes.
+
+    Running jobs hold a lease renewed every third of JOB_LEASE_SECONDS.
+    Jobs whose lease expired (their process is gone) are re-queued at
+    start and by the periodic cleanup, by whichever process sees them.
+    """
+
+    def __init__(self, store: JobStore, workers: int, max_queued: int, retention_seconds: int,
+                 lease_seconds: float = 60.0):
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        # Unique per process and service instance
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.completed_jobs = 0
+        self.failed_jobs = 0
+        self.active_jobs = 0
+
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Recover jobs of crashed processes and start the worker tasks"""
+        requeued = await asyncio.to_thread(self.store.requeue_expired, time.time())
+        if requeued:
+            logger.info(f"Re-queued {requeued} interrupted job(s)")
+        await asyncio.to_thread(self.store.purge_expired, time.time())
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{index}")
+            for index in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._cleanup(), name="job-cleanup"))
+
+    async def stop(self):
+        """Cancel the workers and put their running jobs back in the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        try:
+            released = await asyncio.to_thread(self.store.release, self.owner)
+            if released:
+                logger.info(f"Re-queued {released} running job(s) on shutdown")
+        except Exception as error:
+            # Their leases expire and another process picks them up
+            logger.warning(f"Job release failed: {str(error)}")
+
+    async def submit(self, request: DocumentRequest) -> Dict[str, Any]:
+        """
+        Queue an extraction request.
+
+        Args:
+            request: Validated extraction request (single or batch)
+
+        Returns:
+            Job status dict for the new job
+
+        Raises:
+            QueueFullError: When JOB_MAX_QUEUED jobs are already waiting
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        created = await asyncio.to_thread(
+            self.store.create, job_id, request.model_dump_json(), now, self.max_queued
+        )
+        if not created:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} queued)")
+
+        self._wakeup.set()
+        logger.info(f"Queued job {job_id} ({len(request.urls)} document(s))")
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a job.
+
+        Args:
+            job_id: Job id returned by submit
+
+        Returns:
+            Job dict with status, timestamps, error and the result (if
+            finished), or None for unknown or expired jobs
+        """
+        job = await asyncio.to_thread(self.store.get, job_id, time.time())
+        if job is None:
+            return None
+
+        job.pop("request", None)
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    async def stats(self) -> Dict[str, Any]:
+        """Queue depth per status and worker counters"""
+        return {
+            "workers": self.workers,
+            "active_jobs": self.active_jobs,
+            "completed_jobs": self.completed_jobs,
+            "failed_jobs": self.failed_jobs,
+            "stored": await asyncio.to_thread(self.store.counts),
+        }
+
+    async def _worker(self):
+        while True:
+            # Clear before claiming so a submit during the claim is not missed
+            self._wakeup.clear()
+            try:
+                now = time.time()
+                job = await asyncio.to_thread(self.store.claim_next, now, self.owner, now + self.lease_seconds)
+            except Exception as error:
+                logger.error(f"Job queue read failed: {str(error)}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, request, created_at = job
+            job_queue_wait_seconds.observe(max(0.0, time.time() - created_at))
+            with request_timing(job_id) as timings:
+                status = await self._run_job(job_id, request)
+                log_request_timings(timings, event="job", status=status)
+
+    async def _run_job(self, job_id: str, request_json: str) -> str:
+        self.active_jobs += 1
+        started = time.time()
+        heartbeat = asyncio.create_task(self._heartbeat(job_id), name=f"job-lease-{job_id}")
+        try:
+            request = DocumentRequest.model_validate_json(request_json)
+            extraction_service = ExtractionService(
+                image_profile=request.image_profile, prompt_variant=request.prompt_variant
+            )
+
+            if request.is_batch_request:
+                result = await extraction_service.extract_batch(request.documents)
+            else:
+                result = await extraction_service.extract_from_url(request.document)
+
+            status, result_json, error = JOB_COMPLETED, json.dumps(jsonable_encoder(result)), None
+            self.completed_jobs += 1
+        except Exception as job_error:
+            logger.error(f"Job {job_id} failed: {str(job_error)}", exc_info=True)
+            status, result_json, error = JOB_FAILED, None, str(job_error)
+            self.failed_jobs += 1
+        finally:
+            self.active_jobs -= 1
+            heartbeat.cancel()
+
+        now = time.time()
+        try:
+            finished = await asyncio.to_thread(
+                self.store.finish, job_id, self.owner, status, result_json, error, now, now + self.retention_seconds
+            )
+        except Exception as store_error:
+            # The worker keeps going; the job is re-queued once its lease expires
+            logger.error(f"Job {job_id} {status} but its outcome could not be stored: {str(store_error)}")
+            return status
+
+        if not finished:
+            logger.warning(f"Job {job_id} lease was lost; result discarded")
+        logger.info(f"Job {job_id} {status} in {now - started:.1f}s")
+        return status
+
+    async def _heartbeat(self, job_id: str):
+        """Renew the lease of a running job until cancelled"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await asyncio.to_thread(
+                    self.store.renew_lease, job_id, self.owner, time.time() + self.lease_seconds
+                )
+            except Exception as error:
+                # Retried on the next beat; the lease outlasts two missed renewals
+                logger.warning(f"Job {job_id} lease renewal failed: {str(error)}")
+                continue
+            if not renewed:
+                logger.warning(f"Job {job_id} lease was taken over by another process")
+                return
+
+    async def _cleanup(self):
+        # Often enough to notice expired leases soon after they run out
+        interval = min(JOB_CLEANUP_INTERVAL_SECONDS, max(1, self.retention_seconds), max(1, self.lease_seconds))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                purged = await asyncio.to_thread(self.store.purge_expired, time.time())
+                if purged:
+                    logger.info(f"Purged {purged} expired job(s)")
+                requeued = await asyncio.to_thread(self.store.requeue_expired, time.time())
+                if requeued:
+                    logger.info(f"Re-queued {requeued} job(s) with an expired lease")
+                    self._wakeup.set()
+            except Exception as error:
+                logger.warning(f"Job cleanup failed: {str(error)}")
+
+
+_job_service: Optional[JobService] = None
+
+
+def init_job_service() -> JobService:
+    """Create the process-wide job service"""
+    global _job_service
+    _job_service = JobService(
+        store=JobStore(os.path.join(settings.JOB_DIR, "jobs.sqlite3")),
+        workers=settings.JOB_WORKERS,
+        max_queued=settings.JOB_MAX_QUEUED,
+        retention_seconds=settings.JOB_RESULT_RETENTION_SECONDS,
+        lease_seconds=settings.JOB_LEASE_SECONDS
+    )
+    return _job_service
+
+
+async def start_job_service():
+    """Create the job service and start its workers (called from the app lifespan)"""
+    await init_job_service().start()
+
+
+async def stop_job_service():
+    """Stop the job workers on shutdown"""
+    if _job_service is not None:
+        await _job_service.stop()
+
+
+def get_job_service() -> JobService:
+    """Get the process-wide job service, creating it if the lifespan did not"""
+    if _job_service is None:
+        return init_job_service()
+    return _job_service
+
+
+registry.gauge(
+    "bill_jobs_active", "Background jobs currently running",
+    callback=lambda: _job_service.active_jobs if _job_service is not None else 0
+)
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from google.genai import types
+
+from app.core.clients import get_gemini_client
+from app.core.config import get_settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+prompt_input_tokens = registry.counter(
+    "bill_prompt_input_tokens_total", "Gemini input tokens by prompt variant, split into cached and uncached",
+    ["variant", "kind"]
+)
+prompt_request_seconds = registry.histogram(
+    "bill_prompt_request_duration_seconds", "Gemini request latency by prompt variant", ["variant", "prefix"]
+)
+
+
+def is_cached_content_error(error: BaseException) -> bool:
+    """Check whether a generate call failed because its cached content is gone"""
+    return getattr(error, "code", None) in (400, 403, 404) and "cachedcontent" in str(error).lower()
+
+
+@dataclass
+class CachedPrefix:
+    """A model-side cached content holding one static prompt prefix"""
+    name: str
+    expires_at: float  # time.monotonic()
+
+
+class PromptCache:
+    """
+    Model-side cached content for the static prompt prefix, per model and prompt variant.
+
+    The prefix (extraction rules and multi-page instructions) is identical
+    for every call, so it is uploaded once as cached content and calls
+    reference it by name instead of resending it. The handle is extended
+    before its TTL runs out. When caching is unavailable (disabled, prefix
+    below the model's minimum cache size, API errors) callers get None and
+    send the prefix inline; failed creations are not retried for
+    PROMPT_CACHE_RETRY_SECONDS.
+    """
+
+    def __init__(self, ttl_seconds: int, refresh_seconds: int, retry_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = min(refresh_seconds, ttl_seconds // 2)
+        self.retry_seconds = retry_seconds
+        self._prefixes: Dict[Tuple[str, str], CachedPrefix] = {}
+        self._unavailable_until: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = defaultdict(asyncio.Lock)
+
+        self.created = 0
+        self.refreshed = 0
+        self.failures = 0
+        self.invalidated = 0
+        self.last_error: Optional[str] = None
+
+    async def handle(self, model: str, variant: str, prefix: str) -> Optional[str]:
+        """
+        Name of the cached content holding the prefix, or None to send it inline.
+
+        Args:
+            model: Model the cached content is created for
+            variant: Prompt variant name (the key together with the model)
+            prefix: Static prompt prefix text
+        """
+        key = (model, variant)
+        if time.monotonic() < self._unavailable_until.get(key, 0.0):
+            return None
+
+        cached = self._prefixes.get(key)
+        if cached is not None and cached.expires_at - time.monotonic() > self.refresh_seconds:
+            return cached.name
+
+        async with self._locks[key]:
+            cached = self._prefixes.get(key)
+            now = time.monotonic()
+            if cached is not None and cached.expires_at - now > self.refresh_seconds:
+                return cached.name
+            if now < self._unavailable_until.get(key, 0.0):
+                return None
+
+            client = get_gemini_client()
+            ttl = types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s")
+            if cached is not None and cached.expires_at > now:
+                try:
+                    await client.aio.caches.update(name=cached.name, config=ttl)
+                    cached.expires_at = now + self.ttl_seconds
+                    self.refreshed += 1
+                    return cached.name
+                except Exception as error:
+                    logger.info(f"Could not extend cached prompt {cached.name} ({error}); creating a new one")
+
+            try:
+                created = await client.aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        contents=[prefix],
+                        ttl=f"{self.ttl_seconds}s",
+                        display_name=f"bill-extraction-prompt-{variant}",
+                    )
+                )
+            except Exception as error:
+                self.failures += 1
+                self.last_error = str(error)[:300]
+                self._prefixes.pop(key, None)
+                self._unavailable_until[key] = now + self.retry_seconds
+                logger.warning(
+                    f"Prompt prefix caching unavailable for {model}/{variant}, sending it inline for "
+                    f"{self.retry_seconds}s: {error}"
+                )
+                return None
+
+            self._prefixes[key] = CachedPrefix(name=created.name, expires_at=now + self.ttl_seconds)
+            self.created += 1
+            logger.info(f"Cached prompt prefix for {model}/{variant} as {created.name}")
+            return created.name
+
+    def invalidate(self, model: str, variant: str, name: str):
+        """Forget a handle the model no longer accepts (expired or deleted upstream)"""
+        cached = self._prefixes.get((model, variant))
+        if cached is not None and cached.name == name:
+            del self._prefixes[(model, variant)]
+            self.invalidated += 1
+
+    async def close(self):
+        """Delete the cached contents (best effort; they expire on their own anyway)"""
+        if not self._prefixes:
+            return
+        client = get_gemini_client()
+        for cached in list(self._prefixes.values()):
+            try:
+                await client.aio.caches.delete(name=cached.name)
+            except Exception as error:
+                logger.debug(f"Could not delete cached prompt {cached.name}: {error}")
+        self._prefixes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "enabled": settings.PROMPT_CACHE_ENABLED,
+            "handles": {
+                f"{model}/{variant}": {"name": cached.name, "expires_in_seconds": round(cached.expires_at - now)}
+                for (model, variant), cached in self._prefixes.items()
+            },
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+            "invalidated": self.invalidated,
+            "last_error": self.last_error,
+        }
+
+
+class PromptStats:
+    """Input tokens and latency per prompt variant, to compare variants"""
+
+    def __init__(self):
+        self.variants: Dict[str, Dict[str, float]] = {}
+
+    def record(self, variant: str, cached_prefix: bool, input_tokens: int, cached_tokens: int,
+               output_tokens: int, seconds: float):
+        """Record one successful Gemini call"""
+        entry = self.variants.setdefault(variant, {
+            "calls": 0, "calls_with_cached_prefix": 0, "input_tokens": 0, "cached_tokens": 0,
+            "output_tokens": 0, "seconds": 0.0
+        })
+        entry["calls"] += 1
+        entry["calls_with_cached_prefix"] += 1 if cached_prefix else 0
+        entry["input_tokens"] += input_tokens
+        entry["cached_tokens"] += cached_tokens
+        entry["output_tokens"] += output_tokens
+        entry["seconds"] += seconds
+        prompt_input_tokens.inc(variant, "cached", amount=cached_tokens)
+        prompt_input_tokens.inc(variant, "uncached", amount=input_tokens - cached_tokens)
+        prompt_request_seconds.observe(seconds, variant, "cached" if cached_prefix else "inline")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            variant: {
+                "calls": entry["calls"],
+                "calls_with_cached_prefix": entry["calls_with_cached_prefix"],
+                "mean_input_tokens": round(entry["input_tokens"] / entry["calls"]),
+                "mean_cached_tokens": round(entry["cached_tokens"] / entry["calls"]),
+                "mean_output_tokens": round(entry["output_tokens"] / entry["calls"]),
+                "mean_seconds": round(entry["seconds"] / entry["calls"], 3),
+            }
+            for variant, entry in self.variants.items()
+        }
+
+
+prompt_stats = PromptStats()
+
+_prompt_cache: Optional[PromptCache] = None
+
+
+def get_prompt_cache() -> PromptCache:
+    """Get the process-wide prompt prefix cache"""
+    global _prompt_cache
+    if _prompt_cache is None:
+        _prompt_cache = PromptCache(
+            ttl_seconds=settings.PROMPT_CACHE_TTL_SECONDS,
+            refresh_seconds=settings.PROMPT_CACHE_REFRESH_SECONDS,
+            retry_seconds=settings.PROMPT_CACHE_RETRY_SECONDS,
+        )
+    return _prompt_cache
+
+
+async def close_prompt_cache():
+    """Delete cached prompt prefixes on shutdown"""
+    if _prompt_cache is not None:
+        await _prompt_cache.close()
@@ -0,0 +1,377 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+from app.services.scheduler_service import is_quota_error
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ERROR_RATE_LIMITED = "rate_limited"
+ERROR_TRANSIENT = "transient"
+ERROR_FATAL = "fatal"
+
+TRANSIENT_STATUS_CODES = {408, 500, 502, 503, 504}
+TRANSIENT_ERROR_NAMES = {"ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "ChunkedEncodingError"}
+RETRY_DELAY_PATTERN = re.compile(r'"retryDelay":\s*"(\d+(?:\.\d+)?)s"')
+
+# Latency samples kept per model for the hedging percentile
+LATENCY_WINDOW = 200
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+retries_total = registry.counter(
+    "bill_gemini_retries_total", "Gemini calls retried, by error class", ["model", "reason"]
+)
+hedges_total = registry.counter(
+    "bill_gemini_hedges_total", "Hedged Gemini requests, by which request answered first", ["model", "winner"]
+)
+circuit_rejections_total = registry.counter(
+    "bill_gemini_circuit_rejections_total", "Gemini calls failed fast by an open circuit", ["model"]
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the model while its circuit breaker is open"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the per-document deadline leaves no time for another attempt"""
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Decide whether a failed model call is worth retrying.
+
+    Returns:
+        ERROR_RATE_LIMITED for 429 / RESOURCE_EXHAUSTED, ERROR_TRANSIENT for
+        5xx, timeouts and connection errors, ERROR_FATAL otherwise (bad
+        request, auth, invalid arguments)
+    """
+    if is_quota_error(error):
+        return ERROR_RATE_LIMITED
+
+    code = getattr(error, "code", None)
+    if code in TRANSIENT_STATUS_CODES:
+        return ERROR_TRANSIENT
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return ERROR_TRANSIENT
+    if type(error).__name__ in TRANSIENT_ERROR_NAMES:
+        return ERROR_TRANSIENT
+    return ERROR_FATAL
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Server hint for when to retry: Retry-After header or google.rpc.RetryInfo delay"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("Retry-After")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+
+    details = getattr(error, "details", None)
+    if details:
+        match = RETRY_DELAY_PATTERN.search(json.dumps(details) if not isinstance(details, str) else details)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float, retry_after: Optional[float]) -> float:
+    """
+    Full-jitter exponential backoff, never shorter than the server's hint.
+
+    Args:
+        attempt: Number of the failed attempt (0 for the first call)
+        base_seconds: Backoff before jitter for the first retry
+        max_seconds: Cap on the backoff
+        retry_after: Retry-After hint from the server, if any
+    """
+    delay = random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, max_seconds))
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one model.
+
+    After failure_threshold retryable failures in a row the circuit opens
+    and calls fail immediately. After reset_seconds one probe call is let
+    through (half-open); its success closes the circuit, its failure opens
+    it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        """Raise CircuitOpenError when the call must not be attempted"""
+        if not self.failure_threshold or self.state == CIRCUIT_CLOSED:
+            return
+
+        if self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = CIRCUIT_HALF_OPEN
+
+        if self.state == CIRCUIT_HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+
+        circuit_rejections_total.inc(self.name)
+        retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f"Circuit for {self.name} is open; upstream failing (retry in {retry_in:.0f}s)")
+
+    def record_success(self):
+        if self.state != CIRCUIT_CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """Let another probe through after a call that says nothing about upstream health"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if not self.failure_threshold:
+            return
+        if self.state == CIRCUIT_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != CIRCUIT_OPEN:
+                self.times_opened += 1
+                logger.warning(
+                    f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures"
+                )
+            self.state = CIRCUIT_OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+        }
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedging threshold"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples: "deque[float]" = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int) -> Optional[float]:
+        """Latency at percentile q, or None until min_samples calls were seen"""
+        if len(self.samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    Retries, hedging and circuit breaking for calls to one model.
+
+    The call itself is a zero-argument coroutine factory, so every attempt
+    reuses the request payload (prompt and encoded pages) built once by the
+    caller.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_retries: int,
+        base_delay_seconds: float,
+        max_delay_seconds: float,
+        hedge_percentile: float,
+        hedge_min_samples: int,
+        breaker: CircuitBreaker
+    ):
+        self.model = model
+        self.max_retries = max_retries
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    async def call(self, make_call: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        """
+        Run a model call with retries until it succeeds or fails for good.
+
+        Args:
+            make_call: Starts one attempt (one scheduler slot, one request)
+            deadline: time.monotonic() value after which no attempt is made
+
+        Returns:
+            The result of the first successful attempt
+
+        Raises:
+            CircuitOpenError: The circuit is open
+            DeadlineExceededError: The deadline expired before a success
+            Exception: The last error, when it is not retryable or retries ran out
+        """
+        self.calls += 1
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise DeadlineExceededError("Document deadline exceeded before the model call")
+
+            try:
+                result = await asyncio.wait_for(self._attempt(make_call), timeout=timeout)
+            except asyncio.TimeoutError:
+                # The deadline covers local work too, so it says nothing about upstream health
+                self.breaker.release_probe()
+                raise DeadlineExceededError(f"Document deadline exceeded waiting for {self.model}")
+            except asyncio.CancelledError:
+                # Cancelled by the caller (client disconnect, losing hedge, shutdown); a
+                # half-open probe must be handed back or the circuit never closes again
+                self.breaker.release_probe()
+                raise
+            except Exception as error:
+                error_class = classify_error(error)
+                if error_class == ERROR_FATAL:
+                    # An HTTP error response still means the upstream is reachable
+                    if getattr(error, "code", None) is not None:
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.release_probe()
+                    raise
+                self.breaker.record_failure()
+
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(
+                    attempt, self.base_delay_seconds, self.max_delay_seconds, retry_after_seconds(error)
+                )
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+
+                attempt += 1
+                self.retries += 1
+                retries_total.inc(self.model, error_class)
+                logger.warning(
+                    f"{self.model} call failed ({error_class}: {str(error)[:200]}); "
+                    f"retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    async def _attempt(self, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        """One attempt, hedged with a second request when the first is unusually slow"""
+        started = time.monotonic()
+        hedge_after = None
+        if self.hedge_percentile:
+            hedge_after = self.latency.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+        if hedge_after is None:
+            result = await make_call()
+            self.latency.record(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(make_call())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            hedged = not done
+            if hedged:
+                self.hedges += 1
+                logger.info(f"{self.model} call slower than p{self.hedge_percentile:g} ({hedge_after:.1f}s), hedging")
+                pending.add(asyncio.ensure_future(make_call()))
+
+            first_error: Optional[BaseException] = None
+            while done or pending:
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            winner = "primary" if task is primary else "hedge"
+                            self.hedges_won += winner == "hedge"
+                            hedges_total.inc(self.model, winner)
+                        self.latency.record(time.monotonic() - started)
+                        return task.result()
+                    first_error = first_error or task.exception()
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "hedge_after_seconds": (
+                self.latency.percentile(self.hedge_percentile, self.hedge_min_samples)
+                if self.hedge_percentile else None
+            ),
+            "circuit": self.breaker.stats(),
+        }
+
+
+_callers: Dict[str, ResilientCaller] = {}
+
+
+def get_resilient_caller(model: str) -> ResilientCaller:
+    """Process-wide caller (with its circuit breaker and latency window) for a model"""
+    caller = _callers.get(model)
+    if caller is None:
+        caller = ResilientCaller(
+            model=model,
+            max_retries=settings.GEMINI_MAX_RETRIES,
+            base_delay_seconds=settings.GEMINI_RETRY_BASE_SECONDS,
+            max_delay_seconds=settings.GEMINI_RETRY_MAX_SECONDS,
+            hedge_percentile=settings.GEMINI_HEDGE_PERCENTILE,
+            hedge_min_samples=settings.GEMINI_HEDGE_MIN_SAMPLES,
+            breaker=CircuitBreaker(
+                model, settings.GEMINI_CIRCUIT_FAILURE_THRESHOLD, settings.GEMINI_CIRCUIT_RESET_SECONDS
+            )
+        )
+        _callers[model] = caller
+    return caller
+
+
+def resilience_stats() -> Dict[str, Any]:
+    """Retry, hedge and circuit state per model"""
+    return {model: caller.stats() for model, caller in _callers.items()}
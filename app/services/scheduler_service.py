@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, AsyncIterator
+
+from app.core.config import get_settings
+from app.core.metrics import registry, scheduler_wait_seconds
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RATE_WINDOW_SECONDS = 60.0
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """Check whether an exception is a Gemini quota / rate limit error"""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+@dataclass
+class SchedulerTicket:
+    """Admission ticket for one Gemini call"""
+    estimated_tokens: int
+    queued_at: float
+    started_at: float = 0.0
+    tokens_used: Optional[int] = None
+    window_entry: list = field(default_factory=list)
+
+
+class GeminiScheduler:
+    """
+    Process-wide admission control for Gemini calls.
+
+    - Global in-flight limit, adapted with AIMD: additive increase on
+      healthy calls, multiplicative decrease on quota errors or latency spikes
+    - Request-per-minute and token-per-minute budgets over a sliding window
+    - Queue depth and wait time statistics
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        latency_target_seconds: float = 0.0,
+        additive_increase: float = 1.0,
+        decrease_factor: float = 0.5
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.latency_target_seconds = latency_target_seconds
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+
+        self.concurrency_limit = float(self.max_concurrency)
+        self._condition = asyncio.Condition()
+        self._window: "deque[list]" = deque()
+        self._window_tokens = 0
+        self._last_decrease_at = 0.0
+
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.total_requests = 0
+        self.quota_errors = 0
+        self.latency_spikes = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[SchedulerTicket]:
+        """
+        Hold one in-flight slot for the duration of a Gemini call.
+
+        Set `ticket.tokens_used` inside the block so the token budget is
+        charged with the real usage instead of the estimate.
+
+        Args:
+            estimated_tokens: Expected token usage of the call
+        """
+        ticket = await self._acquire(estimated_tokens)
+        try:
+            yield ticket
+        except BaseException as error:
+            await self._release(ticket, error)
+            raise
+        else:
+            await self._release(ticket, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current scheduler state and wait time statistics"""
+        self._prune_window(time.monotonic())
+        return {
+            "concurrency_limit": round(self.concurrency_limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "total_requests": self.total_requests,
+            "quota_errors": self.quota_errors,
+            "latency_spikes": self.latency_spikes,
+            "avg_wait_seconds": self.total_wait_seconds / self.total_requests if self.total_requests else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+            "requests_last_minute": len(self._window),
+            "tokens_last_minute": self._window_tokens,
+        }
+
+    async def _acquire(self, estimated_tokens: int) -> SchedulerTicket:
+        ticket = SchedulerTicket(estimated_tokens=estimated_tokens, queued_at=time.monotonic())
+
+        async with self._condition:
+            self.queue_depth += 1
+            try:
+                while True:
+                    delay = self._admission_delay(estimated_tokens)
+                    if delay == 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.queue_depth -= 1
+
+            now = time.monotonic()
+            ticket.started_at = now
+            ticket.window_entry = [now, estimated_tokens]
+            self._window.append(ticket.window_entry)
+            self._window_tokens += estimated_tokens
+            self.in_flight += 1
+
+        wait_seconds = ticket.started_at - ticket.queued_at
+        self.total_requests += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+        scheduler_wait_seconds.observe(wait_seconds)
+        return ticket
+
+    async def _release(self, ticket: SchedulerTicket, error: Optional[BaseException]):
+        now = time.monotonic()
+        latency = now - ticket.started_at
+
+        async with self._condition:
+            self.in_flight -= 1
+
+            # Entries that already left the window are no longer counted
+            still_in_window = ticket.window_entry[0] + RATE_WINDOW_SECONDS > now
+            if ticket.tokens_used is not None and still_in_window:
+                self._window_tokens += ticket.tokens_used - ticket.window_entry[1]
+                ticket.window_entry[1] = ticket.tokens_used
+
+            if error is not None and is_quota_error(error):
+                self.quota_errors += 1
+                self._decrease(ticket, "quota error")
+            elif self.latency_target_seconds and latency > self.latency_target_seconds:
+                self.latency_spikes += 1
+                self._decrease(ticket, f"latency {latency:.1f}s")
+            elif error is None:
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + self.additive_increase / self.concurrency_limit
+                )
+
+            self._condition.notify_all()
+
+    def _decrease(self, ticket: SchedulerTicket, reason: str):
+        """Multiplicative decrease, at most once per congestion episode"""
+        if ticket.started_at < self._last_decrease_at:
+            return
+        self._last_decrease_at = time.monotonic()
+        self.concurrency_limit = max(
+            float(self.min_concurrency),
+            self.concurrency_limit * self.decrease_factor
+        )
+        logger.warning(f"Gemini concurrency limit reduced to {self.concurrency_limit:.2f} ({reason})")
+
+    def _admission_delay(self, estimated_tokens: int) -> Optional[float]:
+        """
+        Seconds to wait before the next call may start.
+
+        Returns 0 when admitted, None to wait for a slot to be released,
+        or the time until the rate window frees enough budget.
+        """
+        if self.in_flight >= int(self.concurrency_limit):
+            return None
+
+        now = time.monotonic()
+        self._prune_window(now)
+        if not self._window:
+            return 0
+
+        oldest_expiry = self._window[0][0] + RATE_WINDOW_SECONDS - now
+
+        if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+            return max(oldest_expiry, 0.01)
+
+        if self.tokens_per_minute and self._window_tokens + estimated_tokens > self.tokens_per_minute:
+            return max(oldest_expiry, 0.01)
+
+        return 0
+
+    def _prune_window(self, now: float):
+        while self._window and self._window[0][0] + RATE_WINDOW_SECONDS <= now:
+            _, tokens = self._window.popleft()
+            self._window_tokens -= tokens
+
+
+_scheduler: Optional[GeminiScheduler] = None
+
+
+def init_gemini_scheduler() -> GeminiScheduler:
+    """Create the process-wide scheduler (called from the app lifespan)"""
+    global _scheduler
+    _scheduler = GeminiScheduler(
+        max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+        min_concurrency=settings.GEMINI_MIN_CONCURRENCY,
+        requests_per_minute=settings.GEMINI_REQUESTS_PER_MINUTE,
+        tokens_per_minute=settings.GEMINI_TOKENS_PER_MINUTE,
+        latency_target_seconds=settings.GEMINI_LATENCY_TARGET_SECONDS
+    )
+    return _scheduler
+
+
+def get_gemini_scheduler() -> GeminiScheduler:
+    """Get the process-wide scheduler, creating it if the lifespan did not"""
+    if _scheduler is None:
+        return init_gemini_scheduler()
+    return _scheduler
+
+
+registry.gauge(
+    "bill_gemini_in_flight", "Gemini calls currently running",
+    callback=lambda: get_gemini_scheduler().in_flight
+)
+registry.gauge(
+    "bill_gemini_queue_depth", "Gemini calls waiting for a scheduler slot",
+    callback=lambda: get_gemini_scheduler().queue_depth
+)
+registry.gauge(
+    "bill_gemini_concurrency_limit", "Current adaptive Gemini concurrency limit",
+    callback=lambda: get_gemini_scheduler().concurrency_limit
+)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class WorkerPool:
+    """
+    Executor stage for CPU-bound document work.
+
+    Rasterization, colour conversion and image encoding run here so the
+    event loop stays responsive. A process pool is used by default; a
+    thread pool can be configured where processes are not available.
+    """
+
+    def __init__(self, kind: str, size: int, task_timeout_seconds: float):
+        self.kind = kind
+        self.size = size or os.cpu_count() or 1
+        self.task_timeout_seconds = task_timeout_seconds
+
+        self.completed_tasks = 0
+        self.failed_tasks = 0
+        self.timed_out_tasks = 0
+        self.active_tasks = 0
+
+        self._executor = self._create_executor()
+
+    def _create_executor(self) -> Executor:
+        if self.kind == "thread":
+            return ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="document-worker")
+        if self.kind == "process":
+            # spawn avoids forking a process that already runs threads
+            return ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        raise ValueError(f"Unknown worker pool kind: {self.kind}")
+
+    async def run(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a function in the pool with the per-task timeout.
+
+        Args:
+            func: Top-level (picklable) function
+            *args: Positional arguments for func
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            The function result
+
+        Raises:
+            TimeoutError: If the task exceeds the per-task timeout
+        """
+        loop = asyncio.get_running_loop()
+        self.active_tasks += 1
+        try:
+            future = loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+            result = await asyncio.wait_for(future, timeout=self.task_timeout_seconds or None)
+            self.completed_tasks += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timed_out_tasks += 1
+            raise TimeoutError(
+                f"{func.__name__} exceeded worker task timeout of {self.task_timeout_seconds}s"
+            )
+        except BrokenProcessPool:
+            # A worker died (for example OOM-killed); replace the pool for later tasks
+            self.failed_tasks += 1
+            logger.error("Worker process pool broke, recreating it")
+            self._executor = self._create_executor()
+            raise
+        except Exception:
+            self.failed_tasks += 1
+            raise
+        finally:
+            self.active_tasks -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool configuration and task counters"""
+        return {
+            "kind": self.kind,
+            "size": self.size,
+            "active_tasks": self.active_tasks,
+            "completed_tasks": self.completed_tasks,
+            "failed_tasks": self.failed_tasks,
+            "timed_out_tasks": self.timed_out_tasks,
+        }
+
+    def shutdown(self):
+        """Stop the workers without waiting for queued tasks"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_worker_pool: Optional[WorkerPool] = None
+
+
+def init_worker_pool() -> WorkerPool:
+    """Create the process-wide worker pool (called from the app lifespan)"""
+    global _worker_pool
+    _worker_pool = WorkerPool(
+        kind=settings.WORKER_POOL_KIND,
+        size=settings.WORKER_POOL_SIZE,
+        task_timeout_seconds=settings.WORKER_TASK_TIMEOUT_SECONDS
+    )
+    return _worker_pool
+
+
+def get_worker_pool() -> WorkerPool:
+    """Get the process-wide worker pool, creating it if the lifespan did not"""
+    if _worker_pool is None:
+        return init_worker_pool()
+    return _worker_pool
+
+
+registry.gauge(
+    "bill_worker_pool_active_tasks", "Document worker pool tasks currently running",
+    callback=lambda: _worker_pool.active_tasks if _worker_pool is not None else 0
+)
+
+
+def shutdown_worker_pool():
+    """Shut down the process-wide worker pool"""
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.shutdown()
+        _worker_pool = None
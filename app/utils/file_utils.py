@@ -1,16 +1,321 @@
 import aiohttp
+import hashlib
+import io
 import tempfile
 import os
-from typing import Tuple
-from fastapi import HTTPException, status
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
 import logging
 
+from app.core.clients import get_http_session
 from app.core.config import get_settings
+from app.models.domain import SpooledDocument
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+class DocumentSpooler:
+    """
+    Incrementally collect a document body with size enforcement.
+
+    Chunks are kept in memory until SPOOL_MAX_MEMORY_MB, then moved to a
+    temporary file. The SHA-256 of the body is computed along the way.
+    """
+
+    def __init__(self, max_bytes: int, spool_threshold_bytes: int):
+        self.max_bytes = max_bytes
+        self.spool_threshold_bytes = spool_threshold_bytes
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._file = None
+
+    def write(self, chunk: bytes):
+        """
+        Append a chunk of the body.
+
+        Raises:
+            HTTPException: If the body grows beyond the size limit
+        """
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.abort()
+            raise_file_too_large(self.size)
+
+        self._hasher.update(chunk)
+
+        if self._file is None and self.size > self.spool_threshold_bytes:
+            self._file = tempfile.NamedTemporaryFile(
+                prefix="document-",
+                dir=settings.SPOOL_DIR or None,
+                delete=False
+            )
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    def finish(self, content_type: str) -> SpooledDocument:
+        """Close the spool and return the collected document"""
+        if self._file is not None:
+            self._file.close()
+            return SpooledDocument(
+                content_type=content_type,
+                size=self.size,
+                sha256=self._hasher.hexdigest(),
+                path=self._file.name
+            )
+
+        return SpooledDocument(
+            content_type=content_type,
+            size=self.size,
+            sha256=self._hasher.hexdigest(),
+            content=self._buffer.getvalue()
+        )
+
+    def abort(self):
+        """Discard everything collected so far"""
+        if self._file is not None:
+            self._file.close()
+            if os.path.exists(self._file.name):
+                os.unlink(self._file.name)
+            self._file = None
+        self._buffer = io.BytesIO()
+
+
+def raise_file_too_large(size_bytes: int):
+    """Raise the 413 error used for oversized documents"""
+    size_mb = size_bytes / (1024 * 1024)
+    raise HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File size ({size_mb:.2f}MB) exceeds limit ({settings.MAX_FILE_SIZE_MB}MB)"
+    )
+
+
+async def spool_response(response: aiohttp.ClientResponse) -> SpooledDocument:
+    """
+    Stream an HTTP response body into a SpooledDocument.
+
+    The declared Content-Length is checked before reading, and the running
+    byte count while reading, so oversized bodies are rejected early.
+
+    Args:
+        response: Response with status 200
+
+    Returns:
+        SpooledDocument with the body
+
+    Raises:
+        HTTPException: If the body exceeds MAX_FILE_SIZE_MB
+    """
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+
+    if response.content_length is not None and response.content_length > max_bytes:
+        raise_file_too_large(response.content_length)
+
+    spooler = DocumentSpooler(
+        max_bytes=max_bytes,
+        spool_threshold_bytes=settings.SPOOL_MAX_MEMORY_MB * 1024 * 1024
+    )
+    try:
+        async for chunk in response.content.iter_chunked(settings.DOWNLOAD_CHUNK_SIZE_KB * 1024):
+            spooler.write(chunk)
+    except BaseException:
+        spooler.abort()
+        raise
+
+    content_type = response.headers.get('Content-Type', '').lower()
+    return spooler.finish(content_type)
+
+
+# Bytes needed by detect_file_type
+FILE_SIGNATURE_BYTES = 8
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+UPLOAD_CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+}
+
+
+class MultipartUploadCollector:
+    """
+    Callbacks for the streaming multipart parser.
+
+    Each file part is written straight into its own DocumentSpooler as the
+    body arrives. The file type is checked from the first bytes and the
+    size limit is enforced per chunk, so bad uploads fail before the rest
+    of the body is read. Other parts are kept as small form fields.
+    """
+
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        self.files: List[Tuple[str, SpooledDocument]] = []
+        self.fields: Dict[str, str] = {}
+
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._field_name: Optional[str] = None
+        self._filename: Optional[str] = None
+        self._spooler: Optional[DocumentSpooler] = None
+        self._head = b""
+        self._upload_type: Optional[str] = None
+        self._field_value = bytearray()
+
+    def callbacks(self) -> Dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        }
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._field_name = None
+        self._filename = None
+        self._spooler = None
+        self._head = b""
+        self._upload_type = None
+        self._field_value = bytearray()
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._field_name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if filename is None:
+            return
+
+        if len(self.files) >= self.max_files:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Too many files. At most {self.max_files} files per upload"
+            )
+        self._filename = filename.decode("utf-8", "replace")
+        self._spooler = DocumentSpooler(
+            max_bytes=settings.MAX_FILE_SIZE_MB * 1024 * 1024,
+            spool_threshold_bytes=settings.SPOOL_MAX_MEMORY_MB * 1024 * 1024
+        )
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        chunk = data[start:end]
+
+        if self._spooler is None:
+            if len(self._field_value) + len(chunk) > MAX_FORM_FIELD_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Form field '{self._field_name}' is too large"
+                )
+            self._field_value += chunk
+            return
+
+        if self._upload_type is None:
+            self._head += chunk[:FILE_SIGNATURE_BYTES - len(self._head)]
+            if len(self._head) >= FILE_SIGNATURE_BYTES:
+                self._detect_upload_type()
+        self._spooler.write(chunk)
+
+    def _on_part_end(self):
+        if self._spooler is None:
+            self.fields[self._field_name] = self._field_value.decode("utf-8", "replace")
+            return
+
+        if self._upload_type is None:
+            self._detect_upload_type()
+        self.files.append((self._filename, self._spooler.finish(self._upload_type)))
+        self._spooler = None
+
+    def _detect_upload_type(self):
+        _, extension = detect_file_type(self._head)
+        self._upload_type = UPLOAD_CONTENT_TYPES[extension]
+        logger.info(f"Receiving upload '{self._filename}' ({self._upload_type})")
+
+    def abort(self):
+        """Discard the part in progress and every collected file"""
+        if self._spooler is not None:
+            self._spooler.abort()
+            self._spooler = None
+        for _, document in self.files:
+            document.close()
+        self.files = []
+
+
+async def spool_multipart_upload(
+    request: Request,
+    max_files: int
+) -> Tuple[List[Tuple[str, SpooledDocument]], Dict[str, str]]:
+    """
+    Stream a multipart/form-data request body into SpooledDocuments.
+
+    Parts are parsed incrementally from the request stream, so no full
+    copy of the body is held in memory; large files are spooled to disk.
+    Callers must close() the returned documents.
+
+    Args:
+        request: Incoming request with a multipart/form-data body
+        max_files: Maximum number of file parts accepted
+
+    Returns:
+        Tuple of ([(filename, document)], {field name: value})
+
+    Raises:
+        HTTPException: On a non-multipart body, unsupported file type,
+            oversized file or too many files
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Expected a multipart/form-data upload"
+        )
+
+    collector = MultipartUploadCollector(max_files=max_files)
+    parser = MultipartParser(boundary, collector.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as error:
+        collector.abort()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Malformed multipart body: {str(error)}"
+        )
+    except BaseException:
+        collector.abort()
+        raise
+
+    if not collector.files:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No file found in the upload"
+        )
+
+    return collector.files, collector.fields
+
+
 async def download_file(url: str) -> bytes:
     """
     Download file from URL asynchronously
@@ -25,28 +330,23 @@ async def download_file(url: str) -> bytes:
         HTTPException: If download fails
     """
     try:
-        timeout = aiohttp.ClientTimeout(total=settings.TIMEOUT_SECONDS)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Failed to download document. Status: {response.status}"
-                    )
-                
-                content = await response.read()
-                
-                # Check file size
-                size_mb = len(content) / (1024 * 1024)
-                if size_mb > settings.MAX_FILE_SIZE_MB:
-                    raise HTTPException(
-                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        detail=f"File size ({size_mb:.2f}MB) exceeds limit ({settings.MAX_FILE_SIZE_MB}MB)"
-                    )
-                
-                logger.info(f"Downloaded file: {size_mb:.2f}MB")
-                return content
-                
+        session = get_http_session()
+        async with session.get(url) as response:
+            if response.status != 200:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to download document. Status: {response.status}"
+                )
+            
+            document = await spool_response(response)
+            try:
+                content = document.read_bytes()
+            finally:
+                document.close()
+            
+            logger.info(f"Downloaded file: {len(content) / (1024 * 1024):.2f}MB")
+            return content
+            
     except aiohttp.ClientError as e:
         logger.error(f"Network error downloading file: {str(e)}")
         raise HTTPException(
@@ -0,0 +1,193 @@
+from array import array
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+# A character bigram plus its occurrence number, so multiset overlap becomes
+# set overlap
+Token = Tuple[str, int]
+
+# Characters are counted in ord(c) % CHAR_BUCKETS buckets; merging characters
+# can only raise the shared count, so the character bound stays safe
+CHAR_BUCKETS = 128
+
+# Partner lengths that cannot match
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+def _numbered(grams: Iterable[str]) -> List[Token]:
+    counts = Counter()
+    tokens = []
+    for gram in grams:
+        tokens.append((gram, counts[gram]))
+        counts[gram] += 1
+    return tokens
+
+
+def _bigram_tokens(name: str) -> List[Token]:
+    return _numbered(name[index:index + 2] for index in range(len(name) - 1))
+
+
+def _char_histogram(name: str) -> np.ndarray:
+    return np.bincount([ord(char) % CHAR_BUCKETS for char in name], minlength=CHAR_BUCKETS)
+
+
+class FuzzyNameIndex:
+    """
+    Index for "is any stored name more than `threshold` similar to this one?"
+    using difflib.SequenceMatcher(None, query, stored).ratio().
+
+    SequenceMatcher's ratio is 2M / (la + lb), where M is the size of its
+    matching blocks. For a pair above the threshold:
+
+    - M is at least a minimum set by the two lengths, and never exceeds the
+      characters both names share as multisets (difflib's quick_ratio bound)
+    - the nb matching blocks are a common subsequence, and every gap between
+      two blocks skips at least one character, so nb <= la + lb - 2M + 1;
+      a block of s characters holds s - 1 bigrams, so the names share at
+      least T = M - nb character bigrams as multisets
+
+    Every stored name is indexed under all of its numbered bigrams. A query
+    counts the bigrams it shares with each stored name in one bincount over
+    the posting lists of its own bigrams, and compares shared characters
+    through per-name character histograms, both with numpy; the cost per
+    query is the length of those posting lists plus a few array operations
+    over the stored names, with no Python loop over them. Only names that
+    reach both bounds for their length (very short names have no bigram
+    bound) are scored with SequenceMatcher, so results are identical to
+    comparing every pair. Identical names are found with a set lookup.
+    """
+
+    def __init__(self, threshold: float = 0.85):
+        """
+        Args:
+            threshold: Similarity above which two names match
+        """
+        self.threshold = threshold
+
+        self._names: List[str] = []
+        self._exact: Set[str] = set()
+        # Rows past len(self._names) are spare capacity
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._char_histograms = np.zeros((0, CHAR_BUCKETS), dtype=np.int32)
+        # bigram -> ids of the names containing it, in insertion order
+        self._postings: Dict[Token, array] = defaultdict(lambda: array("i"))
+
+        self.candidates_scored = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str):
+        """Store a name so later queries can match it"""
+        name_id = len(self._names)
+        if name_id == len(self._lengths):
+            capacity = max(64, 2 * name_id)
+            self._lengths = np.resize(self._lengths, capacity)
+            self._char_histograms = np.resize(self._char_histograms, (capacity, CHAR_BUCKETS))
+
+        self._names.append(name)
+        self._exact.add(name)
+        self._lengths[name_id] = len(name)
+        self._char_histograms[name_id] = _char_histogram(name)
+        for token in _bigram_tokens(name):
+            self._postings[token].append(name_id)
+
+    def contains_similar(self, name: str) -> bool:
+        """Check whether any stored name is more than `threshold` similar"""
+        if name in self._exact:
+            # Identical names score 1.0 (two empty strings included)
+            return self.threshold < 1.0
+
+        stored = len(self._names)
+        if not stored:
+            return False
+
+        postings = [
+            np.frombuffer(self._postings[token], dtype=np.int32)
+            for token in _bigram_tokens(name)
+            if token in self._postings
+        ]
+        if postings:
+            shared_bigrams = np.bincount(np.concatenate(postings), minlength=stored)
+        else:
+            shared_bigrams = np.zeros(stored, dtype=np.int64)
+        del postings  # release the views so the posting arrays can grow again
+
+        required_chars, required_bigrams = _required_tables(len(name), self.threshold)
+        partner_lengths = np.minimum(self._lengths[:stored], len(required_chars) - 1)
+        candidates = np.flatnonzero(shared_bigrams >= required_bigrams[partner_lengths])
+        if not len(candidates):
+            return False
+
+        shared_chars = np.minimum(self._char_histograms[candidates], _char_histogram(name)).sum(axis=1)
+        candidates = candidates[shared_chars >= required_chars[partner_lengths[candidates]]]
+
+        for name_id in candidates.tolist():
+            self.candidates_scored += 1
+            if SequenceMatcher(None, name, self._names[name_id]).ratio() > self.threshold:
+                return True
+        return False
+
+
+@lru_cache(maxsize=4096)
+def _required_overlaps(length: int, threshold: float) -> Dict[int, Tuple[int, int]]:
+    """
+    Minimum shared characters and shared bigrams for each partner length that can still match.
+
+    Uses difflib's own expression (2.0 * M / total > threshold) so rounding
+    matches SequenceMatcher.ratio exactly. Lengths whose best case
+    (M = shorter length) fails are left out. The bigram bound is
+    M - (total - 2M + 1) at the smallest matching M; it only grows with M.
+    """
+    required_by_length = {}
+    if length == 0 and threshold >= 0:
+        return required_by_length
+
+    # Below zero even an empty partner (ratio 0) matches
+    other_length = 0 if threshold < 0 and length else 1
+    while True:
+        total = length + other_length
+        shorter = min(length, other_length)
+        if 2.0 * shorter / total > threshold:
+            matches = int(threshold * total / 2)
+            while matches > 0 and 2.0 * (matches - 1) / total > threshold:
+                matches -= 1
+            while 2.0 * matches / total <= threshold:
+                matches += 1
+            required_by_length[other_length] = (matches, matches - (total - 2 * matches + 1))
+        elif other_length > length:
+            break
+        if threshold <= 0 and other_length > length:
+            # Never out of reach: _required_tables extends the last length
+            break
+        other_length += 1
+    return required_by_length
+
+
+@lru_cache(maxsize=4096)
+def _required_tables(length: int, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    _required_overlaps as arrays indexed by partner length.
+
+    Returns:
+        Tuple of (shared characters, shared bigrams) needed per partner
+        length; the last entry stands for every longer length. Lengths that
+        cannot match need UNREACHABLE
+    """
+    required_by_length = _required_overlaps(length, threshold)
+    size = max(required_by_length, default=0) + 2
+    required_chars = np.full(size, UNREACHABLE, dtype=np.int64)
+    required_bigrams = np.full(size, UNREACHABLE, dtype=np.int64)
+    if threshold <= 0 and length + 1 in required_by_length:
+        # Longer partners need as many shared characters and no bigram
+        required_chars[-1], required_bigrams[-1] = required_by_length[length + 1][0], 0
+    for other_length, (matches, bigrams) in required_by_length.items():
+        required_chars[other_length] = matches
+        required_bigrams[other_length] = bigrams
+    required_chars.flags.writeable = False
+    required_bigrams.flags.writeable = False
+    return required_chars, required_bigrams
@@ -1,24 +1,88 @@
 import io
 import tempfile
 import os
-from typing import List
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Union
 from PIL import Image
-from pdf2image import convert_from_path
+from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_bytes, pdfinfo_from_path
 from fastapi import HTTPException, status
 import logging
 
 from app.core.config import get_settings
+from app.models.domain import PageImage
+from app.utils.pdf_text import extract_page_texts, has_usable_text, pdf_page_sizes, text_page
 
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
-def preprocess_for_extraction(image: Image.Image) -> Image.Image:
-    """Lightweight preprocessing - returns image unchanged for performance."""
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def preprocess_for_extraction(image: Image.Image, profile: Optional[Dict[str, Any]] = None) -> Image.Image:
+    """
+    Prepare a page image for upload according to an image profile.
+    
+    Without a profile the image is returned unchanged.
+    
+    Args:
+        image: Decoded page image
+        profile: Entry from IMAGE_PROFILES (grayscale, max_dimension)
+        
+    Returns:
+        Preprocessed image
+    """
+    if not profile:
+        return image
+    
+    if profile.get("grayscale") and image.mode != 'L':
+        image = image.convert('L')
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    
+    max_dimension = profile.get("max_dimension")
+    if max_dimension and max(image.size) > max_dimension:
+        image = image.copy()
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    
     return image
 
 
+class ProfileStats:
+    """Bytes-per-page and input tokens per image profile, for picking the cheapest profile"""
+    
+    def __init__(self):
+        self._pages = defaultdict(int)
+        self._bytes = defaultdict(int)
+        self._token_pages = defaultdict(int)
+        self._input_tokens = defaultdict(int)
+    
+    def record_pages(self, profile_name: str, pages: List[PageImage]):
+        """Record encoded page sizes produced with a profile"""
+        self._pages[profile_name] += len(pages)
+        self._bytes[profile_name] += sum(len(page.data) for page in pages)
+    
+    def record_tokens(self, profile_name: str, page_count: int, input_tokens: int):
+        """Record the input tokens Gemini billed for pages encoded with a profile"""
+        self._token_pages[profile_name] += page_count
+        self._input_tokens[profile_name] += input_tokens
+    
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, pages in self._pages.items():
+            token_pages = self._token_pages[name]
+            result[name] = {
+                "pages": pages,
+                "bytes_per_page": self._bytes[name] / pages if pages else 0.0,
+                "input_tokens_per_page": self._input_tokens[name] / token_pages if token_pages else 0.0,
+            }
+        return result
+
+
+profile_stats = ProfileStats()
+
+
 def convert_pdf_to_images(pdf_bytes: bytes) -> List[Image.Image]:
     """
     Convert PDF bytes to list of PIL Images.
@@ -88,3 +152,163 @@ def load_image_from_bytes(image_bytes: bytes) -> Image.Image:
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid image file: {str(e)}"
         )
+
+
+# The functions below run inside the worker pool (see app/services/worker_pool.py).
+# They must stay top-level and only take/return picklable values. Documents are
+# passed as in-memory bytes or as the path of a spooled file.
+
+def encode_page(image: Image.Image, page_no: int, profile: Optional[Dict[str, Any]] = None) -> PageImage:
+    """
+    Preprocess and encode a page image.
+
+    With a profile the image is re-encoded in the profile format and quality.
+    Without one it is encoded the way the Gemini SDK would: PNG sources and
+    images with alpha stay PNG, everything else is JPEG.
+
+    Args:
+        image: Decoded page image
+        page_no: 1-based page number
+        profile: Entry from IMAGE_PROFILES, or None
+
+    Returns:
+        PageImage with the encoded bytes
+    """
+    image = preprocess_for_extraction(image, profile)
+    buffer = io.BytesIO()
+    if profile:
+        image_format = profile.get("format", "JPEG")
+        image.save(buffer, format=image_format, quality=profile.get("quality", 75))
+        mime_type = MIME_TYPES[image_format]
+    elif image.format == 'PNG' or image.mode == 'RGBA':
+        image.save(buffer, format='PNG')
+        mime_type = 'image/png'
+    else:
+        image.save(buffer, format='JPEG')
+        mime_type = 'image/jpeg'
+
+    return PageImage(
+        page_no=page_no,
+        data=buffer.getvalue(),
+        mime_type=mime_type,
+        width=image.width,
+        height=image.height
+    )
+
+
+def count_pdf_pages(source: Union[bytes, str]) -> int:
+    """Read the page count from the PDF metadata without rendering anything"""
+    if isinstance(source, str):
+        info = pdfinfo_from_path(source)
+    else:
+        info = pdfinfo_from_bytes(source)
+    return int(info["Pages"])
+
+
+def render_pdf_pages(
+    source: Union[bytes, str],
+    dpi: int,
+    first_page: Optional[int] = None,
+    last_page: Optional[int] = None,
+    profile: Optional[Dict[str, Any]] = None
+) -> List[PageImage]:
+    """
+    Rasterize PDF pages and encode them.
+
+    Args:
+        source: PDF file content as bytes, or path of a spooled file
+        dpi: Rendering resolution
+        first_page: First page to render (1-based, inclusive)
+        last_page: Last page to render (1-based, inclusive)
+        profile: Entry from IMAGE_PROFILES, or None
+
+    Returns:
+        List of encoded pages
+    """
+    convert = convert_from_path if isinstance(source, str) else convert_from_bytes
+    images = convert(
+        source,
+        dpi=dpi,
+        fmt='png',
+        first_page=first_page,
+        last_page=last_page
+    )
+    start = first_page or 1
+    return [encode_page(image, start + index, profile) for index, image in enumerate(images)]
+
+
+def render_pdf_window(
+    source: Union[bytes, str],
+    dpi: int,
+    first_page: int,
+    last_page: int,
+    profile: Optional[Dict[str, Any]] = None,
+    text_layer_min_chars: int = 0
+) -> List[PageImage]:
+    """
+    Produce the pages of a PDF window, using the text layer where possible.
+
+    Pages with a usable text layer are returned as text pages; only the
+    remaining (scanned) pages are rasterized. If text extraction fails the
+    whole window is rasterized.
+
+    Args:
+        source: PDF file content as bytes, or path of a spooled file
+        dpi: Rendering resolution
+        first_page: First page (1-based, inclusive)
+        last_page: Last page (1-based, inclusive)
+        profile: Entry from IMAGE_PROFILES, or None
+        text_layer_min_chars: Minimum visible characters for a text page (0 = images only)
+
+    Returns:
+        List of text and image pages in page order
+    """
+    if not text_layer_min_chars:
+        return render_pdf_pages(source, dpi, first_page, last_page, profile)
+
+    try:
+        texts = extract_page_texts(source, first_page, last_page)
+        sizes = pdf_page_sizes(source, first_page, last_page)
+    except Exception as error:
+        logger.warning(f"Text layer extraction failed, rasterizing pages {first_page}-{last_page}: {str(error)}")
+        return render_pdf_pages(source, dpi, first_page, last_page, profile)
+
+    pages = {}
+    scanned = []
+    for page_no, text in enumerate(texts, start=first_page):
+        if has_usable_text(text, text_layer_min_chars):
+            pages[page_no] = text_page(page_no, text, sizes.get(page_no), dpi, profile)
+        else:
+            scanned.append(page_no)
+
+    # Rasterize consecutive runs of scanned pages with one poppler call each
+    runs = []
+    for page_no in scanned:
+        if runs and runs[-1][1] == page_no - 1:
+            runs[-1][1] = page_no
+        else:
+            runs.append([page_no, page_no])
+    for run_first, run_last in runs:
+        for page in render_pdf_pages(source, dpi, run_first, run_last, profile):
+            pages[page.page_no] = page
+
+    return [pages[page_no] for page_no in sorted(pages)]
+
+
+def render_image(source: Union[bytes, str], profile: Optional[Dict[str, Any]] = None) -> List[PageImage]:
+    """
+    Decode a single image, convert it to RGB if needed and encode it.
+
+    Args:
+        source: Image file content as bytes, or path of a spooled file
+        profile: Entry from IMAGE_PROFILES, or None
+
+    Returns:
+        List with one encoded page
+    """
+    image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    return [encode_page(image, 1, profile)]
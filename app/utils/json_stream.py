@@ -0,0 +1,126 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+# Characters that change the scanner state; everything else is skipped in bulk
+STRUCTURAL_CHARACTERS = re.compile(r'[\[\]{}"\\]')
+
+
+class IncrementalPagesParser:
+    """
+    Incremental parser for the model's {"pages": [...]} output.
+
+    Text is fed as it is generated. Every element of the top-level "pages"
+    array (or of a top-level array, which the model sometimes returns
+    instead) is returned as soon as its closing brace arrives, so complete
+    pages are available long before the whole response is, and survive a
+    response that is cut off.
+
+    Only the structure needed to find element boundaries is tracked:
+    nesting, strings and escapes. Each complete element is decoded with
+    json.loads, and the consumed text is dropped.
+    """
+
+    def __init__(self):
+        self.pages: List[Dict[str, Any]] = []
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._string_start: Optional[int] = None
+        self._last_root_string: Optional[str] = None
+        self._pages_depth: Optional[int] = None
+        self._element_start: Optional[int] = None
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Add generated text.
+
+        Args:
+            text: Next piece of the model output
+
+        Returns:
+            Pages completed by this piece, in order
+        """
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+
+        while True:
+            match = STRUCTURAL_CHARACTERS.search(buffer, self._pos)
+            if match is None:
+                self._pos = len(buffer)
+                break
+            char = match.group()
+            index = match.start()
+            self._pos = index + 1
+
+            if self._in_string:
+                if char == "\\":
+                    if self._pos >= len(buffer):
+                        # The escaped character has not arrived yet
+                        self._pos = index
+                        break
+                    self._pos += 1
+                elif char == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        self._last_root_string = buffer[self._string_start:index]
+                        self._string_start = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                # Keys of the root object, to recognise "pages"
+                self._string_start = index + 1 if len(self._stack) == 1 and self._stack[0] == "{" else None
+            elif char in "{[":
+                if char == "[" and self._pages_depth is None and (
+                    not self._stack or (self._stack == ["{"] and self._last_root_string == "pages")
+                ):
+                    self._pages_depth = len(self._stack) + 1
+                elif char == "{" and len(self._stack) == self._pages_depth:
+                    self._element_start = index
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if char == "}" and self._element_start is not None and len(self._stack) == self._pages_depth:
+                    page = self._decode(buffer[self._element_start:index + 1])
+                    if page is not None:
+                        completed.append(page)
+                    self._element_start = None
+                elif char == "]" and self._pages_depth is not None and len(self._stack) == self._pages_depth - 1:
+                    self._pages_depth = -1  # array closed; ignore any later arrays
+
+        self._compact()
+        self.pages.extend(completed)
+        return completed
+
+    def _decode(self, element: str) -> Optional[Dict[str, Any]]:
+        try:
+            page = json.loads(element)
+        except json.JSONDecodeError:
+            return None
+        return page if isinstance(page, dict) else None
+
+    def _compact(self):
+        """Drop text that can no longer be part of an element"""
+        keep_from = self._pos
+        if self._element_start is not None:
+            keep_from = self._element_start
+        elif self._string_start is not None:
+            keep_from = self._string_start
+        if keep_from:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            if self._element_start is not None:
+                self._element_start -= keep_from
+            if self._string_start is not None:
+                self._string_start -= keep_from
+
+
+def recover_pages(text: str) -> List[Dict[str, Any]]:
+    """Complete pages of a (possibly truncated) model output"""
+    parser = IncrementalPagesParser()
+    parser.feed(text)
+    return parser.pages
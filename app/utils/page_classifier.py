@@ -0,0 +1,188 @@
+import io
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+from PIL import Image
+
+from app.core.constants import IGNORED_PATTERNS, LINE_ITEM_HEADER_PATTERNS, NON_ITEM_PAGE_PATTERNS
+from app.models.domain import PageImage
+
+# Pages are analysed at this size; enough to resolve text lines and rulings
+ANALYSIS_MAX_DIMENSION = 1000
+INK_THRESHOLD = 128
+
+# Image features
+BLANK_INK_RATIO = 0.003  # below this a page is blank
+RULE_ROW_DENSITY = 0.5  # a row this dark is a horizontal table rule
+RULE_COLUMN_DENSITY = 0.25  # a column this dark is a vertical table rule
+TEXT_ROW_DENSITY = 0.01  # a row this dark contains text
+MIN_TABLE_RULES = 3
+MIN_TABLE_TEXT_LINES = 12
+
+# Text layer features
+MONEY_PATTERN = re.compile(r"\d[\d,]*\.\d{2}\b")
+LETTER_PATTERN = re.compile(r"[A-Za-z]{3,}")
+SUMMARY_PATTERNS = [pattern for pattern in IGNORED_PATTERNS if pattern not in LINE_ITEM_HEADER_PATTERNS]
+MAX_SUMMARY_ITEM_ROWS = 3
+
+
+def _count_runs(mask: np.ndarray) -> int:
+    """Number of consecutive True runs in a 1-D mask"""
+    if not mask.any():
+        return 0
+    rising = np.flatnonzero(mask[1:] & ~mask[:-1])
+    return len(rising) + int(mask[0])
+
+
+def image_features(page: PageImage) -> Dict[str, float]:
+    """
+    Layout features of a page image from NumPy projection profiles.
+
+    Args:
+        page: Encoded page image
+
+    Returns:
+        Ink ratio, horizontal and vertical rule counts and text line count
+    """
+    image = Image.open(io.BytesIO(page.data))
+    image.draft("L", (ANALYSIS_MAX_DIMENSION, ANALYSIS_MAX_DIMENSION))
+    image = image.convert("L")
+    image.thumbnail((ANALYSIS_MAX_DIMENSION, ANALYSIS_MAX_DIMENSION))
+
+    ink = np.asarray(image) < INK_THRESHOLD
+    row_density = ink.mean(axis=1)
+    column_density = ink.mean(axis=0)
+
+    return {
+        "ink_ratio": float(ink.mean()),
+        "horizontal_rules": _count_runs(row_density > RULE_ROW_DENSITY),
+        "vertical_rules": _count_runs(column_density > RULE_COLUMN_DENSITY),
+        "text_lines": _count_runs(row_density > TEXT_ROW_DENSITY),
+    }
+
+
+def text_features(text: str) -> Dict[str, int]:
+    """
+    Line-item features of a page's text layer.
+
+    Args:
+        text: Extracted page text
+
+    Returns:
+        Rows that look like priced items, table header hits and summary keyword hits
+    """
+    lowered = text.lower()
+    item_rows = sum(
+        1 for line in text.splitlines()
+        if MONEY_PATTERN.search(line) and LETTER_PATTERN.search(line)
+        and not any(pattern in line.lower() for pattern in SUMMARY_PATTERNS)
+    )
+    return {
+        "item_rows": item_rows,
+        "header_hits": sum(1 for pattern in LINE_ITEM_HEADER_PATTERNS if pattern in lowered),
+        "summary_hits": sum(1 for pattern in SUMMARY_PATTERNS + NON_ITEM_PAGE_PATTERNS if pattern in lowered),
+    }
+
+
+def classify_page(page: PageImage, mode: str) -> Dict[str, Any]:
+    """
+    Decide whether a page confidently has no line items.
+
+    conservative skips only blank pages and text pages with neither a
+    priced row nor a table header. aggressive also skips text pages
+    without priced rows, summary-style text pages and image pages
+    without any table structure.
+
+    Args:
+        page: Text or image page
+        mode: "conservative" or "aggressive"
+
+    Returns:
+        Dict with page_no, skip flag, reason and the features used
+    """
+    aggressive = mode == "aggressive"
+
+    if page.text is not None:
+        features = text_features(page.text)
+        if features["item_rows"] == 0 and (aggressive or features["header_hits"] == 0):
+            reason = "no priced rows in text layer"
+        elif (aggressive and features["item_rows"] <= MAX_SUMMARY_ITEM_ROWS
+              and features["summary_hits"] > features["item_rows"] + features["header_hits"]):
+            reason = "summary page"
+        else:
+            reason = None
+    else:
+        features = image_features(page)
+        is_table = (
+            features["horizontal_rules"] + features["vertical_rules"] >= MIN_TABLE_RULES
+            or features["text_lines"] >= MIN_TABLE_TEXT_LINES
+        )
+        if features["ink_ratio"] < BLANK_INK_RATIO:
+            reason = "blank page"
+        elif aggressive and not is_table:
+            reason = "no table structure"
+        else:
+            reason = None
+
+    return {
+        "page_no": page.page_no,
+        "skip": reason is not None,
+        "reason": reason,
+        "features": features,
+    }
+
+
+def classify_pages(pages: List[PageImage], mode: str) -> List[Dict[str, Any]]:
+    """
+    Classify every page of a document (runs in the document worker pool).
+
+    At least one page is always kept, so a document the classifier cannot
+    make sense of is still sent to the model in full.
+
+    Args:
+        pages: Text and image pages of one document
+        mode: "conservative" or "aggressive"
+
+    Returns:
+        One verdict per page, in page order
+    """
+    verdicts = [classify_page(page, mode) for page in pages]
+    if verdicts and all(verdict["skip"] for verdict in verdicts):
+        for verdict in verdicts:
+            verdict["skip"] = False
+            verdict["reason"] = None
+    return verdicts
+
+
+class ClassifierStats:
+    """Pages skipped by the local classifier and the input tokens saved"""
+
+    def __init__(self):
+        self.documents = 0
+        self.pages_seen = 0
+        self.pages_skipped = 0
+        self.tokens_saved = 0
+        self.reasons: Dict[str, int] = {}
+
+    def record(self, pages_seen: int, skipped: List[Dict[str, Any]], tokens_saved: int):
+        """Record the verdicts for one document"""
+        self.documents += 1
+        self.pages_seen += pages_seen
+        self.pages_skipped += len(skipped)
+        self.tokens_saved += tokens_saved
+        for verdict in skipped:
+            self.reasons[verdict["reason"]] = self.reasons.get(verdict["reason"], 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "pages_seen": self.pages_seen,
+            "pages_skipped": self.pages_skipped,
+            "skip_rate": self.pages_skipped / self.pages_seen if self.pages_seen else 0.0,
+            "estimated_tokens_saved": self.tokens_saved,
+            "reasons": dict(self.reasons),
+        }
+
+
+classifier_stats = ClassifierStats()
@@ -0,0 +1,181 @@
+import hashlib
+import io
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.constants import PAGE_HASH_ALGORITHMS
+from app.models.domain import PageImage
+
+# ("image", perceptual hash) or ("text", digest of the normalized text layer)
+Fingerprint = Tuple[str, int]
+
+
+def _grayscale(page: PageImage, width: int, height: int) -> np.ndarray:
+    """Decode a page and downscale it to a small grayscale array"""
+    image = Image.open(io.BytesIO(page.data))
+    image.draft("L", (width * 8, height * 8))
+    image = image.convert("L").resize((width, height), Image.LANCZOS)
+    return np.asarray(image, dtype=np.float64)
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+
+def dhash(page: PageImage, hash_size: int = 32) -> int:
+    """
+    Difference hash: sign of the horizontal gradient of a downscaled page.
+
+    Args:
+        page: Encoded page image
+        hash_size: Hash is hash_size * hash_size bits
+
+    Returns:
+        Hash as an integer
+    """
+    pixels = _grayscale(page, hash_size + 1, hash_size)
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II matrix, so dct(x) = matrix @ x"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def phash(page: PageImage, hash_size: int = 32) -> int:
+    """
+    Perceptual hash: low-frequency DCT coefficients above their median.
+
+    Args:
+        page: Encoded page image
+        hash_size: Hash is hash_size * hash_size bits
+
+    Returns:
+        Hash as an integer
+    """
+    size = hash_size * 4
+    pixels = _grayscale(page, size, size)
+    matrix = _dct_matrix(size)
+    low_frequencies = (matrix @ pixels @ matrix.T)[:hash_size, :hash_size]
+    median = np.median(low_frequencies.flatten()[1:])
+    return _pack_bits(low_frequencies > median)
+
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+
+def max_hash_distance(algorithm: str, hash_size: int, max_distance: float = 0.0) -> int:
+    """
+    Largest Hamming distance between the image hashes of duplicate pages.
+
+    Args:
+        algorithm: "dhash" or "phash"
+        hash_size: Hash is hash_size * hash_size bits
+        max_distance: Share of the hash bits that may differ, 0 for the
+            algorithm's default
+
+    Returns:
+        Distance in bits
+    """
+    share = max_distance or PAGE_HASH_ALGORITHMS[algorithm]["max_distance"]
+    return int(share * hash_size * hash_size)
+
+
+def page_fingerprints(pages: List[PageImage], algorithm: str, hash_size: int) -> List[Fingerprint]:
+    """
+    Fingerprint every page of a document (runs in the document worker pool).
+
+    Image pages get a perceptual hash. Text-layer pages are fingerprinted by
+    their whitespace-normalized text, so only identical text matches.
+
+    Args:
+        pages: Text and image pages of one document
+        algorithm: "dhash" or "phash"
+        hash_size: Hash is hash_size * hash_size bits
+
+    Returns:
+        One fingerprint per page, in page order
+    """
+    hash_function = HASH_FUNCTIONS[algorithm]
+    fingerprints = []
+    for page in pages:
+        if page.text is not None:
+            normalized = " ".join(page.text.split())
+            digest = hashlib.sha256(normalized.encode("utf-8")).digest()
+            fingerprints.append(("text", int.from_bytes(digest[:8], "big")))
+        else:
+            fingerprints.append(("image", hash_function(page, hash_size)))
+    return fingerprints
+
+
+def find_duplicate_pages(
+    page_numbers: List[int],
+    fingerprints: List[Fingerprint],
+    max_distance: int
+) -> Dict[int, Tuple[int, int]]:
+    """
+    Match each page against the earlier pages that were kept.
+
+    Args:
+        page_numbers: Page numbers, in document order
+        fingerprints: Fingerprints from page_fingerprints
+        max_distance: Largest Hamming distance between image hashes that
+            still counts as the same page
+
+    Returns:
+        Mapping of duplicate page number to (kept page number, distance)
+    """
+    kept: List[Tuple[int, Fingerprint]] = []
+    duplicates = {}
+
+    for page_no, (kind, value) in zip(page_numbers, fingerprints):
+        match: Optional[Tuple[int, int]] = None
+        for kept_page_no, (kept_kind, kept_value) in kept:
+            if kind != kept_kind:
+                continue
+            distance = bin(value ^ kept_value).count("1")
+            if distance <= (max_distance if kind == "image" else 0):
+                if match is None or distance < match[1]:
+                    match = (kept_page_no, distance)
+
+        if match is None:
+            kept.append((page_no, (kind, value)))
+        else:
+            duplicates[page_no] = match
+
+    return duplicates
+
+
+class PageDedupStats:
+    """Pages collapsed as duplicates and the input tokens saved"""
+
+    def __init__(self):
+        self.documents = 0
+        self.pages_seen = 0
+        self.pages_collapsed = 0
+        self.tokens_saved = 0
+
+    def record(self, pages_seen: int, pages_collapsed: int, tokens_saved: int):
+        """Record the duplicates found in one document"""
+        self.documents += 1
+        self.pages_seen += pages_seen
+        self.pages_collapsed += pages_collapsed
+        self.tokens_saved += tokens_saved
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "pages_seen": self.pages_seen,
+            "pages_collapsed": self.pages_collapsed,
+            "collapse_rate": self.pages_collapsed / self.pages_seen if self.pages_seen else 0.0,
+            "estimated_tokens_saved": self.tokens_saved,
+        }
+
+
+page_dedup_stats = PageDedupStats()
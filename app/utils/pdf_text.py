@@ -0,0 +1,192 @@
+import os
+import re
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import logging
+
+from app.models.domain import PageImage
+
+
+logger = logging.getLogger(__name__)
+
+# pdftotext ends every page with a form feed
+PAGE_SEPARATOR = "\f"
+POPPLER_TIMEOUT_SECONDS = 60
+
+# Share of visible characters that must be ordinary text; broken font
+# encodings come out as replacement or control characters instead
+MIN_READABLE_RATIO = 0.9
+
+PAGE_SIZE_PATTERN = re.compile(r"^Page\s+(\d+)\s+size:\s+([\d.]+)\s+x\s+([\d.]+)\s+pts", re.MULTILINE)
+
+
+@contextmanager
+def _pdf_path(source: Union[bytes, str]) -> Iterator[str]:
+    """Path of the PDF, writing in-memory bytes to a temporary file for poppler"""
+    if isinstance(source, str):
+        yield source
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+        temp_file.write(source)
+    try:
+        yield temp_file.name
+    finally:
+        os.unlink(temp_file.name)
+
+
+def _run_poppler(args: List[str]) -> str:
+    completed = subprocess.run(
+        args,
+        capture_output=True,
+        timeout=POPPLER_TIMEOUT_SECONDS,
+        check=True
+    )
+    return completed.stdout.decode("utf-8", errors="replace")
+
+
+def extract_page_texts(source: Union[bytes, str], first_page: int, last_page: int) -> List[str]:
+    """
+    Extract the embedded text layer of a page range with pdftotext.
+
+    Layout mode keeps table columns aligned, which preserves the rows of
+    bill line items.
+
+    Args:
+        source: PDF file content as bytes, or path of a spooled file
+        first_page: First page (1-based, inclusive)
+        last_page: Last page (1-based, inclusive)
+
+    Returns:
+        One string per page (empty for pages without text)
+    """
+    with _pdf_path(source) as path:
+        output = _run_poppler([
+            "pdftotext", "-layout", "-enc", "UTF-8",
+            "-f", str(first_page), "-l", str(last_page),
+            path, "-"
+        ])
+
+    page_count = last_page - first_page + 1
+    texts = output.split(PAGE_SEPARATOR)[:page_count]
+    return texts + [""] * (page_count - len(texts))
+
+
+def pdf_page_sizes(source: Union[bytes, str], first_page: int, last_page: int) -> Dict[int, Tuple[float, float]]:
+    """
+    Read page sizes in points from the PDF metadata.
+
+    Returns:
+        Mapping of page number to (width, height) in points
+    """
+    with _pdf_path(source) as path:
+        output = _run_poppler(["pdfinfo", "-f", str(first_page), "-l", str(last_page), path])
+
+    return {
+        int(page_no): (float(width), float(height))
+        for page_no, width, height in PAGE_SIZE_PATTERN.findall(output)
+    }
+
+
+def has_usable_text(text: str, min_chars: int) -> bool:
+    """
+    Decide whether a page's text layer can replace its image.
+
+    Scanned pages have no text (or a few stray characters); pages with
+    broken font encodings produce unreadable characters. Bills always
+    carry amounts, so a page without digits is not trusted either.
+
+    Args:
+        text: Text extracted for the page
+        min_chars: Minimum number of visible characters
+
+    Returns:
+        True if the text should be sent instead of the image
+    """
+    visible = [char for char in text if not char.isspace()]
+    if len(visible) < min_chars:
+        return False
+
+    readable = sum(1 for char in visible if char.isprintable() and char != "�")
+    if readable / len(visible) < MIN_READABLE_RATIO:
+        return False
+
+    return any(char.isdigit() for char in visible)
+
+
+def rendered_size(
+    width_pts: float,
+    height_pts: float,
+    dpi: int,
+    profile: Optional[Dict[str, Any]] = None
+) -> Tuple[int, int]:
+    """Pixel size a page would have been rasterized and encoded at"""
+    width = max(1, round(width_pts / 72 * dpi))
+    height = max(1, round(height_pts / 72 * dpi))
+
+    max_dimension = (profile or {}).get("max_dimension")
+    if max_dimension and max(width, height) > max_dimension:
+        scale = max_dimension / max(width, height)
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+
+    return width, height
+
+
+def text_page(
+    page_no: int,
+    text: str,
+    size_pts: Optional[Tuple[float, float]],
+    dpi: int,
+    profile: Optional[Dict[str, Any]] = None
+) -> PageImage:
+    """
+    Build a page that carries its text layer instead of an image.
+
+    Width and height are the size the page would have been rendered at,
+    so the image tokens it avoided can still be estimated.
+    """
+    # Letter size when the metadata has no size for the page
+    width_pts, height_pts = size_pts or (612.0, 792.0)
+    width, height = rendered_size(width_pts, height_pts, dpi, profile)
+    return PageImage(
+        page_no=page_no,
+        data=b"",
+        mime_type="text/plain",
+        width=width,
+        height=height,
+        text=text.rstrip()
+    )
+
+
+class TextLayerStats:
+    """Pages sent as text versus images, and the image tokens avoided"""
+
+    def __init__(self):
+        self.documents = 0
+        self.text_pages = 0
+        self.image_pages = 0
+        self.text_tokens = 0
+        self.image_tokens_avoided = 0
+
+    def record(self, text_pages: int, image_pages: int, text_tokens: int, image_tokens_avoided: int):
+        """Record the page paths of one document"""
+        self.documents += 1
+        self.text_pages += text_pages
+        self.image_pages += image_pages
+        self.text_tokens += text_tokens
+        self.image_tokens_avoided += image_tokens_avoided
+
+    def as_dict(self) -> Dict[str, Any]:
+        pages = self.text_pages + self.image_pages
+        return {
+            "documents": self.documents,
+            "text_pages": self.text_pages,
+            "image_pages": self.image_pages,
+            "text_page_rate": self.text_pages / pages if pages else 0.0,
+            "estimated_tokens_saved": self.image_tokens_avoided - self.text_tokens,
+        }
+
+
+text_layer_stats = TextLayerStats()
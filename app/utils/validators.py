@@ -1,11 +1,18 @@
-from typing import List
-from difflib import SequenceMatcher
+from collections import defaultdict
+from typing import Any, Dict, List
 
 from app.models.schemas import PageData
+from app.utils.fuzzy_index import FuzzyNameIndex
 
-def remove_duplicates_across_pages(pages: List[PageData]) -> List[PageData]:
-    """Remove duplicate items using fuzzy matching"""
-    seen_items = []
+def remove_duplicates_across_pages(pages: List[PageData], threshold: float = 0.85) -> List[PageData]:
+    """
+    Remove duplicate items using fuzzy matching
+    
+    An item is a duplicate when its name is more than `threshold` similar
+    (difflib ratio) to an item kept earlier. Names are looked up through a
+    FuzzyNameIndex, so only plausible candidates are scored.
+    """
+    seen_items = FuzzyNameIndex(threshold)
     unique_pages = []
     
     for page in pages:
@@ -14,19 +21,184 @@ def remove_duplicates_across_pages(pages: List[PageData]) -> List[PageData]:
             # Normalize name for comparison
             normalized_name = item.item_name.strip().upper()
             
-            # Check against seen items (fuzzy match)
-            is_duplicate = False
-            for seen in seen_items:
-                similarity = SequenceMatcher(None, normalized_name, seen).ratio()
-                if similarity > 0.85:  # 85% similar = duplicate
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
+            if not seen_items.contains_similar(normalized_name):
                 unique_items.append(item)
-                seen_items.append(normalized_name)
+                seen_items.add(normalized_name)
         
         page.bill_items = unique_items
         unique_pages.append(page)
     
     return unique_pages
+
+
+def _page_sort_key(page: Dict[str, Any]):
+    page_no = str(page.get("page_no", ""))
+    return (0, int(page_no), "") if page_no.isdigit() else (1, 0, page_no)
+
+
+def merge_chunk_pages(chunks: List[List[Dict[str, Any]]], threshold: float = 0.85) -> List[Dict[str, Any]]:
+    """
+    Merge the raw `pages` arrays returned for consecutive page chunks.
+    
+    - A page returned by several overlapping chunks is kept once, using the
+      copy with the most line items
+    - An item is dropped as a cross-chunk duplicate when an earlier chunk
+      already produced an item with a similar name and the same amount;
+      duplicates inside one chunk are left to the model
+    
+    Args:
+        chunks: Raw page dicts per chunk, in chunk order
+        threshold: Name similarity above which items are considered the same
+        
+    Returns:
+        Merged page dicts sorted by page number
+    """
+    owner = {}
+    for chunk_index, pages in enumerate(chunks):
+        for page in pages:
+            page_no = str(page.get("page_no", ""))
+            current = owner.get(page_no)
+            if current is None or len(page.get("bill_items", [])) > len(current[1].get("bill_items", [])):
+                owner[page_no] = (chunk_index, page)
+    
+    merged_pages = []
+    earlier_items = defaultdict(lambda: FuzzyNameIndex(threshold))
+    chunk_items = []
+    current_chunk = 0
+    
+    for chunk_index, page in sorted(owner.values(), key=lambda entry: (entry[0], _page_sort_key(entry[1]))):
+        if chunk_index != current_chunk:
+            for seen_amount, seen_name in chunk_items:
+                earlier_items[seen_amount].add(seen_name)
+            chunk_items = []
+            current_chunk = chunk_index
+        
+        unique_items = []
+        for item in page.get("bill_items", []):
+            name = str(item.get("item_name", "")).strip().upper()
+            amount = item.get("item_amount")
+            
+            is_duplicate = amount in earlier_items and earlier_items[amount].contains_similar(name)
+            if not is_duplicate:
+                unique_items.append(item)
+                chunk_items.append((amount, name))
+        
+        merged_pages.append({**page, "bill_items": unique_items})
+    
+    return sorted(merged_pages, key=_page_sort_key)
+
+
+# Absolute slack for rate x quantity vs amount, for bills rounded to whole units
+ARITHMETIC_ROUNDING_SLACK = 0.5
+
+DETAIL_PAGE_TYPES = ("Bill Detail", "Pharmacy")
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def item_arithmetic_mismatch(item: Dict[str, Any], tolerance: float) -> bool:
+    """
+    Check whether an item's rate x quantity disagrees with its amount.
+    
+    Items without both a rate and a quantity cannot be checked and never
+    count as a mismatch.
+    
+    Args:
+        item: Raw (sanitized) item dict from the model
+        tolerance: Allowed relative difference
+    """
+    rate = _number(item.get("item_rate"))
+    quantity = _number(item.get("item_quantity"))
+    amount = _number(item.get("item_amount"))
+    if rate <= 0 or quantity <= 0:
+        return False
+    expected = rate * quantity
+    return abs(expected - amount) > max(ARITHMETIC_ROUNDING_SLACK, tolerance * max(expected, amount))
+
+
+def find_failed_pages(pages: List[Dict[str, Any]], tolerance: float, max_mismatch_ratio: float) -> Dict[str, str]:
+    """
+    Find pages whose extracted items look wrong.
+    
+    A page fails when it is a detail page without items, or when more than
+    max_mismatch_ratio of its checkable items fail the rate x quantity check.
+    
+    Args:
+        pages: Raw (sanitized) page dicts from the model
+        tolerance: Allowed relative difference for rate x quantity
+        max_mismatch_ratio: Share of mismatched items a page may have
+        
+    Returns:
+        Reason per failed page number
+    """
+    failed = {}
+    for page in pages:
+        page_no = str(page.get("page_no", ""))
+        items = page.get("bill_items") or []
+        if page.get("page_type") in DETAIL_PAGE_TYPES and not items:
+            failed[page_no] = "empty_detail_page"
+            continue
+        
+        checkable = [
+            item for item in items
+            if _number(item.get("item_rate")) > 0 and _number(item.get("item_quantity")) > 0
+        ]
+        mismatched = sum(1 for item in checkable if item_arithmetic_mismatch(item, tolerance))
+        if checkable and mismatched / len(checkable) > max_mismatch_ratio:
+            failed[page_no] = "arithmetic"
+    return failed
+
+
+def final_bill_total_mismatch(pages: List[Dict[str, Any]], tolerance: float) -> bool:
+    """
+    Check the detail item sum against the totals on Final Bill pages.
+    
+    The sum passes when it matches either the largest Final Bill amount
+    (the grand total) or the sum of all Final Bill amounts (category
+    sub-totals). Documents without a Final Bill page always pass.
+    
+    Args:
+        pages: Raw (sanitized) page dicts from the model
+        tolerance: Allowed relative difference
+    """
+    final_amounts = [
+        _number(item.get("item_amount"))
+        for page in pages if page.get("page_type") == "Final Bill"
+        for item in page.get("bill_items") or []
+    ]
+    final_amounts = [amount for amount in final_amounts if amount > 0]
+    if not final_amounts:
+        return False
+    
+    detail_sum = sum(
+        _number(item.get("item_amount"))
+        for page in pages if page.get("page_type") in DETAIL_PAGE_TYPES
+        for item in page.get("bill_items") or []
+    )
+    if detail_sum <= 0:
+        return False
+    return all(
+        abs(detail_sum - total) > max(ARITHMETIC_ROUNDING_SLACK, tolerance * total)
+        for total in (max(final_amounts), sum(final_amounts))
+    )
+
+
+def replace_pages(pages: List[Dict[str, Any]], replacements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Replace raw pages by page number, e.g. with a re-extraction of the same pages.
+    
+    Args:
+        pages: Raw page dicts
+        replacements: Raw page dicts that take precedence
+        
+    Returns:
+        Merged page dicts sorted by page number
+    """
+    by_page_no = {str(page.get("page_no", "")): page for page in pages}
+    by_page_no.update((str(page.get("page_no", "")), page) for page in replacements)
+    return sorted(by_page_no.values(), key=_page_sort_key)
@@ -0,0 +1,118 @@
+"""
+Benchmark: indexed vs quadratic duplicate detection across pages.
+
+Compares validators.remove_duplicates_across_pages (FuzzyNameIndex) with the
+original all-pairs SequenceMatcher scan on synthetic pharmacy-style bills,
+and checks both keep exactly the same items.
+
+Usage:
+    python -m benchmarks.bench_dedup
+    python -m benchmarks.bench_dedup --sizes 1000 10000 50000
+
+The quadratic scan takes about 20 seconds at 1000 items and grows with the
+square of the size, so by default it only runs for sizes up to
+--legacy-max. The indexed version still does a few numpy passes over the
+stored names per query: about 2 seconds at 10000 items, 25 at 50000.
+"""
+import argparse
+import random
+import time
+from difflib import SequenceMatcher
+from typing import List
+
+from app.models.schemas import BillItem, PageData
+from app.utils.validators import remove_duplicates_across_pages
+
+SYLLABLES = [
+    "PARA", "CETA", "MOL", "AMOXI", "CILLIN", "CLAV", "PANTO", "PRAZOLE", "ONDAN",
+    "SETRON", "METRO", "NIDAZOLE", "CEF", "TRIAX", "ONE", "DEXA", "METHA", "SONE",
+    "RANI", "TIDINE", "LEVO", "FLOXA", "CIN", "AZI", "THRO", "MYCIN", "INSU", "LIN",
+]
+FORMS = ["TAB", "CAP", "INJ", "SYP", "IV", "OINT"]
+STRENGTHS = ["5MG", "10MG", "250MG", "500MG", "1G", "2ML", "100ML", "40MG/ML"]
+
+
+def synthetic_pages(item_count: int, items_per_page: int = 40, seed: int = 7) -> List[PageData]:
+    """Pharmacy-like pages where roughly 15% of items are near-duplicates"""
+    rng = random.Random(seed)
+    names = []
+    for _ in range(item_count):
+        if names and rng.random() < 0.15:
+            name = list(rng.choice(names))
+            for _ in range(rng.randint(0, 2)):
+                position = rng.randrange(len(name))
+                name[position] = rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ ")
+            names.append("".join(name))
+        else:
+            drug = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+            batch = rng.randint(100, 99999)
+            names.append(f"{drug} {rng.choice(STRENGTHS)} {rng.choice(FORMS)} B{batch}")
+
+    pages = []
+    for start in range(0, item_count, items_per_page):
+        pages.append(PageData(
+            page_no=str(len(pages) + 1),
+            page_type="Pharmacy",
+            bill_items=[
+                BillItem(item_name=name, item_amount=rng.randint(1, 5000))
+                for name in names[start:start + items_per_page]
+            ]
+        ))
+    return pages
+
+
+def quadratic_remove_duplicates(pages: List[PageData]) -> List[PageData]:
+    """The original implementation: every name against every kept name"""
+    seen_items = []
+    for page in pages:
+        unique_items = []
+        for item in page.bill_items:
+            normalized_name = item.item_name.strip().upper()
+            is_duplicate = False
+            for seen in seen_items:
+                if SequenceMatcher(None, normalized_name, seen).ratio() > 0.85:
+                    is_duplicate = True
+                    break
+            if not is_duplicate:
+                unique_items.append(item)
+                seen_items.append(normalized_name)
+        page.bill_items = unique_items
+    return pages
+
+
+def kept_names(pages: List[PageData]) -> List[str]:
+    return [item.item_name for page in pages for item in page.bill_items]
+
+
+def timed(func, pages: List[PageData]):
+    start = time.perf_counter()
+    result = func(pages)
+    return time.perf_counter() - start, kept_names(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument(
+        "--legacy-max", type=int, default=1000,
+        help="Skip the quadratic implementation above this many items"
+    )
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'kept':>8} {'indexed_s':>10} {'quadratic_s':>12} {'speedup':>8}  identical")
+    for size in args.sizes:
+        indexed_seconds, indexed_kept = timed(remove_duplicates_across_pages, synthetic_pages(size))
+
+        if size <= args.legacy_max:
+            legacy_seconds, legacy_kept = timed(quadratic_remove_duplicates, synthetic_pages(size))
+            speedup = f"{legacy_seconds / indexed_seconds:7.1f}x"
+            identical = "yes" if legacy_kept == indexed_kept else "NO"
+            legacy_column = f"{legacy_seconds:12.3f}"
+        else:
+            speedup, identical, legacy_column = "-".rjust(8), "-", "skipped".rjust(12)
+
+        print(f"{size:>8} {len(indexed_kept):>8} {indexed_seconds:10.3f} {legacy_column} {speedup}  {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+"""
+Benchmark: end-to-end load test of the API without real Gemini quota.
+
+Starts two local stand-ins in a background thread — a static file server
+with synthetic bills (benchmarks.synthetic_bills) and a fake Gemini
+endpoint with configurable latency and 429 rate (benchmarks.fake_gemini) —
+points the app at them through GEMINI_BASE_URL, and drives
+POST /extract-bill-data at each concurrency level.
+
+The app runs either in-process (httpx ASGI transport, same event loop as
+the client) or under uvicorn in a child process (real HTTP). For every
+level the report has throughput, p50/p95/p99 latency, peak RSS of the
+server process tree, event-loop lag of the server loop, mean per-stage
+times from the app's timing block and the fake Gemini's token counts.
+Results are written as JSON so runs can be compared.
+
+Usage:
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --mode uvicorn --concurrency 1 8 32 --requests 64
+    python -m benchmarks.bench_load --formats png jpg --gemini-latency 3 --gemini-429-rate 0.05 \\
+        --set GEMINI_MAX_CONCURRENCY=16 --set WORKER_POOL_KIND=thread
+
+PDF bills need poppler (pdftoppm) on the PATH, like the app itself.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+from aiohttp import web
+
+from benchmarks.fake_gemini import FakeGeminiConfig, create_fake_gemini
+from benchmarks.synthetic_bills import SyntheticBill, build_corpus, create_file_server
+
+LOOP_SAMPLE_INTERVAL_SECONDS = 0.01
+RSS_SAMPLE_INTERVAL_SECONDS = 0.1
+MONITOR_PATH = "/__bench/monitor"
+
+# The benchmark measures the pipeline, not the result cache
+DEFAULT_APP_SETTINGS = {
+    "GEMINI_API_KEY": "benchmark",
+    "RESULT_CACHE_ENABLED": "false",
+    "COALESCING_ENABLED": "false",
+    "DOWNLOAD_CACHE_ENABLED": "false",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def distribution_ms(seconds: Sequence[float]) -> Dict[str, Optional[float]]:
+    def to_ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "mean": to_ms(sum(seconds) / len(seconds)) if seconds else None,
+        "p50": to_ms(percentile(seconds, 50)),
+        "p95": to_ms(percentile(seconds, 95)),
+        "p99": to_ms(percentile(seconds, 99)),
+        "max": to_ms(max(seconds)) if seconds else None,
+    }
+
+
+def _child_pids(pid: int) -> List[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as children_file:
+                children.extend(int(child) for child in children_file.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def process_tree_rss_bytes(pid: int) -> int:
+    """Resident memory of a process and all its descendants (Linux /proc)"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as statm:
+                total += int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            continue
+        pending.extend(_child_pids(current))
+    return total
+
+
+class LoopMonitor:
+    """
+    Samples event-loop lag and process-tree RSS on the loop it runs in.
+
+    Lag is how late a short sleep wakes up: time the loop spent running
+    something else instead of scheduling ready callbacks.
+    """
+
+    def __init__(self):
+        self.lags: List[float] = []
+        self.peak_rss = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._sample_lag()), asyncio.create_task(self._sample_rss())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def reset(self):
+        self.lags = []
+        self.peak_rss = process_tree_rss_bytes(os.getpid())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "loop_lag_ms": distribution_ms(self.lags),
+            "peak_rss_mb": round(self.peak_rss / 1024 / 1024, 1),
+        }
+
+    async def _sample_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LOOP_SAMPLE_INTERVAL_SECONDS
+            await asyncio.sleep(LOOP_SAMPLE_INTERVAL_SECONDS)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    async def _sample_rss(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, process_tree_rss_bytes(os.getpid()))
+            await asyncio.sleep(RSS_SAMPLE_INTERVAL_SECONDS)
+
+
+class StandIns:
+    """Bill file server and fake Gemini on ephemeral ports in a background thread"""
+
+    def __init__(self, bills: Sequence[SyntheticBill], gemini_config: FakeGeminiConfig):
+        self.bills = bills
+        self.gemini_config = gemini_config
+        self.bills_url = ""
+        self.gemini_url = ""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="bench-stand-ins", daemon=True)
+        self._runners: List[web.AppRunner] = []
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def gemini_stats(self) -> Dict[str, Any]:
+        return self._gemini_app["stats"].as_dict()
+
+    async def _serve(self, app: web.Application) -> str:
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self._runners.append(runner)
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    async def _start(self):
+        self.bills_url = await self._serve(create_file_server(self.bills))
+        self._gemini_app = create_fake_gemini(self.gemini_config)
+        self.gemini_url = await self._serve(self._gemini_app)
+
+    async def _stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _add_monitor_route(app, monitor: LoopMonitor):
+    """Expose the monitor on the app so the harness can read the server's loop"""
+    async def monitor_endpoint(reset: bool = False):
+        snapshot = monitor.snapshot()
+        if reset:
+            monitor.reset()
+        return snapshot
+
+    app.add_api_route(MONITOR_PATH, monitor_endpoint, methods=["GET"], include_in_schema=False)
+
+
+def _serve_under_uvicorn(port: int, environment: Dict[str, str]):
+    """Child process entry point: run the app under uvicorn with a loop monitor"""
+    os.environ.update(environment)
+
+    import uvicorn
+    from app.main import app
+
+    monitor = LoopMonitor()
+    _add_monitor_route(app, monitor)
+
+    async def serve():
+        monitor.start()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        try:
+            await server.serve()
+        finally:
+            await monitor.stop()
+
+    asyncio.run(serve())
+
+
+class InProcessTarget:
+    """The app on the benchmark's own event loop through the ASGI transport"""
+
+    description = "in-process (httpx ASGITransport, shared event loop)"
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        from app.main import app
+
+        self._lifespan = app.router.lifespan_context(app)
+        await self._lifespan.__aenter__()
+        self.monitor = LoopMonitor()
+        self.monitor.start()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None
+        )
+        return self.client
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+        await self.monitor.stop()
+        await self._lifespan.__aexit__(*exc_info)
+
+    async def reset_monitor(self):
+        self.monitor.reset()
+
+    async def read_monitor(self) -> Dict[str, Any]:
+        return self.monitor.snapshot()
+
+
+class UvicornTarget:
+    """The app under uvicorn in a child process, over real HTTP"""
+
+    description = "uvicorn child process (real HTTP)"
+
+    def __init__(self, environment: Dict[str, str]):
+        self.environment = environment
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        port = _free_port()
+        self.process = multiprocessing.get_context("spawn").Process(
+            target=_serve_under_uvicorn, args=(port, self.environment), name="bench-uvicorn"
+        )
+        self.process.start()
+        self.client = httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            timeout=None,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        )
+
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if (await self.client.get("/health")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline or not self.process.is_alive():
+                raise RuntimeError("uvicorn did not start")
+            await asyncio.sleep(0.2)
+        return self.client
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+        self.process.terminate()
+        self.process.join(timeout=30)
+
+    async def reset_monitor(self):
+        await self.client.get(MONITOR_PATH, params={"reset": "true"})
+
+    async def read_monitor(self) -> Dict[str, Any]:
+        return (await self.client.get(MONITOR_PATH)).json()
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    urls: List[str],
+    concurrency: int,
+    request_count: int,
+    batch_size: int
+) -> Dict[str, Any]:
+    """Send request_count requests with concurrency clients in a closed loop"""
+    latencies: List[float] = []
+    failures: Dict[str, int] = {}
+    stage_totals: Dict[str, float] = {}
+    totals = {"documents": 0, "pages": 0, "bytes": 0, "input_tokens": 0, "output_tokens": 0}
+    next_request = 0
+
+    def build_body(index: int) -> Dict[str, Any]:
+        start = index * batch_size
+        chosen = [urls[(start + offset) % len(urls)] for offset in range(batch_size)]
+        return {"documents": chosen} if batch_size > 1 else {"document": chosen[0]}
+
+    async def client_loop():
+        nonlocal next_request
+        while next_request < request_count:
+            index = next_request
+            next_request += 1
+
+            started = time.perf_counter()
+            try:
+                response = await client.post("/extract-bill-data", params={"timings": "true"}, json=build_body(index))
+                body = response.json()
+            except Exception as error:
+                failures[type(error).__name__] = failures.get(type(error).__name__, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+            if response.status_code != 200 or not body.get("is_success", False):
+                reason = f"HTTP {response.status_code}" if response.status_code != 200 else "is_success=false"
+                failures[reason] = failures.get(reason, 0) + 1
+
+            timings = body.get("timings") or {}
+            for stage, milliseconds in timings.get("stages_ms", {}).items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + milliseconds
+            for key in totals:
+                totals[key] += timings.get(key, 0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client_loop() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    completed = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": request_count,
+        "completed": completed,
+        "failures": failures,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 3) if elapsed else None,
+        "documents_per_s": round(totals["documents"] / elapsed, 3) if elapsed else None,
+        "pages_per_s": round(totals["pages"] / elapsed, 3) if elapsed else None,
+        "latency_ms": distribution_ms(latencies),
+        "stages_ms_mean_per_request": {
+            stage: round(total / completed, 2) for stage, total in sorted(stage_totals.items())
+        } if completed else {},
+        "totals": totals,
+    }
+
+
+def _diff_stats(after: Dict[str, Any], before: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: after[key] - before.get(key, 0) if key != "peak_in_flight" else after[key]
+        for key in after
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    bills = build_corpus(args.formats, args.pages, args.dpi)
+    print(f"Corpus: {len(bills)} bills ({sum(len(bill.data) for bill in bills) / 1024 / 1024:.1f} MiB)")
+
+    stand_ins = StandIns(bills, FakeGeminiConfig(
+        latency_seconds=args.gemini_latency,
+        latency_per_page_seconds=args.gemini_latency_per_page,
+        jitter_seconds=args.gemini_jitter,
+        rate_limit_ratio=args.gemini_429_rate,
+        items_per_page=args.gemini_items_per_page,
+        cut_off_ratio=args.gemini_cut_off_rate,
+        min_cache_tokens=args.gemini_min_cache_tokens,
+        seed=args.seed,
+    ))
+    stand_ins.start()
+
+    environment = dict(DEFAULT_APP_SETTINGS)
+    environment["GEMINI_BASE_URL"] = stand_ins.gemini_url
+    for assignment in args.set:
+        key, _, value = assignment.partition("=")
+        environment[key] = value
+    # Settings are read at import, so the in-process app must see them first
+    os.environ.update(environment)
+
+    urls = [f"{stand_ins.bills_url}/bills/{bill.name}" for bill in bills]
+    target = InProcessTarget() if args.mode == "inprocess" else UvicornTarget(environment)
+    levels = []
+    try:
+        async with target as client:
+            if args.warmup:
+                await run_level(client, urls, min(args.warmup, max(args.concurrency)), args.warmup, args.batch_size)
+
+            for concurrency in args.concurrency:
+                gemini_before = stand_ins.gemini_stats()
+                await target.reset_monitor()
+
+                level = await run_level(client, urls, concurrency, args.requests, args.batch_size)
+                level.update(await target.read_monitor())
+                level["gemini"] = _diff_stats(stand_ins.gemini_stats(), gemini_before)
+                levels.append(level)
+
+                latency = level["latency_ms"]
+                print(
+                    f"concurrency={concurrency:<4} {level['throughput_rps']:>8} req/s  "
+                    f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms  "
+                    f"lag p99={level['loop_lag_ms']['p99']}ms  rss={level['peak_rss_mb']}MiB  "
+                    f"failures={sum(level['failures'].values())}"
+                )
+    finally:
+        stand_ins.stop()
+
+    return {
+        "benchmark": "load",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "target": target.description,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            key: value for key, value in vars(args).items() if key != "output"
+        },
+        "app_settings": {key: value for key, value in environment.items() if key != "GEMINI_API_KEY"},
+        "corpus": [bill.describe() for bill in bills],
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=2, help="Warm-up requests before the first level")
+    parser.add_argument("--batch-size", type=int, default=1, help="Documents per request (batch mode above 1)")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "png", "jpg"], choices=["pdf", "png", "jpg"])
+    parser.add_argument("--pages", nargs="+", type=int, default=[1, 5, 20], help="PDF page counts")
+    parser.add_argument("--dpi", nargs="+", type=int, default=[150, 300], help="Bill rendering DPIs")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="Fake Gemini base latency (s)")
+    parser.add_argument("--gemini-latency-per-page", type=float, default=0.1, help="Extra latency per page (s)")
+    parser.add_argument("--gemini-jitter", type=float, default=0.2, help="Uniform +/- latency jitter (s)")
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0, help="Share of calls answered with 429")
+    parser.add_argument("--gemini-items-per-page", type=int, default=12)
+    parser.add_argument("--gemini-cut-off-rate", type=float, default=0.0,
+                        help="Share of streamed responses cut off halfway (with --set GEMINI_STREAMING=true)")
+    parser.add_argument("--gemini-min-cache-tokens", type=int, default=1024,
+                        help="Smallest prompt prefix the fake accepts as cached content "
+                             "(with --set PROMPT_CACHE_ENABLED=true)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="App setting for the run (environment variable), repeatable")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args))
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Micro-benchmarks for the CPU-bound document stages, with a stored baseline.
+
+Cases:
+    process_document   PDF at several DPIs and page counts, PNG, JPEG and
+                       RGBA PNG (RGBA-to-RGB conversion) inputs
+    gemini_response    json parsing alone and with sanitize_response
+    prompt             build_full_doc_prompt for short and long documents
+    validation         PageData / BillItem validation of model output
+    dedup              remove_duplicates_across_pages
+
+Every case reports the median and minimum wall time over repeated runs and
+the peak Python allocation of one extra run under tracemalloc. The worker
+pool runs as threads here so its allocations are traced (poppler runs in
+its own process either way); use --worker-pool process to time the
+production configuration.
+
+Results are compared with the baseline file when it exists; the command
+exits with status 1 when a case got slower or allocates more than the
+thresholds allow.
+
+Usage:
+    python -m benchmarks.bench_micro                    # run and compare
+    python -m benchmarks.bench_micro --save-baseline    # record a new baseline
+    python -m benchmarks.bench_micro --filter dedup --threshold 0.1
+
+PDF cases need poppler (pdftoppm) on the PATH and are skipped without it.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+BASELINE_PATH = os.path.join("benchmarks", "baselines", "micro.json")
+
+# Allocation changes smaller than this are noise, whatever the ratio
+MIN_ALLOCATION_DELTA_BYTES = 64 * 1024
+
+
+@dataclass
+class Case:
+    name: str
+    group: str
+    run: Callable[[], Any]
+
+
+def _document(data: bytes, content_type: str):
+    from app.models.domain import SpooledDocument
+
+    return SpooledDocument(
+        content_type=content_type,
+        size=len(data),
+        sha256=hashlib.sha256(data).hexdigest(),
+        content=data,
+    )
+
+
+def _rgba_png(dpi: int) -> bytes:
+    import random
+
+    from benchmarks.synthetic_bills import render_bill_page
+
+    image = render_bill_page(1, 1, dpi, random.Random(0)).convert("RGBA")
+    image.putalpha(230)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _gemini_response(pages: int, items_per_page: int) -> str:
+    """Model output with a share of null rates and quantities, as Gemini returns them"""
+    return json.dumps({"pages": [
+        {
+            "page_no": str(page_no),
+            "page_type": "Pharmacy" if page_no % 3 == 0 else "Bill Detail",
+            "bill_items": [
+                {
+                    "item_name": f"ITEM {page_no}-{index} PARACETAMOL 500MG TAB",
+                    "item_amount": round(10 + index * 3.5, 2) if index % 7 else None,
+                    "item_rate": None if index % 4 == 0 else 3.5,
+                    "item_quantity": None if index % 5 == 0 else index % 9 + 1,
+                }
+                for index in range(items_per_page)
+            ],
+        }
+        for page_no in range(1, pages + 1)
+    ]})
+
+
+def build_cases(args: argparse.Namespace, loop: asyncio.AbstractEventLoop) -> List[Case]:
+    from app.core.config import get_settings
+    from app.services.document_service import DocumentService
+    from app.services.extraction_service import parse_extracted_pages
+    from app.services.gemini_service import GeminiService
+    from app.utils.validators import remove_duplicates_across_pages
+    from benchmarks.bench_dedup import synthetic_pages
+    from benchmarks.synthetic_bills import build_bill
+
+    settings = get_settings()
+    document_service = DocumentService()
+    gemini_service = GeminiService()
+    cases = []
+
+    def process_document_case(name: str, data: bytes, content_type: str, dpi: int) -> Case:
+        def run():
+            settings.PDF_DPI = dpi
+            return loop.run_until_complete(document_service.process_document(_document(data, content_type)))
+        return Case(name, "process_document", run)
+
+    if shutil.which("pdftoppm"):
+        for dpi in args.pdf_dpi:
+            for pages in args.pdf_pages:
+                bill = build_bill("pdf", pages, dpi)
+                cases.append(process_document_case(
+                    f"process_document/pdf-{pages}p-{dpi}dpi", bill.data, bill.content_type, dpi
+                ))
+    else:
+        print("pdftoppm not found: skipping PDF process_document cases", file=sys.stderr)
+
+    for file_format in ["png", "jpg"]:
+        bill = build_bill(file_format, 1, 200)
+        cases.append(process_document_case(
+            f"process_document/{file_format}-200dpi", bill.data, bill.content_type, settings.PDF_DPI
+        ))
+    cases.append(process_document_case(
+        "process_document/rgba-png-200dpi", _rgba_png(200), "image/png", settings.PDF_DPI
+    ))
+
+    for pages in [10, 100]:
+        response_text = _gemini_response(pages, 30)
+        cases.append(Case(f"gemini_response/json-{pages}p", "gemini_response",
+                          lambda text=response_text: json.loads(text)))
+        cases.append(Case(f"gemini_response/json+sanitize-{pages}p", "gemini_response",
+                          lambda text=response_text: gemini_service.sanitize_response(json.loads(text))))
+
+    for pages in [1, 10, 200]:
+        page_numbers = list(range(1, pages + 1))
+        cases.append(Case(f"prompt/full-doc-{pages}p", "prompt",
+                          lambda pages=pages, numbers=page_numbers:
+                          gemini_service.build_full_doc_prompt(pages, numbers)))
+
+    for pages in [10, 100]:
+        raw_pages = json.loads(_gemini_response(pages, 30))["pages"]
+        gemini_service.sanitize_response({"pages": raw_pages})
+        cases.append(Case(f"validation/page-data-{pages}p", "validation",
+                          lambda raw=raw_pages: parse_extracted_pages(raw)))
+
+    for items in args.dedup_items:
+        dedup_pages = synthetic_pages(items)
+        cases.append(Case(f"dedup/remove-duplicates-{items}", "dedup",
+                          lambda pages=dedup_pages:
+                          remove_duplicates_across_pages([page.model_copy() for page in pages])))
+
+    if args.filter:
+        cases = [case for case in cases if any(pattern in case.name for pattern in args.filter)]
+    return cases
+
+
+def measure(case: Case, min_repeats: int, max_repeats: int, min_seconds: float) -> Dict[str, Any]:
+    """Time repeated runs (after one warm-up), then trace one run's peak allocation"""
+    case.run()
+
+    times = []
+    while len(times) < max_repeats and (len(times) < min_repeats or sum(times) < min_seconds):
+        started = time.perf_counter()
+        case.run()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        case.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "group": case.group,
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "repeats": len(times),
+        "peak_alloc_kb": round((peak - baseline) / 1024, 1),
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float, memory_threshold: float) -> List[str]:
+    """Print the comparison and return the names of regressed cases"""
+    regressions = []
+    print(f"\n{'case':<44} {'median ms':>11} {'baseline':>11} {'change':>8} {'peak KiB':>10} {'baseline':>10}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<44} {result['median_ms']:>11.3f} {'-':>11} {'new':>8} {result['peak_alloc_kb']:>10.1f}")
+            continue
+
+        time_ratio = result["median_ms"] / previous["median_ms"] if previous["median_ms"] else 1.0
+        memory_delta = (result["peak_alloc_kb"] - previous["peak_alloc_kb"]) * 1024
+        memory_ratio = result["peak_alloc_kb"] / previous["peak_alloc_kb"] if previous["peak_alloc_kb"] else 1.0
+
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append("SLOWER")
+        if memory_ratio > 1 + memory_threshold and memory_delta > MIN_ALLOCATION_DELTA_BYTES:
+            flags.append("MORE MEMORY")
+        if flags:
+            regressions.append(name)
+
+        print(
+            f"{name:<44} {result['median_ms']:>11.3f} {previous['median_ms']:>11.3f} "
+            f"{(time_ratio - 1) * 100:>+7.1f}% {result['peak_alloc_kb']:>10.1f} "
+            f"{previous['peak_alloc_kb']:>10.1f}  {' '.join(flags)}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", nargs="+", help="Only run cases whose name contains one of these")
+    parser.add_argument("--pdf-pages", nargs="+", type=int, default=[1, 10, 50, 200])
+    parser.add_argument("--pdf-dpi", nargs="+", type=int, default=[100, 150, 200])
+    parser.add_argument("--dedup-items", nargs="+", type=int, default=[200, 1000])
+    parser.add_argument("--min-repeats", type=int, default=3)
+    parser.add_argument("--max-repeats", type=int, default=50)
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum timed seconds per case")
+    parser.add_argument("--worker-pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown (0.2 = 20%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.2, help="Allowed peak allocation growth")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Settings are read at import time
+    os.environ["WORKER_POOL_KIND"] = args.worker_pool
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    loop = asyncio.new_event_loop()
+    try:
+        cases = build_cases(args, loop)
+        results = {}
+        for case in cases:
+            results[case.name] = measure(case, args.min_repeats, args.max_repeats, args.min_seconds)
+            result = results[case.name]
+            print(f"{case.name:<44} {result['median_ms']:>11.3f} ms  {result['peak_alloc_kb']:>10.1f} KiB  "
+                  f"({result['repeats']} runs)")
+    finally:
+        from app.services.worker_pool import shutdown_worker_pool
+        shutdown_worker_pool()
+        loop.close()
+
+    report = {
+        "benchmark": "micro",
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "worker_pool": args.worker_pool,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; record one with --save-baseline")
+        return
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("environment") != report["environment"]:
+        print("\nWarning: baseline was recorded in a different environment:", baseline.get("environment"))
+
+    regressions = compare(results, baseline.get("results", {}), args.threshold, args.memory_threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Local stand-in for the Gemini generateContent endpoint.
+
+Answers POST .../models/<model>:generateContent with a valid extraction
+response (line items for every "Page N:" label in the request) after a
+configurable latency, rejects a configurable share of calls with 429
+RESOURCE_EXHAUSTED, and accounts tokens the way the real API bills them
+(258 per 768x768 image tile, ~4 characters per text token).
+
+:streamGenerateContent?alt=sse sends the same text as Server-Sent Events
+spread over the latency; a configurable share of streams is cut off
+halfway by closing the connection.
+
+cachedContents create/update/delete keep cached prompt prefixes in memory;
+prefixes below a configurable token minimum are rejected with 400 like
+the real API. generateContent requests that reference cached content are
+billed its tokens as cachedContentTokenCount, and unknown or expired
+handles are answered with 403 "CachedContent not found".
+
+Point the app at it with GEMINI_BASE_URL=http://127.0.0.1:<port>.
+
+Usage:
+    python -m benchmarks.fake_gemini --port 8090 --latency 2.0 --rate-limit 0.05
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from aiohttp import web
+from PIL import Image
+
+IMAGE_TILE_SIZE = 768
+TOKENS_PER_IMAGE_TILE = 258
+CHARS_PER_TEXT_TOKEN = 4
+
+PAGE_LABEL = re.compile(r"^Page (\d+):$")
+
+
+@dataclass
+class FakeGeminiConfig:
+    latency_seconds: float = 1.0
+    latency_per_page_seconds: float = 0.1
+    jitter_seconds: float = 0.2
+    rate_limit_ratio: float = 0.0
+    items_per_page: int = 12
+    stream_chunks: int = 8
+    cut_off_ratio: float = 0.0
+    min_cache_tokens: int = 1024
+    seed: int = 0
+
+
+@dataclass
+class FakeGeminiStats:
+    requests: int = 0
+    rate_limited: int = 0
+    cut_off: int = 0
+    caches_created: int = 0
+    caches_rejected: int = 0
+    cached_requests: int = 0
+    cache_misses: int = 0
+    cached_tokens: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "cut_off": self.cut_off,
+            "caches_created": self.caches_created,
+            "caches_rejected": self.caches_rejected,
+            "cached_requests": self.cached_requests,
+            "cache_misses": self.cache_misses,
+            "cached_tokens": self.cached_tokens,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+def _image_tokens(part: Dict[str, Any]) -> int:
+    inline = part.get("inlineData") or part.get("inline_data") or {}
+    try:
+        data = base64.b64decode(inline.get("data", ""))
+        width, height = Image.open(io.BytesIO(data)).size
+    except Exception:
+        return TOKENS_PER_IMAGE_TILE
+    return math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE) * TOKENS_PER_IMAGE_TILE
+
+
+def count_request(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Page numbers and billed input tokens of a generateContent request"""
+    page_numbers = []
+    input_tokens = 0
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                text = part["text"]
+                input_tokens += max(1, len(text) // CHARS_PER_TEXT_TOKEN)
+                match = PAGE_LABEL.match(text.strip())
+                if match:
+                    page_numbers.append(match.group(1))
+            elif "inlineData" in part or "inline_data" in part:
+                input_tokens += _image_tokens(part)
+    return {"page_numbers": page_numbers, "input_tokens": input_tokens}
+
+
+def _ttl_seconds(ttl: str) -> float:
+    return float(ttl.rstrip("s")) if ttl else 3600.0
+
+
+def _error(code: int, status: str, message: str) -> web.Response:
+    return web.json_response({"error": {"code": code, "message": message, "status": status}}, status=code)
+
+
+def fake_extraction(page_numbers: List[str], items_per_page: int, rng: random.Random) -> Dict[str, Any]:
+    """Extraction JSON in the shape the app's prompt asks for"""
+    pages = []
+    for page_no in page_numbers or ["1"]:
+        items = []
+        for index in range(items_per_page):
+            quantity = rng.randint(1, 5)
+            rate = round(rng.uniform(10, 2500), 2)
+            items.append({
+                "item_name": f"Synthetic item {page_no}-{index}",
+                "item_amount": round(quantity * rate, 2),
+                "item_rate": rate,
+                "item_quantity": quantity,
+            })
+        pages.append({"page_no": page_no, "page_type": "Bill Detail", "bill_items": items})
+    return {"pages": pages}
+
+
+def create_fake_gemini(config: FakeGeminiConfig) -> web.Application:
+    """aiohttp app implementing generateContent; stats are at GET /stats"""
+    rng = random.Random(config.seed)
+    stats = FakeGeminiStats()
+    caches: Dict[str, Dict[str, Any]] = {}  # name -> tokens, expires_at
+
+    def cached_content(name: str) -> Dict[str, Any]:
+        return {"name": name, "expireTime": time.strftime(
+            "%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + caches[name]["expires_at"] - time.monotonic())
+        )}
+
+    async def create_cache(request: web.Request) -> web.Response:
+        body = await request.json()
+        tokens = count_request(body)["input_tokens"]
+        if tokens < config.min_cache_tokens:
+            stats.caches_rejected += 1
+            return _error(400, "INVALID_ARGUMENT", (
+                f"Cached content is too small. total_token_count={tokens}, "
+                f"min_total_token_count={config.min_cache_tokens}"
+            ))
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        caches[name] = {"tokens": tokens, "expires_at": time.monotonic() + _ttl_seconds(body.get("ttl", ""))}
+        stats.caches_created += 1
+        return web.json_response({**cached_content(name), "usageMetadata": {"totalTokenCount": tokens}})
+
+    async def update_cache(request: web.Request) -> web.Response:
+        name = f"cachedContents/{request.match_info['name']}"
+        if name not in caches or caches[name]["expires_at"] < time.monotonic():
+            return _error(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied)")
+        body = await request.json()
+        caches[name]["expires_at"] = time.monotonic() + _ttl_seconds(body.get("ttl", ""))
+        return web.json_response(cached_content(name))
+
+    async def delete_cache(request: web.Request) -> web.Response:
+        caches.pop(f"cachedContents/{request.match_info['name']}", None)
+        return web.json_response({})
+
+    async def stream_content(request: web.Request, text: str, latency: float,
+                             usage: Dict[str, int]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunk_count = max(1, config.stream_chunks)
+        chunk_size = math.ceil(len(text) / chunk_count)
+        cut_off = rng.random() < config.cut_off_ratio
+        for index in range(chunk_count):
+            await asyncio.sleep(latency / chunk_count)
+            if cut_off and index == chunk_count // 2:
+                stats.cut_off += 1
+                request.transport.close()
+                return response
+            last = index == chunk_count - 1
+            piece = text[index * chunk_size:(index + 1) * chunk_size]
+            candidate = {"content": {"role": "model", "parts": [{"text": piece}]}}
+            if last:
+                candidate["finishReason"] = "STOP"
+            event = {"candidates": [candidate]}
+            if last:
+                event["usageMetadata"] = usage
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def generate_content(request: web.Request) -> web.StreamResponse:
+        tail = request.match_info["tail"]
+        streaming = tail.endswith(":streamGenerateContent")
+        if not streaming and not tail.endswith(":generateContent"):
+            raise web.HTTPNotFound()
+
+        body = await request.json()
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        try:
+            if rng.random() < config.rate_limit_ratio:
+                stats.rate_limited += 1
+                await asyncio.sleep(0.01)
+                return web.json_response(
+                    {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}},
+                    status=429,
+                    headers={"Retry-After": "1"}
+                )
+
+            counted = await asyncio.to_thread(count_request, body)
+            cached_tokens = 0
+            if body.get("cachedContent"):
+                name = body["cachedContent"]
+                cache = caches.get(name)
+                if cache is None or cache["expires_at"] < time.monotonic():
+                    stats.cache_misses += 1
+                    return _error(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied)")
+                cached_tokens = cache["tokens"]
+                counted["input_tokens"] += cached_tokens
+                stats.cached_requests += 1
+                stats.cached_tokens += cached_tokens
+            latency = max(0.0, config.latency_seconds
+                          + config.latency_per_page_seconds * len(counted["page_numbers"])
+                          + rng.uniform(-config.jitter_seconds, config.jitter_seconds))
+
+            text = json.dumps(fake_extraction(counted["page_numbers"], config.items_per_page, rng))
+            output_tokens = max(1, len(text) // CHARS_PER_TEXT_TOKEN)
+            stats.input_tokens += counted["input_tokens"]
+            stats.output_tokens += output_tokens
+            usage = {
+                "promptTokenCount": counted["input_tokens"],
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": counted["input_tokens"] + output_tokens,
+            }
+            if cached_tokens:
+                usage["cachedContentTokenCount"] = cached_tokens
+
+            if streaming:
+                return await stream_content(request, text, latency, usage)
+
+            await asyncio.sleep(latency)
+            return web.json_response({
+                "candidates": [{
+                    "content": {"role": "model", "parts": [{"text": text}]},
+                    "finishReason": "STOP",
+                }],
+                "usageMetadata": usage,
+            })
+        finally:
+            stats.in_flight -= 1
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats.as_dict())
+
+    app = web.Application(client_max_size=256 * 1024 * 1024)
+    app["stats"] = stats
+    app.router.add_get("/stats", get_stats)
+    app.router.add_post("/{version}/cachedContents", create_cache)
+    app.router.add_patch("/{version}/cachedContents/{name}", update_cache)
+    app.router.add_delete("/{version}/cachedContents/{name}", delete_cache)
+    app.router.add_post("/{tail:.*}", generate_content)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=1.0, help="Base latency per call (seconds)")
+    parser.add_argument("--latency-per-page", type=float, default=0.1, help="Extra latency per page (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +/- jitter (seconds)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Share of calls answered with 429")
+    parser.add_argument("--items-per-page", type=int, default=12)
+    parser.add_argument("--stream-chunks", type=int, default=8, help="SSE events per streamed response")
+    parser.add_argument("--cut-off", type=float, default=0.0, help="Share of streams cut off halfway")
+    parser.add_argument("--min-cache-tokens", type=int, default=1024,
+                        help="Smallest cachedContents prefix accepted (tokens)")
+    args = parser.parse_args()
+
+    config = FakeGeminiConfig(
+        latency_seconds=args.latency,
+        latency_per_page_seconds=args.latency_per_page,
+        jitter_seconds=args.jitter,
+        rate_limit_ratio=args.rate_limit,
+        items_per_page=args.items_per_page,
+        stream_chunks=args.stream_chunks,
+        cut_off_ratio=args.cut_off,
+        min_cache_tokens=args.min_cache_tokens,
+    )
+    web.run_app(create_fake_gemini(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
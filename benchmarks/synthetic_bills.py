@@ -0,0 +1,175 @@
+"""
+Synthetic medical bills and a local static file server for load tests.
+
+Bills are drawn with Pillow: a hospital header, a ruled line-item table
+and a totals block per page. PDFs are image-only (like scanned bills) and
+embed the pages at the requested DPI; PNG and JPEG bills are single pages.
+
+Usage:
+    python -m benchmarks.synthetic_bills --out /tmp/bills --pages 1 5 20 --dpi 150 300
+"""
+import argparse
+import io
+import os
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+from aiohttp import web
+from PIL import Image, ImageDraw, ImageFont
+
+# A4 in inches
+PAGE_WIDTH_INCHES = 8.27
+PAGE_HEIGHT_INCHES = 11.69
+
+ITEM_NAMES = [
+    "Room Rent - General Ward", "Consultation Charges", "CBC Test", "Lipid Profile",
+    "Paracetamol 500mg Tab", "Amoxicillin 250mg Cap", "Ondansetron Inj 2ml", "IV Set",
+    "Syringe 5ml", "Normal Saline 500ml", "X-Ray Chest PA", "ECG", "Nursing Charges",
+    "Pantoprazole 40mg Inj", "Ceftriaxone 1g Inj", "Surgical Gloves", "Dressing Charges",
+]
+
+CONTENT_TYPES = {"pdf": "application/pdf", "png": "image/png", "jpg": "image/jpeg"}
+
+
+@dataclass
+class SyntheticBill:
+    """One generated bill document"""
+    name: str
+    content_type: str
+    data: bytes
+    pages: int
+    dpi: int
+    file_format: str
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "format": self.file_format,
+            "pages": self.pages,
+            "dpi": self.dpi,
+            "bytes": len(self.data),
+        }
+
+
+def render_bill_page(page_no: int, total_pages: int, dpi: int, rng: random.Random) -> Image.Image:
+    """Draw one bill page at the given DPI"""
+    width = round(PAGE_WIDTH_INCHES * dpi)
+    height = round(PAGE_HEIGHT_INCHES * dpi)
+    scale = dpi / 100
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=max(8, round(11 * scale)))
+    title_font = ImageFont.load_default(size=max(10, round(18 * scale)))
+
+    margin = round(50 * scale)
+    row_height = round(22 * scale)
+    draw.text((margin, margin), "CITY GENERAL HOSPITAL - IN-PATIENT BILL", fill="black", font=title_font)
+    draw.text((margin, margin + round(30 * scale)), f"Bill No: SYN-{rng.randint(10000, 99999)}    "
+              f"Page {page_no} of {total_pages}", fill="black", font=font)
+
+    columns = [margin, round(width * 0.55), round(width * 0.68), round(width * 0.82)]
+    top = margin + round(80 * scale)
+    draw.rectangle((margin - 5, top - 5, width - margin, top + row_height - 5), outline="black")
+    for x, header in zip(columns, ["Description", "Qty", "Rate", "Amount"]):
+        draw.text((x, top), header, fill="black", font=font)
+
+    y = top + row_height
+    bottom = height - margin - 4 * row_height
+    total = 0.0
+    while y + row_height < bottom:
+        quantity = rng.randint(1, 5)
+        rate = round(rng.uniform(10, 2500), 2)
+        amount = round(quantity * rate, 2)
+        total += amount
+        for x, value in zip(columns, [rng.choice(ITEM_NAMES), str(quantity), f"{rate:.2f}", f"{amount:.2f}"]):
+            draw.text((x, y), value, fill="black", font=font)
+        draw.line((margin - 5, y + row_height - 4, width - margin, y + row_height - 4), fill="black")
+        y += row_height
+
+    for x in columns[1:]:
+        draw.line((x - 8, top - 5, x - 8, y), fill="black")
+    draw.text((columns[2], y + row_height), f"Page Total: {total:.2f}", fill="black", font=font)
+    return image
+
+
+def build_bill(file_format: str, pages: int, dpi: int, seed: int = 0) -> SyntheticBill:
+    """
+    Generate one bill.
+
+    Args:
+        file_format: "pdf", "png" or "jpg" (images are always one page)
+        pages: Page count for PDFs
+        dpi: Rendering resolution of the pages
+        seed: Seed for the line items
+
+    Returns:
+        SyntheticBill with the encoded file
+    """
+    rng = random.Random(f"{file_format}-{pages}-{dpi}-{seed}")
+    if file_format != "pdf":
+        pages = 1
+    images = [render_bill_page(page_no, pages, dpi, rng) for page_no in range(1, pages + 1)]
+
+    buffer = io.BytesIO()
+    if file_format == "pdf":
+        images[0].save(buffer, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    elif file_format == "png":
+        images[0].save(buffer, "PNG", optimize=True)
+    else:
+        images[0].save(buffer, "JPEG", quality=85)
+
+    return SyntheticBill(
+        name=f"bill-{pages}p-{dpi}dpi-{seed}.{file_format}",
+        content_type=CONTENT_TYPES[file_format],
+        data=buffer.getvalue(),
+        pages=pages,
+        dpi=dpi,
+        file_format=file_format,
+    )
+
+
+def build_corpus(formats: Sequence[str], page_counts: Sequence[int], dpis: Sequence[int]) -> List[SyntheticBill]:
+    """One bill per (format, page count, DPI); images ignore the page count"""
+    bills = {}
+    for file_format in formats:
+        for pages in page_counts if file_format == "pdf" else [1]:
+            for dpi in dpis:
+                bill = build_bill(file_format, pages, dpi)
+                bills[bill.name] = bill
+    return list(bills.values())
+
+
+def create_file_server(bills: Sequence[SyntheticBill]) -> web.Application:
+    """aiohttp app serving each bill at /bills/<name>"""
+    by_name = {bill.name: bill for bill in bills}
+
+    async def serve_bill(request: web.Request) -> web.Response:
+        bill = by_name.get(request.match_info["name"])
+        if bill is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=bill.data, content_type=bill.content_type)
+
+    app = web.Application()
+    app.router.add_get("/bills/{name}", serve_bill)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Directory to write the bills to")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "png", "jpg"], choices=list(CONTENT_TYPES))
+    parser.add_argument("--pages", nargs="+", type=int, default=[1, 5, 20])
+    parser.add_argument("--dpi", nargs="+", type=int, default=[150, 300])
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for bill in build_corpus(args.formats, args.pages, args.dpi):
+        with open(os.path.join(args.out, bill.name), "wb") as output:
+            output.write(bill.data)
+        print(f"{bill.name}: {len(bill.data) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+from typing import Any, Callable, Dict, List
+
+from app.models.domain import PageImage
+from app.services.cascade_service import ModelCascade
+
+FAST = "fast-model"
+STRONG = "strong-model"
+
+
+def item(name: str, amount: float, rate: float = 0.0, quantity: float = 0.0) -> Dict[str, Any]:
+    return {"item_name": name, "item_amount": amount, "item_rate": rate, "item_quantity": quantity}
+
+
+def page(page_no: int, items: List[Dict[str, Any]], page_type: str = "Bill Detail", model: str = FAST):
+    # "model" marks which tier produced the page
+    return {"page_no": str(page_no), "page_type": page_type, "bill_items": items, "model": model}
+
+
+def good_page(page_no: int, model: str = FAST) -> Dict[str, Any]:
+    return page(page_no, [item(f"Item {page_no}", 100.0, rate=50.0, quantity=2)], model=model)
+
+
+def image(page_no: int) -> PageImage:
+    return PageImage(page_no=page_no, data=b"", mime_type="image/png", width=10, height=10)
+
+
+def success(pages: List[Dict[str, Any]], **extra) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "pages": pages,
+        "token_usage": {"total_tokens": 10, "input_tokens": 8, "output_tokens": 2},
+        **extra,
+    }
+
+
+def failure(error: str) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "pages": [],
+        "token_usage": {"total_tokens": 0, "input_tokens": 0, "output_tokens": 0},
+        "error": error,
+    }
+
+
+class StubGeminiService:
+    """Answers each model with a function of the page numbers it was sent"""
+
+    def __init__(self, responses: Dict[str, Callable[[List[int]], Dict[str, Any]]]):
+        self.responses = responses
+        self.calls: List[tuple] = []
+
+    async def analyze_full_document(self, images, total_pages, deadline=None, model=None, on_page=None):
+        page_numbers = [image.page_no for image in images]
+        self.calls.append((model, page_numbers))
+        return self.responses[model](page_numbers)
+
+    async def analyze_chunked(self, images, total_pages, deadline=None, model=None, on_page=None):
+        return await self.analyze_full_document(images, total_pages, deadline, model, on_page)
+
+
+def run_cascade(responses, page_count: int):
+    gemini = StubGeminiService(responses)
+    cascade = ModelCascade(gemini, tiers=[FAST, STRONG])
+    images = [image(page_no) for page_no in range(1, page_count + 1)]
+    result = asyncio.run(cascade.analyze(images=images, total_pages=page_count))
+    return result, gemini.calls
+
+
+def produced_by(result) -> List[tuple]:
+    return [(page["page_no"], page["model"]) for page in result["pages"]]
+
+
+def test_pages_passing_the_checks_are_not_escalated():
+    result, calls = run_cascade({FAST: lambda numbers: success([good_page(no) for no in numbers])}, 3)
+
+    assert calls == [(FAST, [1, 2, 3])]
+    assert produced_by(result) == [("1", FAST), ("2", FAST), ("3", FAST)]
+    assert result["cascade"]["escalations"] == []
+
+
+def test_final_bill_total_mismatch_reextracts_the_whole_document():
+    def fast(numbers):
+        return success([good_page(1), page(2, [item("Grand Total", 500.0)], page_type="Final Bill")])
+
+    def strong(numbers):
+        return success([
+            good_page(1, STRONG),
+            page(2, [item("Grand Total", 100.0)], page_type="Final Bill", model=STRONG),
+        ])
+
+    result, calls = run_cascade({FAST: fast, STRONG: strong}, 2)
+
+    assert calls == [(FAST, [1, 2]), (STRONG, [1, 2])]
+    assert produced_by(result) == [("1", STRONG), ("2", STRONG)]
+    [escalation] = result["cascade"]["escalations"]
+    assert escalation["reason"] == "final_bill_total"
+    assert escalation["pages"] == [1, 2]
+
+
+def test_failed_pages_are_reextracted_alone_and_merged_in_page_order():
+    def fast(numbers):
+        return success([
+            good_page(1),
+            page(2, [item("Syringe", 999.0, rate=10.0, quantity=2)]),  # 10 x 2 != 999
+            good_page(3),
+            page(10, []),  # detail page without items
+        ])
+
+    def strong(numbers):
+        # Answers out of order; the merged output is still sorted numerically
+        return success([good_page(no, STRONG) for no in reversed(numbers)])
+
+    result, calls = run_cascade({FAST: fast, STRONG: strong}, 10)
+
+    assert calls[1] == (STRONG, [2, 10])
+    assert produced_by(result) == [("1", FAST), ("2", STRONG), ("3", FAST), ("10", STRONG)]
+    reasons = {escalation["reason"]: escalation["pages"] for escalation in result["cascade"]["escalations"]}
+    assert reasons == {"arithmetic": [2], "empty_detail_page": [10]}
+
+
+def test_failed_page_numbers_that_were_not_sent_escalate_every_page():
+    def fast(numbers):
+        return success([good_page(1), page(7, [])])  # page 7 was never sent
+
+    result, calls = run_cascade({FAST: fast, STRONG: lambda numbers: success([
+        good_page(no, STRONG) for no in numbers
+    ])}, 2)
+
+    assert calls == [(FAST, [1, 2]), (STRONG, [1, 2])]
+    assert produced_by(result) == [("1", STRONG), ("2", STRONG)]
+    assert [escalation["reason"] for escalation in result["cascade"]["escalations"]] == ["unknown_page"]
+
+
+def test_failed_escalation_keeps_the_previous_tier_output():
+    def fast(numbers):
+        return success([good_page(1), page(2, [])])
+
+    result, calls = run_cascade({FAST: fast, STRONG: lambda numbers: failure("quota exhausted")}, 2)
+
+    assert calls == [(FAST, [1, 2]), (STRONG, [2])]
+    assert result["success"] is True
+    assert produced_by(result) == [("1", FAST), ("2", FAST)]
+    assert any("quota exhausted" in warning for warning in result["warnings"])
+
+
+def test_failed_first_tier_call_falls_through_to_the_next_tier():
+    result, calls = run_cascade({
+        FAST: lambda numbers: failure("timeout"),
+        STRONG: lambda numbers: success([good_page(no, STRONG) for no in numbers]),
+    }, 2)
+
+    assert calls == [(FAST, [1, 2]), (STRONG, [1, 2])]
+    assert produced_by(result) == [("1", STRONG), ("2", STRONG)]
+    assert [escalation["reason"] for escalation in result["cascade"]["escalations"]] == ["call_failed"]
+
+
+def test_every_tier_failing_fails_the_document():
+    result, _ = run_cascade({
+        FAST: lambda numbers: failure("timeout"),
+        STRONG: lambda numbers: failure("overloaded"),
+    }, 1)
+
+    assert result["success"] is False
+    assert result["error"] == f"{STRONG}: overloaded"
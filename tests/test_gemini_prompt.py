@@ -0,0 +1,24 @@
+from app.services.gemini_service import GeminiService
+
+
+def test_all_pages_in_one_call():
+    context = GeminiService().build_document_context(3, [1, 2, 3])
+
+    assert "You are seeing ALL pages at once." in context
+
+
+def test_skipped_pages_are_listed_exactly_and_not_called_separate():
+    # e.g. a cascade escalation re-extracting pages 3 and 7
+    context = GeminiService().build_document_context(10, [3, 7])
+
+    assert "You are seeing only page(s) 3, 7." in context
+    assert "Page(s) 1-2, 4-6, 8-10 were skipped" in context
+    assert "processed separately" not in context
+
+
+def test_chunk_of_a_run_names_the_other_chunks_and_the_skipped_pages():
+    context = GeminiService().build_document_context(10, [4, 5], run_page_numbers=[1, 2, 4, 5, 6])
+
+    assert "You are seeing only page(s) 4-5." in context
+    assert "Page(s) 1-2, 6 are processed separately." in context
+    assert "Page(s) 3, 7-10 were skipped" in context
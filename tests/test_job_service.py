@@ -0,0 +1,166 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from app.models.schemas import DocumentRequest
+from app.services import job_service
+from app.services.job_service import JOB_COMPLETED, JOB_QUEUED, JOB_RUNNING, JobStore
+
+LEASE_SECONDS = 0.3
+
+
+@pytest.fixture
+def job_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_service.settings, "JOB_DIR", str(tmp_path))
+    monkeypatch.setattr(job_service.settings, "JOB_LEASE_SECONDS", LEASE_SECONDS)
+    monkeypatch.setattr(job_service.settings, "JOB_WORKERS", 1)
+    return job_service.settings
+
+
+class StubExtractionService:
+    """Finishes every document after `seconds`"""
+    seconds = 0.0
+
+    def __init__(self, **options):
+        pass
+
+    async def extract_from_url(self, url):
+        await asyncio.sleep(self.seconds)
+        return {"is_success": True, "url": url}
+
+
+@pytest.fixture
+def stub_extraction(monkeypatch):
+    monkeypatch.setattr(job_service, "ExtractionService", StubExtractionService)
+    monkeypatch.setattr(StubExtractionService, "seconds", 0.0)
+    return StubExtractionService
+
+
+def status(service, job_id: str) -> str:
+    return service.store.get(job_id, time.time())["status"]
+
+
+def test_only_expired_leases_are_requeued(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    now = time.time()
+    store.create("live", "{}", now, 0)
+    store.create("stale", "{}", now + 1, 0)
+    store.claim_next(now, "process-a", now + 60)
+    store.claim_next(now, "process-b", now + LEASE_SECONDS)
+
+    assert store.requeue_expired(now) == 0
+    assert store.requeue_expired(now + 1) == 1
+
+    assert store.get("live", now)["status"] == JOB_RUNNING
+    assert store.get("stale", now)["status"] == JOB_QUEUED
+    assert store.get("stale", now)["owner"] is None
+
+
+def test_a_lost_lease_cannot_be_renewed_or_finished(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    now = time.time()
+    store.create("job", "{}", now, 0)
+    store.claim_next(now, "process-a", now + LEASE_SECONDS)
+    store.requeue_expired(now + 1)
+    store.claim_next(now + 1, "process-b", now + 60)
+
+    assert not store.renew_lease("job", "process-a", now + 60)
+    assert not store.finish("job", "process-a", JOB_COMPLETED, "{}", None, now, now + 60)
+    assert store.renew_lease("job", "process-b", now + 120)
+    assert store.finish("job", "process-b", JOB_COMPLETED, "{}", None, now, now + 60)
+
+
+def test_tables_without_lease_columns_are_migrated(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, "
+        "result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, expires_at REAL)"
+    )
+    connection.execute("INSERT INTO jobs (job_id, status, request, created_at) VALUES ('old', 'running', '{}', 1)")
+    connection.commit()
+    connection.close()
+
+    store = JobStore(path)
+
+    # Running rows from before leases have none, so they count as expired
+    assert store.requeue_expired(time.time()) == 1
+    assert store.get("old", time.time())["status"] == JOB_QUEUED
+
+
+def test_heartbeat_keeps_a_long_job_from_being_requeued(job_settings, stub_extraction):
+    stub_extraction.seconds = LEASE_SECONDS * 4
+
+    async def scenario():
+        service = job_service.init_job_service()
+        await service.start()
+        try:
+            job = await service.submit(DocumentRequest(document="https://example.com/bill.pdf"))
+            await asyncio.sleep(LEASE_SECONDS * 2)
+
+            # Another process sweeping for expired leases leaves the job alone
+            other = JobStore(service.store.db_path)
+            assert other.requeue_expired(time.time()) == 0
+            assert status(service, job["job_id"]) == JOB_RUNNING
+
+            await asyncio.sleep(LEASE_SECONDS * 3)
+            assert status(service, job["job_id"]) == JOB_COMPLETED
+        finally:
+            await service.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stopped_service_hands_running_jobs_back(job_settings, stub_extraction):
+    stub_extraction.seconds = 10
+
+    async def scenario():
+        service = job_service.init_job_service()
+        await service.start()
+        job = await service.submit(DocumentRequest(document="https://example.com/bill.pdf"))
+        await asyncio.sleep(0.1)
+        assert status(service, job["job_id"]) == JOB_RUNNING
+
+        await service.stop()
+        assert status(service, job["job_id"]) == JOB_QUEUED
+
+    asyncio.run(scenario())
+
+
+def test_worker_survives_a_failed_result_write(job_settings, stub_extraction, monkeypatch):
+    finish = JobStore.finish
+    failures = []
+
+    def finish_once_locked(self, *args):
+        if not failures:
+            failures.append(args[0])
+            raise sqlite3.OperationalError("database is locked")
+        return finish(self, *args)
+
+    monkeypatch.setattr(JobStore, "finish", finish_once_locked)
+
+    async def scenario():
+        service = job_service.init_job_service()
+        await service.start()
+        try:
+            first = await service.submit(DocumentRequest(document="https://example.com/a.pdf"))
+            await asyncio.sleep(0.2)
+            second = await service.submit(DocumentRequest(document="https://example.com/b.pdf"))
+            await asyncio.sleep(0.2)
+
+            assert failures == [first["job_id"]]
+            assert status(service, second["job_id"]) == JOB_COMPLETED
+            assert not any(task.done() for task in service._tasks)
+
+            # The unrecorded job is re-run once its lease runs out
+            await asyncio.sleep(LEASE_SECONDS)
+            assert service.store.requeue_expired(time.time()) == 1
+            service._wakeup.set()
+            await asyncio.sleep(0.2)
+            assert status(service, first["job_id"]) == JOB_COMPLETED
+        finally:
+            await service.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,116 @@
+import io
+import random
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+from app.models.domain import PageImage
+from app.utils.page_hash import find_duplicate_pages, max_hash_distance, page_fingerprints
+from benchmarks.synthetic_bills import render_bill_page
+
+BILL_PAGES = 7
+
+
+def encode_page(image, page_no: int, file_format: str = "PNG", **options) -> PageImage:
+    buffer = io.BytesIO()
+    image.save(buffer, file_format, **options)
+    return PageImage(
+        page_no=page_no, data=buffer.getvalue(), mime_type=f"image/{file_format.lower()}",
+        width=image.width, height=image.height
+    )
+
+
+def text_page(page_no: int, text: str) -> PageImage:
+    return PageImage(page_no=page_no, data=b"", mime_type="text/plain", width=1240, height=1754, text=text)
+
+
+@pytest.fixture(scope="module")
+def bill_images():
+    # Every page uses the same template: header, ruled table, totals
+    rng = random.Random(7)
+    return [render_bill_page(page_no, BILL_PAGES, 100, rng) for page_no in range(1, BILL_PAGES + 1)]
+
+
+@pytest.mark.parametrize("algorithm, hash_size", [("phash", 16), ("phash", 32), ("dhash", 32)])
+def test_distinct_pages_of_one_template_stay_separate(bill_images, algorithm, hash_size):
+    pages = [encode_page(image, page_no) for page_no, image in enumerate(bill_images, start=1)]
+    fingerprints = page_fingerprints(pages, algorithm, hash_size)
+
+    duplicates = find_duplicate_pages(
+        [page.page_no for page in pages], fingerprints, max_hash_distance(algorithm, hash_size)
+    )
+
+    assert duplicates == {}
+
+
+@pytest.mark.parametrize("algorithm, hash_size", [("phash", 16), ("phash", 32), ("dhash", 32)])
+def test_reencoded_copy_collapses_into_the_original(bill_images, algorithm, hash_size):
+    pages = [
+        encode_page(bill_images[0], 1),
+        encode_page(bill_images[1], 2),
+        encode_page(bill_images[0], 3, "JPEG", quality=40),
+    ]
+    fingerprints = page_fingerprints(pages, algorithm, hash_size)
+
+    duplicates = find_duplicate_pages(
+        [page.page_no for page in pages], fingerprints, max_hash_distance(algorithm, hash_size)
+    )
+
+    assert list(duplicates) == [3]
+    kept_page_no, distance = duplicates[3]
+    assert kept_page_no == 1
+    assert 0 < distance <= max_hash_distance(algorithm, hash_size)
+
+
+def test_text_pages_match_on_normalized_text_only():
+    pages = [
+        text_page(1, "Room Rent  1200.00\nCBC Test 450.00"),
+        text_page(2, "Room Rent 1200.00 CBC Test 450.00"),
+        text_page(3, "Room Rent 1200.00 CBC Test 451.00"),
+    ]
+
+    fingerprints = page_fingerprints(pages, "phash", 32)
+
+    assert [kind for kind, _ in fingerprints] == ["text", "text", "text"]
+    assert fingerprints[0] == fingerprints[1]
+    assert fingerprints[0] != fingerprints[2]
+    assert find_duplicate_pages([1, 2, 3], fingerprints, 100) == {2: (1, 0)}
+
+
+def test_find_duplicate_pages_reports_the_closest_kept_page():
+    fingerprints = [
+        ("image", 0b0000_0000),
+        ("image", 0b1111_0000),
+        ("image", 0b1111_0001),  # 5 bits from page 10, 1 bit from page 11
+        ("text", 0b0000_0000),  # never matches an image page
+        ("image", 0b0000_1111),  # 4 bits from page 10, beyond max_distance
+    ]
+
+    duplicates = find_duplicate_pages([10, 11, 12, 13, 14], fingerprints, max_distance=3)
+
+    assert duplicates == {12: (11, 1)}
+
+
+def test_duplicates_only_match_pages_that_were_kept():
+    # Page 3 is 2 bits from page 2, but page 2 was itself folded into page 1
+    fingerprints = [("image", 0b000), ("image", 0b001), ("image", 0b011)]
+
+    assert find_duplicate_pages([1, 2, 3], fingerprints, max_distance=1) == {2: (1, 1)}
+
+
+def test_max_hash_distance_scales_with_the_hash_bits():
+    assert max_hash_distance("phash", 32) == int(0.12 * 1024)
+    assert max_hash_distance("phash", 16) == int(0.12 * 256)
+    assert max_hash_distance("dhash", 32, 0.1) == 102
+
+
+@pytest.mark.parametrize("overrides", [
+    {"PAGE_HASH_ALGORITHM": "ahash"},
+    {"PAGE_HASH_ALGORITHM": "dhash", "PAGE_HASH_SIZE": 16},
+    {"PAGE_HASH_SIZE": 8},
+    {"PAGE_DEDUP_MAX_DISTANCE": 100},
+])
+def test_settings_reject_page_hash_combinations_that_cannot_separate_pages(overrides):
+    with pytest.raises(ValidationError):
+        Settings(**overrides)
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.services.resilience import CIRCUIT_CLOSED, CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+def make_caller(breaker: CircuitBreaker) -> ResilientCaller:
+    return ResilientCaller(
+        model="test-model",
+        max_retries=0,
+        base_delay_seconds=0.0,
+        max_delay_seconds=0.0,
+        hedge_percentile=0.0,
+        hedge_min_samples=20,
+        breaker=breaker,
+    )
+
+
+def test_cancelled_half_open_probe_lets_the_circuit_recover():
+    async def scenario():
+        breaker = CircuitBreaker("test-model", failure_threshold=1, reset_seconds=0.05)
+        caller = make_caller(breaker)
+
+        async def failing():
+            raise ConnectionError("upstream down")
+
+        with pytest.raises(ConnectionError):
+            await caller.call(failing)
+        with pytest.raises(CircuitOpenError):
+            await caller.call(failing)
+
+        # The half-open probe is cancelled while in flight (e.g. client disconnect)
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(caller.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def succeeding():
+            return "ok"
+
+        assert await caller.call(succeeding) == "ok"
+        assert breaker.state == CIRCUIT_CLOSED
+
+    asyncio.run(scenario())
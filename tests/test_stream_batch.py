@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+from app.api.routes.extraction import _stream_batch
+
+URLS = ["https://example.com/a.pdf", "https://example.com/b.pdf", "https://example.com/c.pdf"]
+
+
+class FailingBatchService:
+    """Completes the second document, then the batch itself fails"""
+
+    async def iter_batch(self, urls, on_page=None):
+        yield 1, {
+            "is_success": True,
+            "token_usage": {"total_tokens": 10, "input_tokens": 8, "output_tokens": 2},
+            "data": {"pagewise_line_items": [], "total_item_count": 4},
+        }
+        raise RuntimeError("worker pool is gone")
+
+
+def collect(stream) -> list:
+    async def read():
+        return [json.loads(line) async for line in stream]
+    return asyncio.run(read())
+
+
+def test_failed_batch_still_ends_with_a_summary():
+    records = collect(_stream_batch(FailingBatchService(), URLS, event_stream=False))
+
+    assert [record["type"] for record in records] == ["result", "error", "result", "result", "summary"]
+    assert records[0]["document_index"] == 1 and records[0]["is_success"]
+    assert records[1]["error"] == "worker pool is gone"
+    assert {record["document_index"] for record in records[2:4]} == {0, 2}
+    assert not any(record["is_success"] for record in records[2:4])
+
+    summary = records[-1]
+    assert summary["is_success"] is False
+    assert (summary["successful_count"], summary["failed_count"]) == (1, 2)
+    assert summary["total_items_extracted"] == 4
+    assert summary["token_usage"]["total_tokens"] == 10